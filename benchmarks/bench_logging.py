@@ -0,0 +1,115 @@
+# benchmarks/bench_logging.py
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+'''
+Micro-benchmark of logging cost per conversation turn, as paid by the
+request thread.
+
+Replays the log calls of one LLM turn (gateway + bot: request bodies, the
+system prompt, the completion, state changes) against:
+
+  legacy      the previous setup: synchronous RotatingFileHandler + stdout,
+              eager f-strings of full payloads
+  queue       telemetry/log.py at DEBUG (lazy, truncated, written by a listener thread)
+  queue-info  telemetry/log.py at INFO, the production default
+
+stdout goes to /dev/null so the terminal does not dominate the numbers.
+
+python -m benchmarks.bench_logging --turns 2000
+'''
+
+SYSTEM_PROMPT = "You are a supportive assistant helping the user reappraise a stressful situation. " * 60
+COMPLETION = "It sounds like the deadline has been weighing on you. " * 20
+USER_MSG = {"role": "user", "content": "My manager criticized my presentation in front of everyone.",
+            "response_type": "text", "options": {}}
+
+
+def legacy_logger(log_dir: Path) -> logging.Logger:
+    logger = logging.getLogger("bench_legacy")
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    file_handler = RotatingFileHandler(log_dir / "legacy.log", maxBytes=10*1024*1024, backupCount=5)
+    file_handler.setFormatter(logging.Formatter(
+        "%(asctime)s - %(levelname)-8s - %(name)-15s - [%(filename)-18s:%(lineno)4d] - %(message)s"))
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(logging.Formatter("%(levelname)s - %(message)s"))
+    logger.addHandler(file_handler)
+    logger.addHandler(console_handler)
+    return logger
+
+
+def legacy_turn(logger):
+    data = {"conversation_id": 42, **USER_MSG}
+    logger.debug(f"Entered /send_message endpoint with user: bench@example.com")
+    logger.debug(f"/send_message received data: {data}")
+    logger.debug(f"Sending message to bot with data: {data}")
+    logger.debug(f"Initializing BotIssueInterview with convo_id=42, user_id=7")
+    logger.debug(f"Calling openai with 6 messages and system prompt: {SYSTEM_PROMPT}")
+    logger.debug(f"LLM response: {COMPLETION}")
+    logger.debug(f"BotIssueInterview.generate_output: {{'content': {COMPLETION!r}}}")
+    logger.debug(f"Moving from issue_interview to rate_issue")
+    logger.debug(f"/send_message returning: {COMPLETION}")
+
+
+def queue_turn(logger, truncated, sampled):
+    data = {"conversation_id": 42, **USER_MSG}
+    logger.debug("Entered /send_message endpoint with user: %s", "bench@example.com")
+    logger.debug("/send_message received data: %s", truncated(data))
+    logger.debug("Sending message to bot with data: %s", truncated(data))
+    logger.debug("Initializing %s with convo_id=%s, user_id=%s", "BotIssueInterview", 42, 7)
+    if sampled():
+        logger.debug("Calling %s with %d messages and system prompt: %s", "openai", 6, truncated(SYSTEM_PROMPT))
+    logger.debug("LLM response: %s", truncated(COMPLETION))
+    logger.debug("BotIssueInterview.generate_output: %s", truncated({"content": COMPLETION}))
+    logger.debug("Moving from %s to %s", "issue_interview", "rate_issue")
+    logger.debug("/send_message returning: %s", truncated(COMPLETION))
+
+
+def timed(fn, turns):
+    start = time.perf_counter()
+    for _ in range(turns):
+        fn()
+    return (time.perf_counter() - start) / turns * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Logging overhead per turn")
+    parser.add_argument("--turns", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull:
+        os.environ["LOG_DIR"] = tmp
+        real_stdout, sys.stdout = sys.stdout, devnull
+        try:
+            from telemetry import log
+            legacy = legacy_logger(Path(tmp))
+            results = {"legacy": timed(lambda: legacy_turn(legacy), args.turns)}
+
+            debug = log.get_logger("bench_queue", filename="queue.log", level="DEBUG")
+            results["queue"] = timed(lambda: queue_turn(debug, log.truncated, log.sampled), args.turns)
+            drain_start = time.perf_counter()
+            log.shutdown()
+            drain = (time.perf_counter() - drain_start) / args.turns * 1e6
+
+            log._pipelines.clear()
+            info = log.get_logger("bench_queue_info", filename="queue-info.log", level="INFO")
+            results["queue-info"] = timed(lambda: queue_turn(info, log.truncated, log.sampled), args.turns)
+            log.shutdown()
+        finally:
+            sys.stdout = real_stdout
+
+    for name, us in results.items():
+        print(f"{name:>10}: {us:8.1f} us/turn in the request thread")
+    print(f"{'':>10}  (+{drain:.1f} us/turn left for the listener thread to drain at DEBUG)")
+
+
+if __name__ == "__main__":
+    main()
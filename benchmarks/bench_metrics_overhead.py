@@ -0,0 +1,78 @@
+# benchmarks/bench_metrics_overhead.py
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import timeit
+
+'''
+Micro-benchmark of the Prometheus instrumentation added to one conversation turn.
+
+Measures the metric updates of a typical send_message turn (request and
+turn histograms, in-flight gauge, LLM latency/tokens, pool checkouts) and
+the cost of rendering /metrics, both with the in-memory registry and in
+gunicorn's multiprocess mode. Each mode runs in a fresh interpreter because
+prometheus_client picks its storage at import time.
+
+python -m benchmarks.bench_metrics_overhead --number 20000 --turn-ms 800
+'''
+
+
+def instrumented_turn(metrics):
+    """
+    The metric updates of one turn through the gateway and the bot.
+    """
+    with metrics.track_turn() as turn:
+        turn.state = "issue_interview"
+        for _ in range(6):
+            metrics._observe_checkout(0.0002, False)
+        metrics.observe_llm_call("openai", "gpt-4o-mini", 0.6, True, 0)
+        metrics.observe_llm_tokens("gpt-4o-mini", 850, 60)
+    metrics.observe_request("bot", "POST", "/send_message", 200, 0.7)
+    metrics.observe_request("gateway", "POST", "/api/chat/send_message", 201, 0.7)
+
+
+def measure(number, repeat):
+    from telemetry import metrics
+
+    turn = min(timeit.repeat(lambda: instrumented_turn(metrics), number=number, repeat=repeat)) / number
+    render = min(timeit.repeat(metrics.render_latest, number=max(number // 100, 10), repeat=repeat))
+    render /= max(number // 100, 10)
+    return {"turn_us": turn * 1e6, "render_ms": render * 1e3, "body_bytes": len(metrics.render_latest()[0])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Metrics instrumentation overhead benchmark")
+    parser.add_argument("--number", type=int, default=20_000, help="Turns per repeat")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of repeats (best is reported)")
+    parser.add_argument("--turn-ms", type=float, default=800.0,
+                        help="Typical turn latency to express the overhead against (see e2e_conversation)")
+    parser.add_argument("--child", choices=["memory", "multiprocess"], default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.number, args.repeat)))
+        return
+
+    for mode in ("memory", "multiprocess"):
+        env = dict(os.environ)
+        env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+        with tempfile.TemporaryDirectory() as tmp:
+            if mode == "multiprocess":
+                env["PROMETHEUS_MULTIPROC_DIR"] = tmp
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_metrics_overhead", "--child", mode,
+                 "--number", str(args.number), "--repeat", str(args.repeat)],
+                env=env, check=True, capture_output=True, text=True,
+            ).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        share = r["turn_us"] / (args.turn_ms * 1000) * 100
+        print(f"{mode:>12}: {r['turn_us']:.1f} us/turn ({share:.4f}% of a {args.turn_ms:.0f} ms turn), "
+              f"/metrics render {r['render_ms']:.2f} ms ({r['body_bytes']} bytes)")
+
+
+if __name__ == "__main__":
+    main()
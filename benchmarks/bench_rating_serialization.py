@@ -0,0 +1,72 @@
+# benchmarks/bench_rating_serialization.py
+
+import argparse
+import copy
+import json
+import timeit
+
+from bot.registry import get_registry
+
+'''
+Micro-benchmark of building and serializing one rating-question response.
+
+python -m benchmarks.bench_rating_serialization --number 100000
+'''
+
+CONVO_ID = 1234
+MSG_ID = 56789
+CONVO_STATE = "rate_reap_1"
+QUESTION_ID = "rate_reap_1_care"
+
+
+def legacy_turn(bot_msgs: dict) -> bytes:
+    """
+    The previous path: copy the template, add the question id, build the
+    response dict and serialize it.
+    """
+    bot_msg = copy.deepcopy(bot_msgs[QUESTION_ID])
+    bot_msg["options"]["question_id"] = QUESTION_ID
+    resp = {
+        "convo_id": CONVO_ID,
+        "role": "assistant",
+        "response_type": bot_msg["response_type"],
+        "content": bot_msg["content"],
+        "options": bot_msg["options"],
+        "msg_id": MSG_ID,
+        "convo_state": CONVO_STATE,
+    }
+    return json.dumps(resp).encode()
+
+
+def template_turn(template) -> bytes:
+    """
+    The current path: splice per-turn fields onto the cached bytes.
+    """
+    return template.render(CONVO_ID, MSG_ID, CONVO_STATE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rating-turn serialization benchmark")
+    parser.add_argument("--number", type=int, default=100_000, help="Iterations per repeat")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of repeats (best is reported)")
+    args = parser.parse_args()
+
+    registry = get_registry()
+    template = registry.question(QUESTION_ID)
+    # Plain, mutable dicts like the ones yaml.safe_load used to return
+    bot_msgs = json.loads(json.dumps({QUESTION_ID: registry.bot_msg(QUESTION_ID)}, default=dict))
+
+    assert json.loads(legacy_turn(bot_msgs)) == json.loads(template_turn(template))
+
+    results = {}
+    for name, fn in (("legacy", lambda: legacy_turn(bot_msgs)),
+                     ("template", lambda: template_turn(template))):
+        best = min(timeit.repeat(fn, number=args.number, repeat=args.repeat))
+        results[name] = best / args.number * 1e6
+        print(f"{name:>10}: {results[name]:.2f} us/turn")
+
+    print(f"{'speedup':>10}: {results['legacy'] / results['template']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# benchmarks/bench_search.py
+
+import argparse
+import os
+import random
+import time
+
+'''
+Conversation search: the full-text index (crud.search_user_conversations)
+against ILIKE over the same messages, on a scratch database seeded with
+--messages synthetic user messages (1M by default).
+
+    python -m benchmarks.bench_search --database-url postgresql://localhost/search_bench
+    python -m benchmarks.bench_search --database-url ... --skip-seed   # reuse the seeded rows
+
+Two ILIKE variants are timed: scoped to the searching user (served by
+messages_user_id_index, so it scans only that user's messages) and across
+all messages (what the search would cost without any usable index).
+'''
+
+WORDS = (
+    "work family exam deadline friend argument sleep money move job interview "
+    "partner anxious worried angry sad tired stress presentation roommate boss "
+    "health doctor breakup school grades rent travel wedding lonely conflict"
+).split()
+SEARCH_TERMS = ["deadline", "roommate argument", "doctor", "wedding stress", "interview", "rent money"]
+
+
+def seed(n_messages: int, n_users: int, convos_per_user: int):
+    from sqlalchemy import text
+    from db.db_session import get_engine, init_db
+
+    init_db()
+    engine = get_engine()
+    with engine.begin() as conn:
+        conn.execute(text("TRUNCATE messages, conversations, users RESTART IDENTITY CASCADE"))
+        conn.execute(text("""
+            INSERT INTO users (email, research_consent, created_at, updated_at)
+            SELECT 'search-bench-' || g || '@example.com', true, now(), now() FROM generate_series(1, :n) g
+        """), {"n": n_users})
+        conn.execute(text("""
+            INSERT INTO conversations (user_id, state, ephemeral, last_active_at, created_at, updated_at)
+            SELECT u, 'COMPLETE', false, now(), now(), now()
+            FROM generate_series(1, :users) u, generate_series(1, :per_user) c
+        """), {"users": n_users, "per_user": convos_per_user})
+        # Every message lands in the current month's partition
+        conn.execute(text("""
+            INSERT INTO messages (user_id, conversation_id, state, content, role, response_type, created_at, updated_at)
+            SELECT c.user_id, c.id, 'ISSUE_INTERVIEW',
+                   array_to_string(ARRAY(
+                       SELECT (:words)[1 + floor(random() * cardinality(CAST(:words AS text[])))::int]
+                       FROM generate_series(1, 12) WHERE g IS NOT NULL), ' '),
+                   CASE WHEN g % 2 = 0 THEN 'USER' ELSE 'ASSISTANT' END, 'TEXT',
+                   date_trunc('month', now()) + (g % 86400) * interval '1 second', now()
+            FROM generate_series(1, :n) g
+            JOIN conversations c ON c.id = 1 + g % :convos
+        """), {"words": WORDS, "n": n_messages, "convos": n_users * convos_per_user})
+    with engine.connect() as conn:
+        conn.execute(text("ANALYZE messages"))
+        conn.commit()
+
+
+def time_queries(fn, iterations: int):
+    samples = []
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        fn(SEARCH_TERMS[i % len(SEARCH_TERMS)])
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full-text search vs ILIKE benchmark")
+    parser.add_argument("--database-url", default=os.getenv("SQLALCHEMY_DATABASE_URI"))
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--convos-per-user", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=60)
+    parser.add_argument("--skip-seed", action="store_true")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+    if args.database_url:
+        os.environ["SQLALCHEMY_DATABASE_URI"] = args.database_url
+
+    from sqlalchemy import text
+    from db.crud import search_user_conversations
+    from db.db_session import get_session
+    from benchmarks.common import summarize, save_results
+
+    if not args.skip_seed:
+        t0 = time.perf_counter()
+        seed(args.messages, args.users, args.convos_per_user)
+        print(f"Seeded {args.messages} messages in {time.perf_counter() - t0:.1f}s")
+
+    rng = random.Random(0)
+
+    def fts(term):
+        with get_session() as session:
+            search_user_conversations(session, rng.randint(1, args.users), term)
+
+    def ilike(term, scoped):
+        # Every word must appear, like websearch_to_tsquery's implicit AND
+        where = " AND ".join(f"m.content ILIKE :w{i}" for i in range(len(term.split())))
+        params = {f"w{i}": f"%{word}%" for i, word in enumerate(term.split())}
+        params["user_id"] = rng.randint(1, args.users)
+        with get_session() as session:
+            session.execute(text(f"""
+                SELECT m.conversation_id, count(*) AS hits
+                FROM messages m JOIN conversations c ON c.id = m.conversation_id
+                WHERE {'m.user_id = :user_id AND' if scoped else ''} m.role = 'USER' AND m.deleted_at IS NULL
+                      AND c.deleted_at IS NULL AND {where}
+                GROUP BY m.conversation_id ORDER BY hits DESC LIMIT 20
+            """), params).all()
+
+    with get_session() as session:
+        plan = session.execute(text("""
+            EXPLAIN SELECT 1 FROM messages
+            WHERE user_id = 1 AND role = 'USER' AND deleted_at IS NULL
+                  AND to_tsvector('english', content) @@ websearch_to_tsquery('english', 'deadline')
+        """)).scalars().all()
+    uses_index = any("content_search_index" in line for line in plan)
+    print("\n".join(plan))
+
+    results = {}
+    for name, fn in (("fts", fts),
+                     ("ilike_user", lambda term: ilike(term, True)),
+                     ("ilike_all", lambda term: ilike(term, False))):
+        fn(SEARCH_TERMS[0])  # warm up
+        results[name] = summarize(time_queries(fn, args.iterations))
+        print(f"{name:>11}: p50 {results[name]['p50_ms']:.1f} ms, p95 {results[name]['p95_ms']:.1f} ms")
+
+    path = save_results("search", {"config": vars(args), "uses_search_index": uses_index, "results": results},
+                        args.output)
+    print(f"Saved {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# benchmarks/bench_startup.py
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+from benchmarks.e2e_conversation import BENCH_ENV_DEFAULTS
+
+'''
+Worker cold-start benchmark.
+
+For the bot service and the gateway, reports:
+
+  import      wall time of `import <app module>` in a fresh interpreter, and
+              the slowest imports from -X importtime
+  ready       time from launching gunicorn until /health answers, with
+              preload_app on and off
+  memory      RSS / USS / PSS per worker once ready (USS is what the worker
+              does not share with the master; PSS splits shared pages evenly)
+
+Nothing here touches the database: engines are created on first use.
+
+    python -m benchmarks.bench_startup --workers 4
+'''
+
+ROOT = Path(__file__).resolve().parent.parent
+SERVICES = {
+    "bot": ("bot.bot", "bot.bot:app", "bot/gunicorn.conf.py"),
+    "gateway": ("flask_app.run", "flask_app.run:app", "flask_app/gunicorn.conf.py"),
+}
+
+
+def bench_env(**extra):
+    env = {**BENCH_ENV_DEFAULTS, **os.environ, **extra}
+    env.setdefault("SQLALCHEMY_DATABASE_URI", "postgresql://localhost/reappraise_bench")
+    env.setdefault("OPENAI_API_KEY", "benchmark")
+    env["BOT_MEMORY_MONITOR_INTERVAL"] = "0"
+    return env
+
+
+def import_time(module: str, env, top: int):
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=ROOT, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    # "import time: self [us] | cumulative | imported package", children are
+    # listed (indented) before their parent: keep the direct imports of `module`
+    rows, pending = [], []
+    for line in proc.stderr.splitlines():
+        m = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)", line)
+        if not m:
+            continue
+        depth = (len(m.group(3)) - 1) // 2
+        if depth == 1:
+            pending.append((int(m.group(2)) / 1000, m.group(4)))
+        elif depth == 0:
+            if m.group(4) == module:
+                rows.extend(pending)
+            pending = []
+    return wall, sorted(rows, reverse=True)[:top]
+
+
+def worker_memory(master_pid: int):
+    import psutil
+    out = []
+    for child in psutil.Process(master_pid).children():
+        try:
+            full = child.memory_full_info()
+        except psutil.Error:
+            continue
+        out.append((child.pid, full.rss, full.uss, getattr(full, "pss", 0)))
+    return out
+
+
+def ready_time(app: str, conf: str, port: int, workers: int, preload: bool, env, timeout: float):
+    env = {**env, "GUNICORN_PRELOAD_APP": "true" if preload else "false"}
+    cmd = [sys.executable, "-m", "gunicorn", "-c", conf, "--bind", f"127.0.0.1:{port}",
+           "--workers", str(workers), app]
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        deadline = start + timeout
+        while time.perf_counter() < deadline:
+            if proc.poll() is not None:
+                raise RuntimeError(proc.stderr.read().decode()[-2000:])
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1):
+                    ready = time.perf_counter() - start
+                    break
+            except OSError:
+                time.sleep(0.02)
+        else:
+            raise RuntimeError(f"{app} not ready after {timeout}s")
+        # Let the remaining workers finish booting before measuring them
+        time.sleep(1.0)
+        return ready, worker_memory(proc.pid)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker import time, time-to-ready and memory")
+    parser.add_argument("--service", choices=[*SERVICES, "all"], default="all")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--top", type=int, default=8, help="slowest imports to list")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    names = list(SERVICES) if args.service == "all" else [args.service]
+    with tempfile.TemporaryDirectory() as tmp:
+        env = bench_env(PROMETHEUS_MULTIPROC_DIR=tmp, LOG_DIR=tmp, LOG_LEVEL="WARNING")
+        for name in names:
+            module, app, conf = SERVICES[name]
+            wall, slowest = import_time(module, env, args.top)
+            print(f"== {name}")
+            print(f"  import {module}: {wall * 1000:.0f} ms (fresh interpreter)")
+            for ms, mod in slowest:
+                print(f"    {ms:8.1f} ms  {mod}")
+            for preload in (False, True):
+                ready, memory = ready_time(app, conf, args.port, args.workers, preload, env, args.timeout)
+                label = "preload" if preload else "no preload"
+                print(f"  {label:>10}: first /health after {ready * 1000:.0f} ms")
+                for pid, rss, uss, pss in memory:
+                    print(f"    worker {pid}: rss {rss / 2**20:6.1f} MiB  uss {uss / 2**20:6.1f} MiB"
+                          f"  pss {pss / 2**20:6.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
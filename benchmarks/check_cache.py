@@ -0,0 +1,121 @@
+# benchmarks/check_cache.py
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+'''
+Cross-process check of db/cache.py against a scratch database: --workers
+forked processes read one user through cache.get_or_load() in a loop while
+this process updates the user with crud.update_user and commits. Every
+worker must see each new value; the time it takes (the NOTIFY round trip)
+and the cached lookup latency are reported.
+
+    python -m benchmarks.check_cache --database-url postgresql://localhost/cache_check
+    python -m benchmarks.check_cache --database-url ... --redis-url redis://localhost:6379/15
+
+Any Redis-compatible server (redis-server, valkey, a throwaway container)
+works as the shared tier. Exits non-zero if a worker still sees an old
+value after --timeout seconds.
+'''
+
+
+def load_age(user_id):
+    from db.crud import get_user_by_id
+    from db.db_session import get_session
+
+    with get_session() as session:
+        user = get_user_by_id(session, user_id)
+        return {"age": user.age}
+
+
+def worker(user_id, rounds, timeout, ready, updated, results):
+    from db import cache
+    from benchmarks.common import summarize
+
+    key = cache.user_key(user_id)
+    cache.get_or_load(key, lambda: load_age(user_id))
+    # Wait for the invalidation listener before the first update
+    deadline = time.monotonic() + timeout
+    while not cache._listening.is_set() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    ready.release()
+
+    lookups, lags, stale = [], [], 0
+    for expected in range(1, rounds + 1):
+        updated.acquire()
+        committed_at = time.time()
+        deadline = time.monotonic() + timeout
+        while True:
+            t0 = time.perf_counter()
+            value = cache.get_or_load(key, lambda: load_age(user_id))
+            lookups.append(time.perf_counter() - t0)
+            if value["age"] == expected:
+                lags.append(time.time() - committed_at)
+                break
+            if time.monotonic() > deadline:
+                stale += 1
+                break
+        ready.release()
+    results.put({"stale": stale, "lookups": summarize(lookups), "invalidation": summarize(lags)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check cross-process invalidation of db/cache.py")
+    parser.add_argument("--database-url", default=os.getenv("SQLALCHEMY_DATABASE_URI"))
+    parser.add_argument("--redis-url", default=os.getenv("CACHE_REDIS_URL"))
+    parser.add_argument("--ttl", type=float, default=float(os.getenv("CACHE_TTL_SECONDS") or 60),
+                        help="CACHE_TTL_SECONDS for the workers (the cache is off by default)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=5.0)
+    args = parser.parse_args()
+    if args.database_url:
+        os.environ["SQLALCHEMY_DATABASE_URI"] = args.database_url
+    if args.redis_url:
+        os.environ["CACHE_REDIS_URL"] = args.redis_url
+    os.environ["CACHE_TTL_SECONDS"] = str(args.ttl)
+
+    from db.crud import get_user_by_id, update_user
+    from db.models import User
+    from db.db_session import get_session, init_db
+
+    init_db()
+    with get_session() as session:
+        # Not crud.create_user, which needs the Flask app's config
+        user = User(email=f"cache-check-{time.time_ns()}@example.com", age=0)
+        session.add(user)
+        session.commit()
+        user_id = user.id
+
+    ctx = multiprocessing.get_context("fork")
+    ready, updated, results = ctx.Semaphore(0), ctx.Semaphore(0), ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(user_id, args.rounds, args.timeout, ready, updated, results))
+             for _ in range(args.workers)]
+    for p in procs:
+        p.start()
+
+    for age in range(1, args.rounds + 1):
+        for _ in procs:
+            ready.acquire()
+        with get_session() as session:
+            update_user(session, get_user_by_id(session, user_id), age=age)
+            session.commit()
+        for _ in procs:
+            updated.release()
+
+    reports = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    stale = sum(r["stale"] for r in reports)
+    for i, r in enumerate(reports):
+        print(f"worker {i}: lookup p50 {r['lookups'].get('p50_ms', 0):.2f} ms, "
+              f"invalidation p95 {r['invalidation'].get('p95_ms', 0):.1f} ms, stale {r['stale']}")
+    print("ok" if not stale else f"FAIL: {stale} stale reads")
+    sys.exit(1 if stale else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# benchmarks/common.py
+
+import json
+import subprocess
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+def summarize(samples: List[float]) -> Dict:
+    """
+    Summarize latency samples (seconds) into count/mean/p50/p95/p99/max in milliseconds.
+    """
+    values = sorted(samples)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": sum(values) / len(values) * 1000,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "max_ms": values[-1] * 1000,
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save_results(name: str, results: Dict, output: str = None) -> Path:
+    """
+    Write results as JSON, stamped with the git revision and time.
+    Defaults to benchmarks/results/<name>-<timestamp>-<rev>.json.
+    """
+    rev = git_revision()
+    results = {
+        "benchmark": name,
+        "git_revision": rev,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        **results,
+    }
+    if output:
+        path = Path(output)
+    else:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        path = RESULTS_DIR / f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{rev}.json"
+    path.write_text(json.dumps(results, indent=2, default=str))
+    return path
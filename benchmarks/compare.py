@@ -0,0 +1,50 @@
+# benchmarks/compare.py
+
+import argparse
+import json
+
+'''
+Compare two saved benchmark results, e.g. from two commits.
+
+python -m benchmarks.compare benchmarks/results/e2e-A.json benchmarks/results/e2e-B.json
+'''
+
+
+def _flatten(obj, prefix=""):
+    """
+    Flatten nested dicts into {"a.b.c": number}.
+    """
+    out = {}
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            out.update(_flatten(value, f"{prefix}{key}."))
+    elif isinstance(obj, (int, float)) and not isinstance(obj, bool):
+        out[prefix[:-1]] = obj
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--filter", default="", help="Only show metrics containing this substring")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        base = json.load(f)
+    with open(args.candidate) as f:
+        cand = json.load(f)
+
+    print(f"baseline:  {base.get('benchmark')} @ {base.get('git_revision')}")
+    print(f"candidate: {cand.get('benchmark')} @ {cand.get('git_revision')}")
+    base_flat, cand_flat = _flatten(base.get("results", base)), _flatten(cand.get("results", cand))
+    for key in sorted(set(base_flat) & set(cand_flat)):
+        if args.filter not in key:
+            continue
+        b, c = base_flat[key], cand_flat[key]
+        change = f"{(c - b) / b * 100:+.1f}%" if b else "n/a"
+        print(f"{key:<60} {b:>12.2f} {c:>12.2f} {change:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+# benchmarks/e2e_conversation.py
+
+import argparse
+import os
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+'''
+End-to-end conversation throughput benchmark.
+
+Starts the Flask gateway and the FastAPI bot service in this process against
+a local Postgres, with the LLM replaced by a stub server (or the in-process
+fake provider). Then drives N simulated users through START -> COMPLETE and
+reports throughput, latency per endpoint and per conversation state, and DB
+statement / connection-pool counters.
+
+    createdb reappraise_bench
+    python -m benchmarks.e2e_conversation --database-url postgresql://localhost/reappraise_bench --users 20
+
+The in-process bot service runs a single event loop, like one gunicorn
+worker. Use --gateway-url to benchmark an already running deployment
+instead (DB counters are then not available).
+'''
+
+# Config classes read these at import time; dummy values are fine for a benchmark
+BENCH_ENV_DEFAULTS = {
+    "FLASK_ENV": "development",
+    "SECRET_KEY": "benchmark",
+    "MAIL_USERNAME": "benchmark",
+    "MAIL_PASSWORD": "benchmark",
+    "MAILTRAP_API_TOKEN": "benchmark",
+    "MAIL_SUPPORT_RECIPIENT": "benchmark@example.com",
+    "REDDIT_CLIENT_ID": "benchmark",
+    "REDDIT_CLIENT_SECRET": "benchmark",
+    "BOT_REGISTRY_RELOAD_INTERVAL": "0",
+}
+
+SENTENCES = [
+    "I have been stressed about a deadline at work.",
+    "My manager criticized my presentation in front of everyone.",
+    "I keep thinking I am not good enough for this job.",
+    "It started a few weeks ago and it is getting worse.",
+    "I feel anxious every morning before work.",
+    "I wish I could talk to someone about it.",
+]
+
+
+class Recorder:
+    """
+    Thread-safe collection of latency samples and error counts.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.by_endpoint = defaultdict(list)
+        self.by_state = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.turns = 0
+        self.conversations = 0
+
+    def record(self, endpoint, elapsed, state=None, ok=True):
+        with self._lock:
+            self.by_endpoint[endpoint].append(elapsed)
+            if state is not None:
+                self.by_state[state].append(elapsed)
+                self.turns += 1
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def conversation_done(self):
+        with self._lock:
+            self.conversations += 1
+
+
+def _reply(rng, user_idx, convo_idx, turn, response_type, options):
+    """
+    Build what the React client would send for the last bot message.
+    """
+    if response_type == "slider":
+        return {"content": rng.randint(0, 100), "response_type": "slider",
+                "options": {"question_id": (options or {}).get("question_id")}}
+    if response_type == "continue":
+        return {"content": "", "response_type": "continue", "options": {}}
+    # The first message must be unique per conversation for the fake LLM's finish schedule
+    content = f"[user {user_idx} convo {convo_idx} turn {turn}] {rng.choice(SENTENCES)}"
+    return {"content": content, "response_type": "text", "options": {}}
+
+
+def run_user(user_idx, gateway, args, recorder, run_id):
+    import requests
+
+    rng = random.Random(args.seed * 100_003 + user_idx)
+    s = requests.Session()
+
+    def call(method, path, endpoint=None, state=None, **kwargs):
+        start = time.perf_counter()
+        try:
+            resp = s.request(method, gateway + path, timeout=args.timeout, **kwargs)
+            ok = resp.status_code < 400 and "error" not in (resp.json() if resp.content else {})
+        except (requests.RequestException, ValueError):
+            resp, ok = None, False
+        recorder.record(endpoint or path, time.perf_counter() - start, state=state, ok=ok)
+        return resp if ok else None
+
+    creds = {"email": f"bench-{run_id}-{user_idx}@example.com", "password": "benchmark"}
+    call("POST", "/api/auth/register", json=creds)
+    if call("POST", "/api/auth/login", json=creds) is None:
+        return
+
+    for convo_idx in range(args.conversations):
+        resp = call("POST", "/api/chat/new_chat")
+        if resp is None:
+            continue
+        bot = resp.json()
+        convo_id = bot["convo_id"]
+        state = "issue_interview"
+        for turn in range(args.max_turns):
+            if state == "complete" or bot.get("response_type") == "noinput":
+                break
+            if args.think_time:
+                time.sleep(rng.uniform(0, args.think_time))
+            body = {"conversation_id": convo_id,
+                    **_reply(rng, user_idx, convo_idx, turn, bot.get("response_type"), bot.get("options"))}
+            resp = call("POST", "/api/chat/send_message", state=state, json=body)
+            if resp is None:
+                break
+            bot = resp.json()
+            state = bot.get("convo_state") or state
+        if state == "complete":
+            recorder.conversation_done()
+
+        call("GET", "/api/chat/get_messages", params={"conversation_id": convo_id})
+        call("GET", "/api/chat/get_conversations")
+
+
+def start_services(args):
+    """
+    Start the stub LLM, bot service and gateway in this process.
+    Returns the gateway base URL.
+    """
+    for key, value in BENCH_ENV_DEFAULTS.items():
+        os.environ.setdefault(key, value)
+    os.environ["SQLALCHEMY_DATABASE_URI"] = args.database_url
+
+    if args.llm == "stub":
+        from bot.llm import FakeProvider
+        from benchmarks.stub_llm_server import start_stub_server
+        stub = start_stub_server(FakeProvider(seed=args.seed, latency_ms=args.llm_latency_ms))
+        os.environ["LLM_PROVIDER"] = "openai_compatible"
+        os.environ["LLM_BASE_URL"] = f"http://127.0.0.1:{stub.server_address[1]}/v1"
+    else:
+        os.environ["LLM_PROVIDER"] = "fake"
+        os.environ["FAKE_LLM_LATENCY_MS"] = str(args.llm_latency_ms)
+        os.environ["FAKE_LLM_SEED"] = str(args.seed)
+
+    # Scratch database: create the tables the services expect
+    from db.db_session import init_db
+    init_db()
+
+    import uvicorn
+    from werkzeug.serving import make_server
+    from bot.bot import app as bot_app
+    from flask_app.app import create_app
+    from flask_app.config import CurrentConfig
+
+    bot_server = uvicorn.Server(uvicorn.Config(bot_app, host="127.0.0.1", port=args.bot_port, log_level="warning"))
+    threading.Thread(target=bot_server.run, name="bot-service", daemon=True).start()
+    while not bot_server.started:
+        time.sleep(0.05)
+
+    CurrentConfig.BOT_SERVICE_URL = f"http://127.0.0.1:{args.bot_port}"
+    flask_app = create_app(CurrentConfig)
+    gateway = make_server("127.0.0.1", args.gateway_port, flask_app, threaded=True)
+    threading.Thread(target=gateway.serve_forever, name="gateway", daemon=True).start()
+    return f"http://127.0.0.1:{gateway.server_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end conversation throughput benchmark")
+    parser.add_argument("--users", type=int, default=10, help="Concurrent simulated users")
+    parser.add_argument("--conversations", type=int, default=1, help="Conversations per user")
+    parser.add_argument("--max-turns", type=int, default=40, help="Safety cap on turns per conversation")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Max random pause between turns (s)")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL", "postgresql://localhost/reappraise_bench"))
+    parser.add_argument("--llm", choices=["stub", "fake"], default="stub",
+                        help="stub: OpenAI-compatible HTTP stub server; fake: in-process fake provider")
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--bot-port", type=int, default=18001)
+    parser.add_argument("--gateway-port", type=int, default=18000)
+    parser.add_argument("--gateway-url", default=None, help="Benchmark a running gateway instead")
+    parser.add_argument("--output", default=None, help="Result file (default: benchmarks/results/...)")
+    args = parser.parse_args()
+
+    from benchmarks.common import summarize, save_results
+
+    db_stats = None
+    if args.gateway_url:
+        gateway = args.gateway_url.rstrip("/")
+    else:
+        gateway = start_services(args)
+        from db.stats import stats as db_stats
+        db_stats.reset()
+
+    recorder = Recorder()
+    run_id = uuid.uuid4().hex[:8]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.users) as pool:
+        for f in [pool.submit(run_user, i, gateway, args, recorder, run_id) for i in range(args.users)]:
+            f.result()
+    wall = time.perf_counter() - start
+
+    results = {
+        "wall_time_s": wall,
+        "throughput": {
+            "conversations_completed": recorder.conversations,
+            "conversations_per_s": recorder.conversations / wall,
+            "turns": recorder.turns,
+            "turns_per_s": recorder.turns / wall,
+        },
+        "latency_by_endpoint": {k: summarize(v) for k, v in sorted(recorder.by_endpoint.items())},
+        "latency_by_state": {k: summarize(v) for k, v in sorted(recorder.by_state.items())},
+        "errors": dict(recorder.errors),
+    }
+    if db_stats is not None:
+        snap = db_stats.snapshot()
+        results["db"] = {
+            **snap,
+            "statements_per_turn": snap["statements"] / max(recorder.turns, 1),
+            "statement_time_per_turn_ms": snap["statement_time"] / max(recorder.turns, 1) * 1000,
+        }
+
+    path = save_results("e2e", {"config": vars(args), "results": results}, args.output)
+
+    print(f"{recorder.conversations} conversations, {recorder.turns} turns in {wall:.1f}s "
+          f"({recorder.turns / wall:.1f} turns/s)")
+    for group in ("latency_by_state", "latency_by_endpoint"):
+        print(f"\n{group}:")
+        for key, s in results[group].items():
+            if s["count"]:
+                print(f"  {key:<32} n={s['count']:<6} p50={s['p50_ms']:8.1f} p95={s['p95_ms']:8.1f} p99={s['p99_ms']:8.1f} ms")
+    if "db" in results:
+        db = results["db"]
+        print(f"\ndb: {db['statements']} statements ({db['statements_per_turn']:.1f}/turn), "
+              f"{db['checkout_waits']} pool waits ({db['checkout_wait_time'] * 1000:.1f} ms)")
+    print(f"\nSaved {path}")
+
+
+if __name__ == "__main__":
+    main()
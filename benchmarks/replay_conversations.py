@@ -0,0 +1,180 @@
+# benchmarks/replay_conversations.py
+
+import argparse
+import json
+import os
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+
+'''
+Record-and-replay regression / performance runs.
+
+1) Export recorded completions and anonymized user transcripts from production:
+
+    python -m benchmarks.replay_conversations export --database-url $PROD_RO_URL --out replay/
+
+2) Replay them through the current bot_flow.py against a scratch database,
+   with every LLM call served from the recordings (no network):
+
+    python -m benchmarks.replay_conversations run --database-url postgresql://localhost/replay --recordings replay/
+
+A turn "diverges" when the new build moves to a different state than the
+recorded conversation did; the conversation stops there. Requests whose
+messages changed (e.g. an edited prompt) count as replay misses.
+'''
+
+
+def export(args):
+    from sqlalchemy import select
+    from sqlalchemy.orm import selectinload
+    from db.crud import get_llm_query_completion
+    from db.db_session import get_session
+    from db.models import LLMQuery, Message, Conversation, User, RoleEnum
+
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+    n_recordings = n_transcripts = 0
+
+    with get_session() as session, open(out / "recordings.jsonl", "w") as f:
+        stmt = (select(LLMQuery)
+                .where(LLMQuery.request_hash.is_not(None), LLMQuery.deleted_at.is_(None))
+                .order_by(LLMQuery.id)
+                .options(selectinload(LLMQuery.completion_payload))
+                .execution_options(yield_per=1000))
+        for q in session.scalars(stmt):
+            f.write(json.dumps({
+                "request_hash": q.request_hash,
+                "content": get_llm_query_completion(session, q)["choices"][0]["message"]["content"],
+                "tokens_prompt": q.tokens_prompt,
+                "tokens_completion": q.tokens_completion,
+                "model": q.llm_model,
+            }) + "\n")
+            n_recordings += 1
+
+    with get_session() as session, open(out / "transcripts.jsonl", "w") as f:
+        stmt = (select(Conversation.id)
+                .join(User, User.id == Conversation.user_id)
+                .where(Conversation.deleted_at.is_(None))
+                .order_by(Conversation.id))
+        if not args.include_non_consenting:
+            stmt = stmt.where(User.research_consent.is_(True))
+        if args.limit:
+            stmt = stmt.limit(args.limit)
+        for convo_id in session.scalars(stmt).all():
+            msgs = session.scalars(
+                select(Message)
+                .where(Message.conversation_id == convo_id, Message.role == RoleEnum.USER,
+                       Message.deleted_at.is_(None))
+                .order_by(Message.id)
+            ).all()
+            if not msgs:
+                continue
+            # No user or conversation ids leave the database
+            f.write(json.dumps({"turns": [{
+                "state": m.state.value,
+                "content": m.content,
+                "response_type": m.response_type.value,
+                "options": m.options,
+            } for m in msgs]}) + "\n")
+            n_transcripts += 1
+
+    print(f"Exported {n_recordings} recordings and {n_transcripts} transcripts to {out}")
+
+
+def run(args):
+    from bot.llm import ReplayProvider, FakeProvider, set_provider
+    from bot.bot_flow import run_state_logic, start_conversation
+    from db.db_session import get_session, init_db
+    from db.models import User, RoleEnum
+    from benchmarks.common import summarize, save_results
+
+    recordings = Path(args.recordings)
+    fallback = FakeProvider(latency_ms=0, latency_dist="constant") if args.fallback_fake else None
+    provider = ReplayProvider.from_file(str(recordings / "recordings.jsonl"), fallback=fallback)
+    set_provider(provider)
+
+    init_db()
+    with get_session() as session:
+        user = User(email=f"replay-{uuid.uuid4().hex[:8]}@example.com")
+        session.add(user)
+        session.commit()
+        user_id = user.id
+
+    with open(recordings / "transcripts.jsonl") as f:
+        transcripts = [json.loads(line) for line in f if line.strip()]
+    if args.limit:
+        transcripts = transcripts[:args.limit]
+
+    by_state = defaultdict(list)
+    divergences = defaultdict(int)
+    turns = completed = 0
+    start = time.perf_counter()
+    for transcript in transcripts:
+        with get_session() as session:
+            convo_id = start_conversation(session, user_id=user_id)["convo_id"]
+        recorded = transcript["turns"]
+        for i, turn in enumerate(recorded):
+            t0 = time.perf_counter()
+            result = run_state_logic(convo_id, user_id, {
+                "role": RoleEnum.USER,
+                "content": turn["content"],
+                "response_type": turn["response_type"],
+                "options": turn["options"],
+            })
+            by_state[turn["state"]].append(time.perf_counter() - t0)
+            turns += 1
+            new_state = getattr(result.get("convo_state"), "value", result.get("convo_state"))
+            expected = recorded[i + 1]["state"] if i + 1 < len(recorded) else None
+            if expected is not None and new_state != expected:
+                divergences[f"{turn['state']}->{new_state} (recorded {expected})"] += 1
+                break
+            if new_state == "complete":
+                completed += 1
+    wall = time.perf_counter() - start
+
+    results = {
+        "conversations": len(transcripts),
+        "completed": completed,
+        "turns": turns,
+        "wall_time_s": wall,
+        "turns_per_s": turns / wall if wall else 0.0,
+        "replay_hits": provider.hits,
+        "replay_misses": provider.misses,
+        "divergences": dict(divergences),
+        "latency_by_state": {k: summarize(v) for k, v in sorted(by_state.items())},
+    }
+    path = save_results("replay", {"config": vars(args), "results": results}, args.output)
+    print(f"{turns} turns over {len(transcripts)} conversations in {wall:.1f}s; "
+          f"{provider.hits} hits, {provider.misses} misses, {sum(divergences.values())} divergences")
+    print(f"Saved {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export and replay recorded conversations")
+    parser.add_argument("--database-url", default=os.getenv("SQLALCHEMY_DATABASE_URI"))
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("export", help="Export recordings and transcripts")
+    p.add_argument("--out", required=True)
+    p.add_argument("--limit", type=int, default=None)
+    p.add_argument("--include-non-consenting", action="store_true",
+                   help="Also export conversations of users without research consent")
+
+    p = sub.add_parser("run", help="Replay transcripts through the current bot flow")
+    p.add_argument("--recordings", required=True)
+    p.add_argument("--limit", type=int, default=None)
+    p.add_argument("--fallback-fake", action="store_true",
+                   help="Answer unmatched requests with the fake provider instead of failing")
+    p.add_argument("--output", default=None)
+
+    args = parser.parse_args()
+    if args.database_url:
+        os.environ["SQLALCHEMY_DATABASE_URI"] = args.database_url
+
+    export(args) if args.command == "export" else run(args)
+
+
+if __name__ == "__main__":
+    main()
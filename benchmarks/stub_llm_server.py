@@ -0,0 +1,79 @@
+# benchmarks/stub_llm_server.py
+
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bot.llm import FakeProvider, LLMError
+
+'''
+OpenAI-compatible stub server backed by FakeProvider.
+
+python -m benchmarks.stub_llm_server --port 8090 --latency-ms 300
+LLM_PROVIDER=openai_compatible LLM_BASE_URL=http://localhost:8090/v1 uvicorn bot.bot:app --port 8001
+'''
+
+
+def make_handler(provider: FakeProvider):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send(404, {"error": {"message": "Not found"}})
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            try:
+                completion = provider.complete(payload.get("messages", []), model=payload.get("model", "stub"))
+            except LLMError as e:
+                self._send(500, {"error": {"message": str(e)}})
+                return
+            self._send(200, completion.raw)
+
+        def _send(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass  # keep benchmark output clean
+
+    return StubHandler
+
+
+def start_stub_server(provider: FakeProvider, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """
+    Start the stub server in a daemon thread and return it.
+    The bound port is server.server_address[1].
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(provider))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-llm", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency-dist", default="lognormal", choices=["constant", "uniform", "lognormal"])
+    parser.add_argument("--latency-ms", type=float, default=400.0)
+    parser.add_argument("--tokens-per-sec", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    provider = FakeProvider(seed=args.seed, latency_dist=args.latency_dist, latency_ms=args.latency_ms,
+                            tokens_per_sec=args.tokens_per_sec, failure_rate=args.failure_rate)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(provider))
+    print(f"Stub LLM server listening on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,6 @@
 # bot/bot.py
 
-from fastapi import FastAPI, Request
-import yaml
-from pathlib import Path
+from fastapi import FastAPI, Request, Response
 from db.crud import (
     get_user_conversations, 
     get_conversation_messages, 
@@ -11,106 +9,229 @@ from db.crud import (
     get_conversation_by_id,
     update_conversation
     )
-import openai
 import asyncio
 from fastapi.exceptions import HTTPException
 # from db.db_session_async import get_async_session
 from db.db_session import get_session
+from db import partitions, retention, stats as db_stats
 from db.models import RoleEnum, ResponseTypeEnum, ConvoStateEnum
-from bot.bot_flow import run_state_logic, Chatbot
+from bot.bot_flow import run_state_logic, start_conversation
 from bot.logger_setup import setup_logger
 from bot.config import CurrentConfig
+from bot.registry import enable_hot_reload, get_registry
+from bot.llm import get_provider
+from fastapi.encoders import jsonable_encoder
+from telemetry import log, memory, metrics, profiling, timing, tracing
+import uuid
+import json
+import time
 
 '''
 uvicorn bot.bot:app --host 0.0.0.0 --port 8001 --reload
 '''
 # Set up the logger
+log.set_service("bot")
 logger = setup_logger()
 
-# Get the directory of the current script
-current_dir = Path(__file__).parent
-
-# Load the prompts and bot messages
-prompts_file = current_dir / 'prompts.yml'
-with open(prompts_file, "r") as ymlfile:
-    prompts = yaml.safe_load(ymlfile)
-    
-bot_msgs_file = current_dir / 'bot_msgs.yml'
-with open(bot_msgs_file, "r") as ymlfile:
-    bot_msgs = yaml.safe_load(ymlfile)
+# Watch prompts.yml / bot_msgs.yml for changes
+enable_hot_reload(CurrentConfig.registry_reload_interval)
+# Parse the YAML now: with preload_app this happens once in the gunicorn
+# master and the workers share the snapshot copy-on-write
+get_registry()
 
 # Initialize the FastAPI app
 app = FastAPI()
+metrics.install_db_hooks()
+tracing.init_tracing("bot")
+timing.install_db_hooks()
+
+# Memory gauges, cache accounting and optional RSS-based recycling
+memory.register_cache("registry", get_registry)
+memory.register_cache("llm_provider", get_provider)
+
+@app.on_event("startup")
+def start_partition_maintenance():
+    # Per worker, after the fork; workers take turns via an advisory lock
+    partitions.start_maintenance(CurrentConfig.partition_maintenance_interval)
+    retention.start_retention(CurrentConfig.retention_interval)
+    # Not at import: with preload_app that would run it in the gunicorn master
+    memory.start_monitor(CurrentConfig.memory_monitor_interval, CurrentConfig.max_rss_mb)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    # SQL statements per request; repeats are logged as N+1 candidates
+    tracker, token = db_stats.start_tracking(f"{request.method} {request.url.path}")
+    # Same turn id as the gateway's log lines for this request
+    log_token = log.bind(turn_id=request.headers.get("X-Turn-Id") or uuid.uuid4().hex[:16])
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template, not the raw path, to bound cardinality
+        route = request.scope.get("route")
+        endpoint = getattr(route, "path", "unmatched")
+        metrics.observe_request("bot", request.method, endpoint, status, time.perf_counter() - start)
+        tracker.label = f"{request.method} {endpoint}"
+        db_stats.stop_tracking(tracker, token)
+        log.unbind(log_token)
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    # Continue the trace started by the gateway (traceparent header)
+    span, token = tracing.start_server_span(f"{request.method} {request.url.path}", request.headers)
+    status, error = 500, None
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        route = request.scope.get("route")
+        if route is not None:
+            span.update_name(f"{request.method} {route.path}")
+        tracing.end_server_span(span, token, status, error)
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    # Opt-in: X-Profile: <ADMIN_TOKEN> samples this request (see telemetry/profiling.py)
+    profiler = profiling.profile_request("bot", f"{request.method} {request.url.path}",
+                                         request.headers.get(profiling.PROFILE_HEADER))
+    if profiler is None:
+        return await call_next(request)
+    try:
+        response = await call_next(request)
+    finally:
+        path = await asyncio.to_thread(profiler.stop)
+    response.headers[profiling.OUTPUT_HEADER] = str(path)
+    return response
+
+@app.post("/admin/profile")
+async def admin_profile(request: Request, seconds: float = 10):
+    """
+    Profile every thread of this worker for a time window.
+    """
+    if not profiling.authorized(request.headers.get(profiling.PROFILE_HEADER)):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    profiler = profiling.start_profiler("bot", "window", seconds=seconds)
+    if profiler is None:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    return {"profile": str(profiler.path), "seconds": profiler.max_seconds}
+
+@app.get("/admin/memory")
+async def admin_memory(request: Request):
+    if not profiling.authorized(request.headers.get(profiling.PROFILE_HEADER)):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return await asyncio.to_thread(memory.stats)
+
+@app.post("/admin/memory/snapshot")
+async def admin_memory_snapshot(request: Request, top: int = 25):
+    """
+    tracemalloc diff against the previous snapshot (the first call starts tracing).
+    """
+    if not profiling.authorized(request.headers.get(profiling.PROFILE_HEADER)):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return await asyncio.to_thread(memory.snapshot, top)
+
+@app.delete("/admin/memory/snapshot")
+async def admin_memory_stop(request: Request):
+    if not profiling.authorized(request.headers.get(profiling.PROFILE_HEADER)):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    memory.stop_tracemalloc()
+    return {"status": "tracing stopped"}
+
+@app.get("/health")
+def health():
+    return {"status": "healthy"}
+
+@app.get("/metrics")
+def get_metrics():
+    body, content_type = metrics.render_latest()
+    return Response(content=body, media_type=content_type)
+
+def _start_turn(request: Request, turn):
+    queue_ms = timing.queue_ms(request.headers)
+    if queue_ms is not None:
+        turn.add("queue", queue_ms)
+
+def _timed_response(request: Request, turn, content=None, body: bytes = None) -> Response:
+    """
+    Serialize the response and attach the turn's Server-Timing breakdown.
+    """
+    with turn.measure("serialize"):
+        if body is None:
+            body = json.dumps(jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")).encode()
+        if timing.debug_requested(request.headers):
+            body = body[:-1] + b',"timing":' + json.dumps(turn.as_dict()).encode() + b"}"
+    headers = {"Server-Timing": timing.format_server_timing(turn.entries())}
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @app.post("/new_chat")
 async def new_chat(request: Request):
-    data = await request.json()
-    
-    with get_session() as session:
-        try:
-            convo = create_conversation(session=session, user_id=data['user_id'])
-            session.flush()
-            resp = {
-                "convo_id": convo.id,
-                "role": RoleEnum.ASSISTANT,
-                "response_type": ResponseTypeEnum.TEXT,
-                "content": bot_msgs['start']['content'],
-                "options": None,
-            }
-            msg = create_message(session=session, 
-                                 user_id=data['user_id'], 
-                                 conversation_id=convo.id,
-                                 role=resp['role'],
-                                 state=ConvoStateEnum.START,
-                                 response_type=resp['response_type'],
-                                 content=resp['content'],
-                                 options=resp['options'])
-            
-            # Update the conversation state
-            convo.state = ConvoStateEnum.ISSUE_INTERVIEW
-            session.commit()
-            resp['msg_id'] = msg.id
-            return resp
-        except Exception as e:
-            logger.error(f"Error in /new_chat")
-            logger.exception(e)
-            session.rollback()
-            return {"error": "Internal server error"}
+    with timing.turn_timing("bot") as turn:
+        _start_turn(request, turn)
+        data = await request.json()
+
+        with get_session() as session:
+            try:
+                resp = start_conversation(session, user_id=data['user_id'])
+            except Exception as e:
+                logger.error(f"Error in /new_chat")
+                logger.exception(e)
+                session.rollback()
+                resp = {"error": "Internal server error"}
+    return _timed_response(request, turn, resp)
     
 @app.post("/send_message")
 async def send_message(request: Request):
-    data = await request.json()
+    with timing.turn_timing("bot") as turn:
+        _start_turn(request, turn)
+        data = await request.json()
 
-    user_id = data.get('user_id')
-    convo_id = data.get('conversation_id')
-    content = data.get('content') or ""
-    response_type = data.get('response_type')
-    options = data.get('options')
-    
-    user_msg = {
-        "role": RoleEnum.USER,
-        "content": content,
-        "response_type": response_type,
-        "options": options
-    }
+        user_id = data.get('user_id')
+        convo_id = data.get('conversation_id')
+        log_token = log.bind(conversation_id=convo_id)
+        try:
+            content = data.get('content') or ""
+            response_type = data.get('response_type')
+            options = data.get('options')
 
-    # 1) Let the BotFlow do its thing
-    result = run_state_logic(
-        conversation_id=convo_id,
-        user_id=user_id,
-        user_msg=user_msg
-    )
+            user_msg = {
+                "role": RoleEnum.USER,
+                "content": content,
+                "response_type": response_type,
+                "options": options
+            }
+
+            # 1) Let the BotFlow do its thing
+            result = run_state_logic(
+                conversation_id=convo_id,
+                user_id=user_id,
+                user_msg=user_msg
+            )
+        finally:
+            log.unbind(log_token)
 
     # 2) Format the return 
+    template = result.get("template")
+    if template is not None:
+        # Rating questions: reuse the pre-serialized body
+        with turn.measure("serialize"):
+            body = template.render(convo_id, result.get("msg_id"), result.get("convo_state"))
+        return _timed_response(request, turn, body=body)
+
     resp = {
         "convo_id": convo_id,
         "role": RoleEnum.ASSISTANT,
         "response_type": result.get("response_type"), 
         "content": result.get("content", ""),
         "options": result.get("options", {}),
+        "msg_id": result.get("msg_id"),
         "convo_state": result.get("convo_state")
     }
 
-    return resp
-
-    
\ No newline at end of file
+    return _timed_response(request, turn, resp)
@@ -1,99 +1,132 @@
 # bot_flow.py
 
-import yaml
 import json
 import logging
 from typing import Optional, List, Dict, Tuple
-from pathlib import Path
 import random
 
-import openai
 from db.crud import (
+    create_conversation,
     create_message,
     get_conversation_by_id,
     update_conversation,
     create_analysis_data,
     get_conversation_analysis_data,
+    get_conversation_ratings,
     create_llm_query,
 )
 
 from db.db_session import get_session
-from db.models import ConvoStateEnum, RoleEnum, ResponseTypeEnum, AnalysisData
+from db.models import ConvoStateEnum, RoleEnum, ResponseTypeEnum, AnalysisData, RATING_FIELDS
 from db.crud import get_conversation_messages
+from db.analytics import record_completion, record_reappraisal
+from db.message_options import compact_options, publish_registry_version, question_id_of
 from bot.config import CurrentConfig
 from bot.logger_setup import setup_logger
 from bot.label_conversation import label_convo
+from bot.registry import Registry, get_registry
+from bot.llm import get_provider, canonical_messages, model_label, request_hash
+from telemetry import metrics, timing, tracing
+from telemetry.log import truncated, sampled
+import time
 
 logger = setup_logger()
 
-# Load prompts and bot_msgs
-bot_dir = Path(__file__).parent
-with open(bot_dir / "bot_msgs.yml", "r") as f:
-    bot_msgs = yaml.safe_load(f)
-
-with open(bot_dir / "prompts.yml", "r") as f:
-    prompts = yaml.safe_load(f)
-
 # Need to link the llm query table id and messaage ids
 
 class Chatbot:
     """
-    A small utility to query OpenAI with a 'system' prompt + conversation history.
+    A small utility to query the LLM provider with a 'system' prompt + conversation history.
     """
     @staticmethod
     def query_gpt(system_prompt: str,
                   messages: List[Dict[str, str]],
                   user_id: Optional[int] = None,
                   message_id: Optional[int] = None,
+                  conversation_id: Optional[int] = None,
                   max_tries: int = 3) -> str:
         """
         Query GPT with the system prompt + any additional messages.
         Returns the text or an empty string if it fails.
+        The llm_queries row records user_id, conversation_id and message_id;
+        db/retention.py deletes it (and its payloads) with the conversation.
         """
+        provider = get_provider()
         model = CurrentConfig.openai_chat_model
         temperature = CurrentConfig.openai_temperature
 
         # Construct the final message array
         full_messages = [{"role": "developer", "content": system_prompt}] + messages
-        logger.debug(f"Calling OpenAI with {len(messages)} messages and system prompt: {system_prompt}")
+        request_messages = canonical_messages(full_messages)
+        request_key = request_hash(request_messages)
+        if sampled():
+            logger.debug("Calling %s with %d messages and system prompt: %s",
+                         provider.name, len(messages), truncated(system_prompt))
         for attempt in range(max_tries):
             try:
                 # Query GPT
-                completion = openai.chat.completions.create(
-                    model=model,
-                    temperature=temperature,
-                    messages=full_messages,
-                )
-                logger.debug(f"OpenAI response: {completion.choices[0].message.content}")
-                gpt_output = completion.choices[0].message.content
-                tokens_prompt = completion.usage.prompt_tokens
-                tokens_completion = completion.usage.completion_tokens
+                start = time.perf_counter()
+                try:
+                    with tracing.span("llm.complete", kind=tracing.SpanKind.CLIENT, attributes={
+                        "llm.provider": provider.name,
+                        "llm.model": model,
+                        "llm.attempt": attempt,
+                        "llm.request_hash": request_key,
+                    }) as span:
+                        completion = provider.complete(
+                            full_messages,
+                            model=model,
+                            temperature=temperature,
+                        )
+                        span.set_attribute("llm.tokens_prompt", completion.tokens_prompt or 0)
+                        span.set_attribute("llm.tokens_completion", completion.tokens_completion or 0)
+                except Exception:
+                    elapsed = time.perf_counter() - start
+                    metrics.observe_llm_call(provider.name, model, elapsed, False, attempt)
+                    timing.record_llm(model, elapsed, ok=False)
+                    raise
+                elapsed = time.perf_counter() - start
+                metrics.observe_llm_call(provider.name, model, elapsed, True, attempt)
+                timing.record_llm(completion.model or model, elapsed, completion.tokens_prompt,
+                                  completion.tokens_completion)
+                metrics.observe_llm_tokens(completion.model or model, completion.tokens_prompt,
+                                           completion.tokens_completion)
+                logger.debug("LLM response: %s", truncated(completion.content))
+                gpt_output = completion.content
+                tokens_prompt = completion.tokens_prompt
+                tokens_completion = completion.tokens_completion
                 
                 output = {
                     "content": gpt_output,
                     "tokens_prompt": tokens_prompt,
-                    "tokens_completion": tokens_completion
+                    "tokens_completion": tokens_completion,
+                    "llm_model": model_label(provider.name, completion.model or model),
                     }
                 
                 # Save the query to the DB
-                completion_dict = completion.to_dict()
+                completion_dict = completion.raw
                 with get_session() as session:
                     llm_query = create_llm_query(
                         session=session,
                         user_id=user_id,
+                        conversation_id=conversation_id,
                         message_id=message_id,
                         completion=completion_dict,
                         tokens_prompt=tokens_prompt,
                         tokens_completion=tokens_completion,
-                        llm_model=model
+                        llm_model=completion.model,
+                        latency_ms=elapsed * 1000,
+                        request_hash=request_key,
+                        request_messages=request_messages
                     )
                     output["llm_query_id"] = llm_query.id
                     session.commit()
                 return output
             except Exception as e:
-                logger.error(f"Error calling OpenAI (attempt {attempt+1})")
+                logger.error(f"Error calling {provider.name} (attempt {attempt+1})")
                 logger.exception(e)
         
+        metrics.LLM_GIVE_UPS.labels(model).inc()
         logger.error("Max retries reached for query_gpt. Returning empty string.")
         return {"content": "", "tokens_prompt": 0, "tokens_completion": 0}
 
@@ -106,11 +139,13 @@ class BotStep:
       - next_state
       - generate_output
     """
-    def __init__(self, conversation_id: int, user_id: int):
+    def __init__(self, conversation_id: int, user_id: int, registry: Optional[Registry] = None):
         self.conversation_id = conversation_id
         self.user_id = user_id
         self.user_msg = None          # The current message object (if any)
+        self.message_id = None        # Id of the stored user message, set by run_state_logic
         self.bot_msg = None           # The bot's message object(s), if applicable
+        self.registry = registry or get_registry()  # Prompts/bot_msgs snapshot for this turn
         
         logger.debug(f"Initializing {self.__class__.__name__} with convo_id={conversation_id}, user_id={user_id}")
 
@@ -150,6 +185,35 @@ class BotStep:
         """
         return None
 
+    def _query_llm(self, system_prompt: str, messages: List[Dict[str, str]]) -> Dict:
+        """
+        Chatbot.query_gpt, recording the query against this turn's
+        user, conversation and message.
+        """
+        return Chatbot.query_gpt(system_prompt, messages, user_id=self.user_id, message_id=self.message_id,
+                                 conversation_id=self.conversation_id)
+
+    def _question_msg(self, question_id: str) -> Dict:
+        """
+        Return the pre-built rating question for question_id.
+        The options mapping is shared across requests and read-only.
+        """
+        return self.registry.question(question_id).as_bot_msg()
+
+    def _missing_fields(self, session) -> List[str]:
+        """
+        Returns the rating fields of the current state that have no answer yet.
+        Reads the conversation's single conversation_ratings row.
+        """
+        required = self.registry.required_for(self._current_state())
+        if set(required) <= set(RATING_FIELDS):
+            ratings = get_conversation_ratings(session, self.conversation_id)
+            have_fields = ratings.answered() if ratings else set()
+        else:
+            # A question without a ratings column (bot_msgs.yml ahead of the schema)
+            have_fields = {d.field for d in get_conversation_analysis_data(session, self.conversation_id)}
+        return [f for f in required if f not in have_fields]
+
     def _current_state(self) -> ConvoStateEnum:
         """
         Return the ConvoStateEnum that this BotStep represents.
@@ -179,7 +243,7 @@ class BotStart(BotStep):
         and provide a starter message from the bot_msgs.yml
         """
         bot_msg = {
-            "content": bot_msgs["start"]["content"],
+            "content": self.registry.bot_msg("start")["content"],
             "response_type": ResponseTypeEnum.TEXT,
             "convo_state": ConvoStateEnum.ISSUE_INTERVIEW,
             "options": {"question_id": "start"}
@@ -206,10 +270,11 @@ class BotIssueInterview(BotStep):
         
         if len(convo_msgs) == 2:
             # Label the conversation
-            label_convo(self.conversation_id)
+            label_convo(self.conversation_id, registry=self.registry, user_id=self.user_id,
+                        message_id=self.message_id)
 
-        system_prompt = prompts["issue_interview"]
-        gpt_query_output = Chatbot.query_gpt(system_prompt, convo_msgs)  # {"content": "...", "token_prompt": 123, "token_completion": 456}
+        system_prompt = self.registry.prompt("issue_interview")
+        gpt_query_output = self._query_llm(system_prompt, convo_msgs)  # {"content": "...", "token_prompt": 123, "token_completion": 456}
         gpt_response = gpt_query_output["content"]
         finished = "::finished::" in gpt_response
         gpt_clean = gpt_response.replace("::finished::", "")
@@ -239,7 +304,7 @@ class BotIssueInterview(BotStep):
         """
         We simply return the bot response we passed from .next_state().
         """
-        logger.debug(f"BotIssueInterview.generate_output: {kwargs}")
+        logger.debug("BotIssueInterview.generate_output: %s", truncated(kwargs))
         if "bot_msg" in kwargs:
             return kwargs["bot_msg"]
         
@@ -279,7 +344,7 @@ class BotRateIssue(BotStep):
     
     def process_input(self, user_msg):
         super().process_input(user_msg)
-        logger.debug(f"BotRateIssue.process_input: {user_msg}")
+        logger.debug("BotRateIssue.process_input: %s", truncated(user_msg))
         
         # Save the issue rating to the DB
         with self._get_session() as session:
@@ -288,7 +353,7 @@ class BotRateIssue(BotStep):
                     session=session, 
                     user_id=self.user_id, 
                     conversation_id=self.conversation_id, 
-                    field=user_msg["options"].get("question_id"),
+                    field=question_id_of(user_msg["options"]),
                     content=user_msg["content"]
                 )
                 session.commit()
@@ -302,8 +367,7 @@ class BotRateIssue(BotStep):
 
         """
         with self._get_session() as session:
-            data = get_conversation_analysis_data(session, self.conversation_id)
-            missing_fields = self._missing_fields(data)
+            missing_fields = self._missing_fields(session)
 
         if not missing_fields:
             # All rating questions are answered
@@ -329,30 +393,27 @@ class BotRateIssue(BotStep):
         if not question_id:
             logger.debug("No question_id in kwargs.")
             with self._get_session() as session:
-                data = get_conversation_analysis_data(session, self.conversation_id)
-                missing_fields = self._missing_fields(data)
+                missing_fields = self._missing_fields(session)
             if missing_fields:
                 question_id = missing_fields[0]
             else:
                 return None
-        bot_msg = bot_msgs[question_id].copy()
-        bot_msg['options']['question_id'] = question_id
+        bot_msg = self._question_msg(question_id)
         # logger.debug(f"BotRateIssue.generate_output: {bot_msg}")
         return bot_msg
 
-    def _missing_fields(self, data: List[AnalysisData]) -> List[str]:
-        """
-        Returns a list of rating fields still None for RATE_ISSUE.
-        """
-        req_fields = ["rate_issue_neg", "rate_issue_pos"]
-        have_fields = [d.field for d in data]
-        missing = [f for f in req_fields if f not in have_fields]
-        return missing
         
     
 
 
 class BotGenerateReappraisal(BotStep):
+    # Conversation states whose messages are sent to the LLM
+    relevant_states = [
+        ConvoStateEnum.ISSUE_INTERVIEW,
+    ]
+    # Registry prompt that writes the reappraisal; analytics break ratings down by it
+    reappraisal_prompt = "general_reappraise"
+
     def _current_state(self):
         return ConvoStateEnum.GENERATE_REAP
 
@@ -371,11 +432,15 @@ class BotGenerateReappraisal(BotStep):
 
     def generate_output(self, **kwargs) -> Optional[str]:
         
-        gpt_query_output = Chatbot.query_gpt(
-            system_prompt=prompts["general_reappraise"],
+        gpt_query_output = self._query_llm(
+            system_prompt=self.registry.prompt(self.reappraisal_prompt),
             messages=self._gather_relevant_messages()
         )
         reappraisal = gpt_query_output["content"]
+        with self._get_session() as session:
+            record_reappraisal(session, self.user_id, self.conversation_id, reappraisal=self.reappraisal_prompt,
+                               llm_model=gpt_query_output.get("llm_model"))
+            session.commit()
         bot_msg = {
             "content": reappraisal,
             "response_type": ResponseTypeEnum.CONTINUE,
@@ -403,9 +468,6 @@ class BotGenerateReappraisal(BotStep):
         """
         Similar to the gather messages approach in the other steps.
         """
-        relevant_states = [
-            ConvoStateEnum.ISSUE_INTERVIEW,
-        ]
         with self._get_session() as session:
             msgs = get_conversation_messages(session, self.conversation_id)
             # Convert to OpenAI's format: [{"role": "user", "content": "..."}]
@@ -413,7 +475,7 @@ class BotGenerateReappraisal(BotStep):
             for m in msgs:
                 # We'll only feed user/assistant messages to GPT
                 if m.role == RoleEnum.USER or m.role == RoleEnum.ASSISTANT:
-                    if m.state in relevant_states:
+                    if m.state in self.relevant_states:
                         result.append({"role": m.role.value, "content": m.content})
         return result
 
@@ -430,7 +492,7 @@ class BotRateReap1(BotStep):
             user_msg (_type_): _description_
         """
         super().process_input(user_msg)
-        logger.debug(f"BotRateReap1.process_input: {user_msg}")
+        logger.debug("BotRateReap1.process_input: %s", truncated(user_msg))
         
         # Save the reappraisal rating to the DB
         with self._get_session() as session:
@@ -439,7 +501,7 @@ class BotRateReap1(BotStep):
                     session=session, 
                     user_id=self.user_id, 
                     conversation_id=self.conversation_id, 
-                    field=user_msg["options"].get("question_id"),
+                    field=question_id_of(user_msg["options"]),
                     content=user_msg["content"]
                 )
                 session.commit()
@@ -453,8 +515,7 @@ class BotRateReap1(BotStep):
         
         """
         with self._get_session() as session:
-            data = get_conversation_analysis_data(session, self.conversation_id)
-            missing_fields = self._missing_fields(data)
+            missing_fields = self._missing_fields(session)
 
         if not missing_fields:
             # All rating questions are answered
@@ -483,41 +544,38 @@ class BotRateReap1(BotStep):
         if not question_id:
             logger.debug("No question_id in kwargs.")
             with self._get_session() as session:
-                data = get_conversation_analysis_data(session, self.conversation_id)
-                missing_fields = self._missing_fields(data)
+                missing_fields = self._missing_fields(session)
             if missing_fields:
                 question_id = missing_fields[0]
             else:
                 return None
         
-        bot_msg = bot_msgs[question_id].copy()
-        bot_msg['options']['question_id'] = question_id
+        bot_msg = self._question_msg(question_id)
         # logger.debug(f"BotRateIssue.generate_output: {bot_msg}")
         return bot_msg
     
 
 
-    def _missing_fields(self, data: AnalysisData) -> List[str]:
-        
-        # get all fields in bot_msgs that start with rate_reap_1
-        req_fields = [k for k in bot_msgs.keys() if k.startswith("rate_reap_1")]
-        have_fields = [d.field for d in data]
-        missing = [f for f in req_fields if f not in have_fields]
-        return missing
 
 class BotRefineReap(BotStep):
+    # Conversation states whose messages are sent to the LLM
+    relevant_states = [
+        ConvoStateEnum.ISSUE_INTERVIEW,
+        ConvoStateEnum.GENERATE_REAP,
+        ConvoStateEnum.REFINE_REAP,
+    ]
     
-    def __init__(self, conversation_id, user_id):
-        super().__init__(conversation_id, user_id)
+    def __init__(self, conversation_id, user_id, registry=None):
+        super().__init__(conversation_id, user_id, registry)
         self.convo_msgs = None
     
     def _current_state(self):
         return ConvoStateEnum.REFINE_REAP
     
     def _make_bot_msg(self) -> Dict:
-        sys_prompt = prompts["refine_reappraisal"]
+        sys_prompt = self.registry.prompt("refine_reappraisal")
         self.convo_msgs = self._gather_relevant_messages()
-        gpt_query_output = Chatbot.query_gpt(sys_prompt, self.convo_msgs)
+        gpt_query_output = self._query_llm(sys_prompt, self.convo_msgs)
         bot_text = gpt_query_output["content"]
         bot_msg = {
             "content": bot_text,
@@ -568,11 +626,6 @@ class BotRefineReap(BotStep):
         Returns:
             _type_: _description_
         """
-        relevant_states = [
-            ConvoStateEnum.ISSUE_INTERVIEW,
-            ConvoStateEnum.GENERATE_REAP,
-            ConvoStateEnum.REFINE_REAP,
-        ]
         with self._get_session() as session:
             msgs = get_conversation_messages(session, self.conversation_id)
             # Convert to OpenAI's format: [{"role": "user", "content": "..."}]
@@ -580,7 +633,7 @@ class BotRefineReap(BotStep):
             for m in msgs:
                 # We'll only feed user/assistant messages to GPT
                 if m.role == RoleEnum.USER or m.role == RoleEnum.ASSISTANT:
-                    if m.state in relevant_states:
+                    if m.state in self.relevant_states:
                         result.append({"role": m.role.value, "content": m.content, "state": m.state})
         return result
     
@@ -624,7 +677,7 @@ class BotRateReap2(BotStep):
             user_msg (_type_): _description_
         """
         super().process_input(user_msg)
-        logger.debug(f"BotRateReap2.process_input: {user_msg}")
+        logger.debug("BotRateReap2.process_input: %s", truncated(user_msg))
         
         # Save the reappraisal rating to the DB
         with self._get_session() as session:
@@ -633,7 +686,7 @@ class BotRateReap2(BotStep):
                     session=session, 
                     user_id=self.user_id, 
                     conversation_id=self.conversation_id, 
-                    field=user_msg["options"].get("question_id"),
+                    field=question_id_of(user_msg["options"]),
                     content=user_msg["content"]
                 )
                 session.commit()
@@ -644,8 +697,7 @@ class BotRateReap2(BotStep):
 
     def next_state(self) -> Tuple[str, Dict]:
         with self._get_session() as session:
-            data = get_conversation_analysis_data(session, self.conversation_id)
-            missing_fields = self._missing_fields(data)
+            missing_fields = self._missing_fields(session)
 
         if not missing_fields:
             # All rating questions are answered
@@ -655,6 +707,7 @@ class BotRateReap2(BotStep):
                     session=session, 
                     conversation=get_conversation_by_id(session, self.conversation_id),
                     state=ConvoStateEnum.COMPLETE)
+                record_completion(session, self.conversation_id, bot_version=self.registry.version)
                 session.commit()
             return (ConvoStateEnum.COMPLETE, {})
         else:
@@ -667,23 +720,15 @@ class BotRateReap2(BotStep):
         if not question_id:
             logger.debug("No question_id in kwargs.")
             with self._get_session() as session:
-                data = get_conversation_analysis_data(session, self.conversation_id)
-                missing_fields = self._missing_fields(data)
+                missing_fields = self._missing_fields(session)
             if missing_fields:
                 question_id = missing_fields[0]
             else:
                 return None
         
-        bot_msg = bot_msgs[question_id].copy()
-        bot_msg['options']['question_id'] = question_id
+        bot_msg = self._question_msg(question_id)
         return bot_msg
     
-    def _missing_fields(self, data: AnalysisData) -> List[str]:
-        
-        req_fields = [k for k in bot_msgs.keys() if k.startswith("rate_reap_2")]
-        have_fields = [d.field for d in data]
-        missing = [f for f in req_fields if f not in have_fields]
-        return missing
     
 
 
@@ -696,7 +741,12 @@ class BotComplete(BotStep):
         return (ConvoStateEnum.COMPLETE, {})
 
     def generate_output(self, **kwargs) -> Optional[str]:
-        bot_msg = bot_msgs["complete"].copy()
+        template = self.registry.bot_msg("complete")
+        bot_msg = {
+            "content": template["content"],
+            "response_type": template["response_type"],
+            "options": [],
+        }
         return bot_msg
     
         
@@ -705,78 +755,137 @@ class BotComplete(BotStep):
 # ------------------------------------------------------------------------------
 # Example: State Machine Router
 # ------------------------------------------------------------------------------
-def run_state_logic(conversation_id: int, user_id: int, user_msg: Dict):
-    with BotStep(0,0)._get_session() as session:
-        convo = get_conversation_by_id(session, conversation_id)
-        if not convo:
-            return {"error": "Conversation not found."}
-        current_state = convo.state
-
-    # 2) Map ConvoStateEnum -> BotStep
-    state_map = {
-        ConvoStateEnum.START: BotStart,
-        ConvoStateEnum.ISSUE_INTERVIEW: BotIssueInterview,
-        ConvoStateEnum.RATE_ISSUE: BotRateIssue,
-        ConvoStateEnum.GENERATE_REAP: BotGenerateReappraisal,
-        ConvoStateEnum.RATE_REAP_1: BotRateReap1,
-        ConvoStateEnum.REFINE_REAP: BotRefineReap,
-        ConvoStateEnum.RATE_REAP_2: BotRateReap2,
-        ConvoStateEnum.COMPLETE: BotComplete
+def _stored_options(session, registry: Registry, options):
+    """
+    Options as persisted on the message: question options become a
+    {question_id, registry_version} reference (see db/message_options.py).
+    """
+    stored = compact_options(options, registry.version, registry.question_options)
+    if stored is not options:
+        publish_registry_version(session, registry.version, registry.question_options)
+    return stored
+
+
+def start_conversation(session, user_id: int, registry: Optional[Registry] = None) -> Dict:
+    """
+    Create a conversation with the bot's opening message and move it to ISSUE_INTERVIEW.
+    Commits the session and returns the response for the client.
+    """
+    registry = registry or get_registry()
+    convo = create_conversation(session=session, user_id=user_id)
+    session.flush()
+    resp = {
+        "convo_id": convo.id,
+        "role": RoleEnum.ASSISTANT,
+        "response_type": ResponseTypeEnum.TEXT,
+        "content": registry.bot_msg('start')['content'],
+        "options": None,
     }
+    msg = create_message(session=session, 
+                         user_id=user_id, 
+                         conversation_id=convo.id,
+                         role=resp['role'],
+                         state=ConvoStateEnum.START,
+                         response_type=resp['response_type'],
+                         content=resp['content'],
+                         options=resp['options'],
+                         bot_version=registry.version)
+    
+    # Update the conversation state
+    convo.state = ConvoStateEnum.ISSUE_INTERVIEW
+    session.commit()
+    resp['msg_id'] = msg.id
+    return resp
 
-    StepClass = state_map.get(current_state, BotComplete)
-    step_obj = StepClass(conversation_id, user_id)
-
-    # 3) process user input
-    if user_msg:
-        step_obj.process_input(user_msg)
-    # save to db
-    with step_obj._get_session() as session:
-        msg = create_message(
-            session=session,
-            user_id=user_id,
-            conversation_id=conversation_id,
-            content=step_obj.user_msg["content"],
-            role=RoleEnum.USER,
-            state=current_state,
-            response_type=step_obj.user_msg["response_type"],
-            options=user_msg["options"]
-        )
-        session.commit()
-        # step_obj.user_msg["msg_id"] = msg.id
-
-    # 4) move to next state
-    new_state, data = step_obj.next_state()
-    if current_state != new_state:
-        logger.debug(f"Moving from {current_state} to {new_state}")
-        StepClass = state_map.get(new_state, BotComplete)
-        step_obj = StepClass(conversation_id, user_id)
+
+def run_state_logic(conversation_id: int, user_id: int, user_msg: Dict):
+    # Pin one registry snapshot for the whole turn so a hot reload
+    # cannot change prompts halfway through.
+    registry = get_registry()
+
+    with metrics.track_turn() as turn, tracing.span("run_state_logic") as span:
+        span.set_attribute("conversation.id", conversation_id)
+        with BotStep(0, 0, registry)._get_session() as session:
+            convo = get_conversation_by_id(session, conversation_id)
+            if not convo:
+                return {"error": "Conversation not found."}
+            current_state = convo.state
+        turn.state = current_state.value
+        span.set_attribute("conversation.state", current_state.value)
+
+        # 2) Map ConvoStateEnum -> BotStep
+        state_map = {
+            ConvoStateEnum.START: BotStart,
+            ConvoStateEnum.ISSUE_INTERVIEW: BotIssueInterview,
+            ConvoStateEnum.RATE_ISSUE: BotRateIssue,
+            ConvoStateEnum.GENERATE_REAP: BotGenerateReappraisal,
+            ConvoStateEnum.RATE_REAP_1: BotRateReap1,
+            ConvoStateEnum.REFINE_REAP: BotRefineReap,
+            ConvoStateEnum.RATE_REAP_2: BotRateReap2,
+            ConvoStateEnum.COMPLETE: BotComplete
+        }
+
+        StepClass = state_map.get(current_state, BotComplete)
+        step_obj = StepClass(conversation_id, user_id, registry)
+
+        # 3) process user input
+        if user_msg:
+            with tracing.span(f"{StepClass.__name__}.process_input"):
+                step_obj.process_input(user_msg)
+        # save to db
+        with step_obj._get_session() as session:
+            msg = create_message(
+                session=session,
+                user_id=user_id,
+                conversation_id=conversation_id,
+                content=step_obj.user_msg["content"],
+                role=RoleEnum.USER,
+                state=current_state,
+                response_type=step_obj.user_msg["response_type"],
+                options=_stored_options(session, registry, user_msg["options"]),
+                bot_version=registry.version
+            )
+            session.commit()
+            step_obj.message_id = msg.id
+
+        # 4) move to next state
+        with tracing.span(f"{StepClass.__name__}.next_state"):
+            new_state, data = step_obj.next_state()
+        span.set_attribute("conversation.new_state", new_state.value)
+        if current_state != new_state:
+            logger.debug(f"Moving from {current_state} to {new_state}")
+            StepClass = state_map.get(new_state, BotComplete)
+            message_id = step_obj.message_id
+            step_obj = StepClass(conversation_id, user_id, registry)
+            step_obj.message_id = message_id
         
 
-    # 5) generate_output
-    bot_msg = step_obj.generate_output(**data) or {}
-    bot_msg["convo_state"] = new_state
+        # 5) generate_output
+        with tracing.span(f"{StepClass.__name__}.generate_output"):
+            bot_msg = step_obj.generate_output(**data) or {}
+        bot_msg["convo_state"] = new_state
     
-    # save to db
-    with step_obj._get_session() as session:
-        msg = create_message(
-            session=session,
-            user_id=user_id,
-            conversation_id=conversation_id,
-            content=bot_msg["content"],
-            role=RoleEnum.ASSISTANT,
-            state=new_state,
-            response_type=bot_msg["response_type"],
-            options=bot_msg["options"]
-        )
-        session.commit()
-        bot_msg["msg_id"] = msg.id
-
-    # 6) update conversation
-    with step_obj._get_session() as session:
-        convo = get_conversation_by_id(session, conversation_id)
-        if convo:
-            update_conversation(session, convo, state=new_state)
+        # save to db
+        with step_obj._get_session() as session:
+            msg = create_message(
+                session=session,
+                user_id=user_id,
+                conversation_id=conversation_id,
+                content=bot_msg["content"],
+                role=RoleEnum.ASSISTANT,
+                state=new_state,
+                response_type=bot_msg["response_type"],
+                options=_stored_options(session, registry, bot_msg["options"]),
+                bot_version=registry.version
+            )
             session.commit()
+            bot_msg["msg_id"] = msg.id
+
+        # 6) update conversation
+        with step_obj._get_session() as session:
+            convo = get_conversation_by_id(session, conversation_id)
+            if convo:
+                update_conversation(session, convo, state=new_state)
+                session.commit()
             
-    return bot_msg
\ No newline at end of file
+        return bot_msg
\ No newline at end of file
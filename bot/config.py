@@ -5,14 +5,41 @@ from dotenv import load_dotenv
 load_dotenv()
 
 class BaseConfig:
-    openai_api_key = os.environ['OPENAI_API_KEY']
+    openai_api_key = os.getenv('OPENAI_API_KEY')
     openai_chat_model = "gpt-4o-mini"
     openai_temperature = 1
 
+    # LLM backend: "openai", "openai_compatible" (self-hosted server), "fake" or "replay"
+    llm_provider = os.getenv("LLM_PROVIDER", "openai")
+    llm_base_url = os.getenv("LLM_BASE_URL")  # e.g. http://localhost:8080/v1
+    llm_api_key = os.getenv("LLM_API_KEY")
+    llm_replay_file = os.getenv("LLM_REPLAY_FILE")  # JSONL recordings; llm_queries is used if unset
+
+    # Fake provider settings (see bot/llm.py)
+    fake_llm_seed = int(os.getenv("FAKE_LLM_SEED", "0"))
+    fake_llm_latency_dist = os.getenv("FAKE_LLM_LATENCY_DIST", "lognormal")
+    fake_llm_latency_ms = float(os.getenv("FAKE_LLM_LATENCY_MS", "400"))
+    fake_llm_latency_sigma = float(os.getenv("FAKE_LLM_LATENCY_SIGMA", "0.5"))
+    fake_llm_tokens_per_sec = float(os.getenv("FAKE_LLM_TOKENS_PER_SEC", "0"))
+    fake_llm_failure_rate = float(os.getenv("FAKE_LLM_FAILURE_RATE", "0"))
+    fake_llm_finish_after = os.getenv("FAKE_LLM_FINISH_AFTER", "issue_interview=3,refine_reappraisal=2")
+
+    # Seconds between checks of prompts.yml / bot_msgs.yml for changes (0 disables)
+    registry_reload_interval = float(os.getenv("BOT_REGISTRY_RELOAD_INTERVAL", "0"))
+
+    # Seconds between worker memory checks (0 disables, see telemetry/memory.py)
+    memory_monitor_interval = float(os.getenv("BOT_MEMORY_MONITOR_INTERVAL", "30"))
+    # Recycle a worker whose RSS exceeds this many MiB (0 disables)
+    max_rss_mb = float(os.getenv("BOT_MAX_RSS_MB", "0"))
+
+    # Seconds between runs creating upcoming monthly partitions (0 disables, see db/partitions.py)
+    partition_maintenance_interval = float(os.getenv("BOT_PARTITION_MAINTENANCE_INTERVAL", "21600"))
+    # Seconds between retention runs purging expired rows (0 disables, see db/retention.py)
+    retention_interval = float(os.getenv("BOT_RETENTION_INTERVAL", "0"))
 
 
 class DevelopmentConfig(BaseConfig):
-    pass
+    registry_reload_interval = float(os.getenv("BOT_REGISTRY_RELOAD_INTERVAL", "2"))
     
 
 
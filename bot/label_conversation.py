@@ -11,28 +11,23 @@ from db.crud import (
 
 from db.db_session import get_session
 from bot.logger_setup import setup_logger
-import yaml
+from bot.registry import Registry, get_registry
 from typing import Optional, List, Dict, Tuple
-from pathlib import Path
 from db.models import RoleEnum, ResponseTypeEnum, ConvoStateEnum
 
 # Set up the logger
 logger = setup_logger()
 
-# Get the directory of the current script
-current_dir = Path(__file__).parent
-
-# Load the prompts and bot messages
-prompts_file = current_dir / 'prompts.yml'
-with open(prompts_file, "r") as ymlfile:
-    prompts = yaml.safe_load(ymlfile)
-
-def label_convo(convo_id: int) -> Dict:
+def label_convo(convo_id: int, registry: Optional[Registry] = None, user_id: Optional[int] = None,
+                message_id: Optional[int] = None) -> Dict:
     """
     Generate a label for a conversation based on the conversation messages and update the conversation with the label.
 
     Args:
         convo_id (int): ID of the conversation to label
+        registry (Optional[Registry]): Prompts snapshot to use, defaults to the current one
+        user_id (Optional[int]): Owner of the conversation, recorded on the LLM query
+        message_id (Optional[int]): User message that triggered the labeling, recorded on the LLM query
 
     Returns:
         Dict: Response dictionary with success or error message
@@ -43,8 +38,12 @@ def label_convo(convo_id: int) -> Dict:
         try:
             msgs = get_conversation_messages(session=session, conversation_id=convo_id)
             issue_msgs = [{"role": msg.role.lower(), "content": msg.content} for msg in msgs if msg.state == ConvoStateEnum.ISSUE_INTERVIEW]
-            gpt_query_output = Chatbot.query_gpt(system_prompt=prompts['label_issue'], 
-                                                 messages=issue_msgs)
+            registry = registry or get_registry()
+            gpt_query_output = Chatbot.query_gpt(system_prompt=registry.prompt('label_issue'), 
+                                                 messages=issue_msgs,
+                                                 user_id=user_id,
+                                                 message_id=message_id,
+                                                 conversation_id=convo_id)
             label_text = gpt_query_output["content"]
         except Exception as e:
             logger.error(f"Error labeling conversation")
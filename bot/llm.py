@@ -0,0 +1,485 @@
+# bot/llm.py
+
+import asyncio
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from bot.logger_setup import setup_logger
+
+logger = setup_logger()
+
+'''
+LLM providers used by the bot.
+
+    OpenAIProvider            - the OpenAI API (default)
+    OpenAICompatibleProvider  - any server exposing /v1/chat/completions
+                                (vLLM, llama.cpp server, Ollama, ...)
+    FakeProvider              - deterministic, in-process, no network
+    ReplayProvider            - serves completions recorded in llm_queries
+
+Select one with LLM_PROVIDER=openai|openai_compatible|fake|replay (see bot/config.py).
+'''
+
+
+@dataclass
+class LLMCompletion:
+    """
+    Provider-independent result of one chat completion.
+    `raw` is what gets stored (compacted) as the completion payload of the llm_queries row.
+    """
+    content: str
+    tokens_prompt: int
+    tokens_completion: int
+    model: str
+    raw: Dict = field(default_factory=dict)
+
+
+class LLMError(Exception):
+    """
+    Raised by providers when a completion fails.
+    """
+
+
+def canonical_messages(messages: List[Dict]) -> List[Dict[str, str]]:
+    """
+    Reduce messages to role/content, dropping bookkeeping keys such as "state".
+    """
+    return [{"role": str(getattr(m["role"], "value", m["role"])), "content": str(m["content"])}
+            for m in messages]
+
+
+def request_hash(messages: List[Dict]) -> str:
+    """
+    Content hash of a request, used to match recorded completions on replay.
+    """
+    data = json.dumps(canonical_messages(messages), ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def model_label(provider_name: str, model: str) -> str:
+    """
+    The model a completion is attributed to in analytics: the model itself
+    for OpenAI, prefixed with the provider otherwise, so fake, replayed and
+    self-hosted runs are not counted as the OpenAI model they were asked for.
+    """
+    return model if provider_name == OpenAIProvider.name else f"{provider_name}/{model}"
+
+
+class LLMProvider:
+    """
+    Base class for chat completion backends.
+    Subclasses implement `complete`, and `acomplete` when they have a native async client.
+    """
+    name = "base"
+
+    def complete(self, messages: List[Dict[str, str]], model: str, **params) -> LLMCompletion:
+        raise NotImplementedError
+
+    async def acomplete(self, messages: List[Dict[str, str]], model: str, **params) -> LLMCompletion:
+        return await asyncio.to_thread(self.complete, messages, model, **params)
+
+
+# ------------------------------------------------------------------------------
+# OpenAI
+# ------------------------------------------------------------------------------
+
+class OpenAIProvider(LLMProvider):
+    name = "openai"
+
+    def __init__(self, api_key: Optional[str] = None, timeout: Optional[float] = None):
+        self.api_key = api_key
+        self.timeout = timeout
+        self._client = None
+        self._async_client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            import openai
+            self._client = openai.OpenAI(api_key=self.api_key, timeout=self.timeout)
+        return self._client
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            import openai
+            self._async_client = openai.AsyncOpenAI(api_key=self.api_key, timeout=self.timeout)
+        return self._async_client
+
+    @staticmethod
+    def _to_completion(completion, model: str) -> LLMCompletion:
+        return LLMCompletion(
+            content=completion.choices[0].message.content,
+            tokens_prompt=completion.usage.prompt_tokens,
+            tokens_completion=completion.usage.completion_tokens,
+            model=model,
+            raw=completion.to_dict(),
+        )
+
+    def complete(self, messages, model, **params) -> LLMCompletion:
+        completion = self.client.chat.completions.create(model=model, messages=messages, **params)
+        return self._to_completion(completion, model)
+
+    async def acomplete(self, messages, model, **params) -> LLMCompletion:
+        completion = await self.async_client.chat.completions.create(model=model, messages=messages, **params)
+        return self._to_completion(completion, model)
+
+
+# ------------------------------------------------------------------------------
+# OpenAI-compatible HTTP server
+# ------------------------------------------------------------------------------
+
+class OpenAICompatibleProvider(LLMProvider):
+    """
+    Talks plain HTTP to a self-hosted server implementing the OpenAI
+    chat completions API. Messages are reduced to role/content and the
+    "developer" role is sent as "system", which most local servers expect.
+    """
+    name = "openai_compatible"
+
+    def __init__(self, base_url: str, api_key: Optional[str] = None, timeout: float = 60.0):
+        self.url = base_url.rstrip("/") + "/chat/completions"
+        self.headers = {"Content-Type": "application/json"}
+        if api_key:
+            self.headers["Authorization"] = f"Bearer {api_key}"
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        # requests.Session is not thread-safe; keep one per thread for connection reuse
+        if not hasattr(self._local, "session"):
+            import requests
+            self._local.session = requests.Session()
+        return self._local.session
+
+    @staticmethod
+    def _payload(messages, model, params) -> Dict:
+        msgs = [{"role": "system" if m["role"] == "developer" else m["role"], "content": m["content"]}
+                for m in messages]
+        return {"model": model, "messages": msgs, **params}
+
+    @staticmethod
+    def _to_completion(data: Dict, model: str) -> LLMCompletion:
+        usage = data.get("usage") or {}
+        return LLMCompletion(
+            content=data["choices"][0]["message"]["content"],
+            tokens_prompt=usage.get("prompt_tokens", 0),
+            tokens_completion=usage.get("completion_tokens", 0),
+            model=data.get("model", model),
+            raw=data,
+        )
+
+    def complete(self, messages, model, **params) -> LLMCompletion:
+        import requests
+        try:
+            resp = self.session.post(self.url, headers=self.headers, timeout=self.timeout,
+                                     json=self._payload(messages, model, params))
+            resp.raise_for_status()
+        except requests.RequestException as e:
+            raise LLMError(f"Request to {self.url} failed") from e
+        return self._to_completion(resp.json(), model)
+
+    async def acomplete(self, messages, model, **params) -> LLMCompletion:
+        import aiohttp
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        try:
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                async with session.post(self.url, headers=self.headers,
+                                        json=self._payload(messages, model, params)) as resp:
+                    resp.raise_for_status()
+                    data = await resp.json()
+        except aiohttp.ClientError as e:
+            raise LLMError(f"Request to {self.url} failed") from e
+        return self._to_completion(data, model)
+
+
+# ------------------------------------------------------------------------------
+# Fake
+# ------------------------------------------------------------------------------
+
+FAKE_WORDS = (
+    "that sounds really hard and it makes sense you feel this way when something "
+    "you care about is at stake it may also be a chance to learn what matters most "
+    "to you and to treat yourself with the same kindness you would offer a friend"
+).split()
+
+
+class FakeProvider(LLMProvider):
+    """
+    Deterministic in-process provider for load tests and offline runs.
+
+    - Content and token counts depend only on `seed` and the request messages.
+    - Latency = sampled base latency + completion_tokens / tokens_per_sec.
+      latency_dist is "constant", "uniform" (latency_ms +/- latency_spread_ms)
+      or "lognormal" (median latency_ms, shape latency_sigma).
+    - failure_rate injects LLMError on that fraction of calls.
+    - finish_after maps a prompt name to the call number (per conversation)
+      on which "::finished::" is appended, so the interview and refinement
+      steps advance on a fixed schedule.
+    """
+    name = "fake"
+
+    def __init__(self,
+                 seed: int = 0,
+                 latency_dist: str = "lognormal",
+                 latency_ms: float = 400.0,
+                 latency_spread_ms: float = 200.0,
+                 latency_sigma: float = 0.5,
+                 tokens_per_sec: float = 0.0,
+                 completion_tokens: tuple = (20, 80),
+                 failure_rate: float = 0.0,
+                 finish_after: Optional[Dict[str, int]] = None,
+                 prompts: Optional[Dict[str, str]] = None):
+        self.seed = seed
+        self.latency_dist = latency_dist
+        self.latency_ms = latency_ms
+        self.latency_spread_ms = latency_spread_ms
+        self.latency_sigma = latency_sigma
+        self.tokens_per_sec = tokens_per_sec
+        self.completion_tokens = completion_tokens
+        self.failure_rate = failure_rate
+        self.finish_after = finish_after if finish_after is not None else {
+            "issue_interview": 3,
+            "refine_reappraisal": 2,
+        }
+        self._prompts = prompts
+        self._failure_rng = random.Random(seed)
+        self._calls = OrderedDict()  # (prompt name, conversation key) -> call count
+        self._lock = threading.Lock()
+
+    def _prompt_name(self, system_prompt: str) -> Optional[str]:
+        if self._prompts is None:
+            from bot.registry import get_registry
+            self._prompts = {text: name for name, text in get_registry().prompts.items()}
+        return self._prompts.get(system_prompt)
+
+    def _call_number(self, prompt_name: str, messages) -> int:
+        # The first user message identifies the conversation
+        first_user = next((m["content"] for m in messages if m["role"] == "user"), "")
+        key = (prompt_name, hashlib.sha1(first_user.encode()).hexdigest())
+        with self._lock:
+            n = self._calls.pop(key, 0) + 1
+            self._calls[key] = n
+            if len(self._calls) > 10_000:
+                self._calls.popitem(last=False)
+        return n
+
+    def _latency(self, rng: random.Random, tokens_completion: int) -> float:
+        if self.latency_dist == "constant":
+            ms = self.latency_ms
+        elif self.latency_dist == "uniform":
+            ms = rng.uniform(self.latency_ms - self.latency_spread_ms, self.latency_ms + self.latency_spread_ms)
+        else:
+            ms = self.latency_ms * math.exp(rng.gauss(0, self.latency_sigma))
+        seconds = max(ms, 0.0) / 1000
+        if self.tokens_per_sec > 0:
+            seconds += tokens_completion / self.tokens_per_sec
+        return seconds
+
+    def _build(self, messages, model) -> tuple:
+        with self._lock:
+            if self.failure_rate and self._failure_rng.random() < self.failure_rate:
+                raise LLMError("Injected fake LLM failure")
+
+        digest = hashlib.sha256(json.dumps([self.seed, messages], default=str).encode()).digest()
+        rng = random.Random(digest)
+
+        tokens_prompt = sum(len(str(m.get("content", ""))) for m in messages) // 4
+        tokens_completion = rng.randint(*self.completion_tokens)
+        content = " ".join(rng.choice(FAKE_WORDS) for _ in range(max(1, int(tokens_completion * 0.75))))
+        content = content[0].upper() + content[1:] + "."
+
+        system_prompt = messages[0]["content"] if messages and messages[0]["role"] in ("developer", "system") else ""
+        prompt_name = self._prompt_name(system_prompt)
+        if prompt_name in self.finish_after:
+            if self._call_number(prompt_name, messages) >= self.finish_after[prompt_name]:
+                content += " ::finished::"
+
+        completion = LLMCompletion(
+            content=content,
+            tokens_prompt=tokens_prompt,
+            tokens_completion=tokens_completion,
+            model=model,
+            raw={
+                "id": f"fake-{digest.hex()[:16]}",
+                "object": "chat.completion",
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": tokens_prompt, "completion_tokens": tokens_completion,
+                          "total_tokens": tokens_prompt + tokens_completion},
+            },
+        )
+        return completion, self._latency(rng, tokens_completion)
+
+    def complete(self, messages, model, **params) -> LLMCompletion:
+        completion, latency = self._build(messages, model)
+        time.sleep(latency)
+        return completion
+
+    async def acomplete(self, messages, model, **params) -> LLMCompletion:
+        completion, latency = self._build(messages, model)
+        await asyncio.sleep(latency)
+        return completion
+
+
+# ------------------------------------------------------------------------------
+# Replay
+# ------------------------------------------------------------------------------
+
+class ReplayProvider(LLMProvider):
+    """
+    Serves recorded completions for requests whose content hash matches.
+
+    Recordings come from a JSONL file (see benchmarks/replay_conversations.py
+    export) or are looked up lazily in llm_queries. Unmatched requests go to
+    `fallback` if given, otherwise raise LLMError. hits/misses are counted so
+    a replay run can report how far a new build diverged.
+    """
+    name = "replay"
+
+    def __init__(self,
+                 recordings: Optional[Dict[str, LLMCompletion]] = None,
+                 use_database: bool = False,
+                 fallback: Optional[LLMProvider] = None):
+        self.recordings = recordings if recordings is not None else {}
+        self.use_database = use_database
+        self.fallback = fallback
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "ReplayProvider":
+        recordings = {}
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    rec = json.loads(line)
+                    recordings[rec["request_hash"]] = LLMCompletion(
+                        content=rec["content"],
+                        tokens_prompt=rec.get("tokens_prompt") or 0,
+                        tokens_completion=rec.get("tokens_completion") or 0,
+                        model=rec.get("model") or "replay",
+                        raw=rec.get("completion") or {},
+                    )
+        return cls(recordings=recordings, **kwargs)
+
+    def _lookup_database(self, key: str) -> Optional[LLMCompletion]:
+        from db.db_session import get_session
+        from db.crud import get_llm_query_by_request_hash, get_llm_query_completion
+        with get_session() as session:
+            row = get_llm_query_by_request_hash(session, key)
+            if row is None:
+                return None
+            completion = get_llm_query_completion(session, row)
+            return LLMCompletion(
+                content=completion["choices"][0]["message"]["content"],
+                tokens_prompt=row.tokens_prompt or 0,
+                tokens_completion=row.tokens_completion or 0,
+                model=row.llm_model or "replay",
+                raw=completion,
+            )
+
+    def _lookup(self, messages) -> Optional[LLMCompletion]:
+        key = request_hash(messages)
+        completion = self.recordings.get(key)
+        if completion is None and self.use_database:
+            completion = self._lookup_database(key)
+            if completion is not None:
+                self.recordings[key] = completion
+        with self._lock:
+            if completion is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return completion
+
+    def complete(self, messages, model, **params) -> LLMCompletion:
+        completion = self._lookup(messages)
+        if completion is not None:
+            return completion
+        if self.fallback is not None:
+            return self.fallback.complete(messages, model, **params)
+        raise LLMError(f"No recorded completion for request {request_hash(messages)[:12]}")
+
+    async def acomplete(self, messages, model, **params) -> LLMCompletion:
+        completion = await asyncio.to_thread(self._lookup, messages)
+        if completion is not None:
+            return completion
+        if self.fallback is not None:
+            return await self.fallback.acomplete(messages, model, **params)
+        raise LLMError(f"No recorded completion for request {request_hash(messages)[:12]}")
+
+
+# ------------------------------------------------------------------------------
+# Factory
+# ------------------------------------------------------------------------------
+
+def _parse_schedule(value: str) -> Dict[str, int]:
+    """
+    Parse "issue_interview=3,refine_reappraisal=2" into a dict.
+    """
+    schedule = {}
+    for item in filter(None, (s.strip() for s in value.split(","))):
+        name, _, n = item.partition("=")
+        schedule[name.strip()] = int(n)
+    return schedule
+
+
+def provider_from_config(config) -> LLMProvider:
+    """
+    Build the provider selected by config.llm_provider.
+    """
+    if config.llm_provider == "openai":
+        return OpenAIProvider(api_key=config.openai_api_key)
+    if config.llm_provider == "openai_compatible":
+        if not config.llm_base_url:
+            raise ValueError("LLM_BASE_URL must be set for the openai_compatible provider")
+        return OpenAICompatibleProvider(base_url=config.llm_base_url, api_key=config.llm_api_key)
+    if config.llm_provider == "fake":
+        return FakeProvider(
+            seed=config.fake_llm_seed,
+            latency_dist=config.fake_llm_latency_dist,
+            latency_ms=config.fake_llm_latency_ms,
+            latency_sigma=config.fake_llm_latency_sigma,
+            tokens_per_sec=config.fake_llm_tokens_per_sec,
+            failure_rate=config.fake_llm_failure_rate,
+            finish_after=_parse_schedule(config.fake_llm_finish_after),
+        )
+    if config.llm_provider == "replay":
+        if config.llm_replay_file:
+            return ReplayProvider.from_file(config.llm_replay_file)
+        return ReplayProvider(use_database=True)
+    raise ValueError(f"Unknown LLM provider: {config.llm_provider}")
+
+
+_provider: Optional[LLMProvider] = None
+
+
+def get_provider() -> LLMProvider:
+    """
+    Return the process-wide provider, building it from CurrentConfig on first use.
+    """
+    global _provider
+    if _provider is None:
+        from bot.config import CurrentConfig
+        _provider = provider_from_config(CurrentConfig)
+        logger.info(f"Using LLM provider: {_provider.name}")
+    return _provider
+
+
+def set_provider(provider: LLMProvider):
+    """
+    Override the process-wide provider (e.g. in benchmarks or offline scripts).
+    """
+    global _provider
+    _provider = provider
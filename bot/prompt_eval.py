@@ -0,0 +1,247 @@
+# bot/prompt_eval.py
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import yaml
+
+'''
+Offline prompt evaluation over historical conversations.
+
+Rebuilds the exact messages each LLM-backed BotStep sent for every past bot
+reply, then re-runs them against one or more prompt/model variants
+concurrently. Results are appended to <out>/results.jsonl as they complete,
+which doubles as the checkpoint: re-running the same command skips finished
+work. At the end the results are written to <out>/results.parquet.
+
+    python -m bot.prompt_eval --variants variants.yml --out eval/ --concurrency 32
+
+variants.yml:
+
+    - name: baseline
+    - name: shorter_reap
+      prompts: bot/prompts_shorter.yml   # overrides keys of prompts.yml
+      model: gpt-4o
+      temperature: 0.7
+'''
+
+# prompt name -> states whose messages the step sends (None = all states),
+# mirroring BotIssueInterview, BotGenerateReappraisal and BotRefineReap
+STEPS = {
+    "issue_interview": ("issue_interview", None),
+    "general_reappraise": ("generate_reap", ("issue_interview",)),
+    "refine_reappraisal": ("refine_reap", ("issue_interview", "generate_reap", "refine_reap")),
+}
+
+
+def load_variants(path: Optional[str], base_prompts: Dict[str, str], default_model: str) -> List[Dict]:
+    """
+    Load variant definitions and resolve their prompts against prompts.yml.
+    """
+    specs = [{"name": "baseline"}]
+    if path:
+        with open(path) as f:
+            specs = yaml.safe_load(f)
+    variants = []
+    for spec in specs:
+        prompts = dict(base_prompts)
+        if spec.get("prompts"):
+            with open(spec["prompts"]) as f:
+                prompts.update(yaml.safe_load(f))
+        variants.append({
+            "name": spec["name"],
+            "model": spec.get("model", default_model),
+            "temperature": spec.get("temperature", 1),
+            "prompts": prompts,
+        })
+    return variants
+
+
+def build_step_inputs(msgs: List[Dict], steps: List[str]) -> Iterator[Dict]:
+    """
+    For each bot reply produced by an LLM step, yield the messages the step
+    would have sent (everything before the reply, filtered by state) and
+    the original reply.
+    """
+    for i, msg in enumerate(msgs):
+        if msg["role"] != "assistant":
+            continue
+        for step in steps:
+            state, relevant = STEPS[step]
+            if msg["state"] != state:
+                continue
+            history = [{"role": m["role"], "content": m["content"]} for m in msgs[:i]
+                       if m["role"] in ("user", "assistant") and (relevant is None or m["state"] in relevant)]
+            if history:
+                yield {"step": step, "message_id": msg["id"], "messages": history, "original": msg["content"]}
+
+
+def fetch_batch(after_id: int, batch_size: int, min_id: Optional[int]):
+    """
+    Keyset-paginate conversations and return their messages, grouped.
+    """
+    from sqlalchemy import select
+    from db.db_session import get_session
+    from db.models import Conversation, Message
+
+    with get_session() as session:
+        stmt = select(Conversation.id).where(Conversation.id > max(after_id, (min_id or 0) - 1),
+                                             Conversation.deleted_at.is_(None))
+        convo_ids = session.scalars(stmt.order_by(Conversation.id).limit(batch_size)).all()
+        if not convo_ids:
+            return []
+        rows = session.execute(
+            select(Message.id, Message.conversation_id, Message.role, Message.state, Message.content)
+            .where(Message.conversation_id.in_(convo_ids), Message.deleted_at.is_(None))
+            .order_by(Message.conversation_id, Message.id)
+        ).all()
+    grouped = {cid: [] for cid in convo_ids}
+    for row in rows:
+        grouped[row.conversation_id].append({
+            "id": row.id, "role": row.role.value, "state": row.state.value, "content": row.content,
+        })
+    return list(grouped.items())
+
+
+class Evaluator:
+    def __init__(self, args, provider, variants):
+        self.args = args
+        self.provider = provider
+        self.variants = variants
+        self.out = Path(args.out)
+        self.out.mkdir(parents=True, exist_ok=True)
+        self.results_path = self.out / "results.jsonl"
+        self.done = self._load_checkpoint()
+        self.semaphore = asyncio.Semaphore(args.concurrency)
+        self.results_file = None
+        self.completed = 0
+        self.errors = 0
+
+    def _load_checkpoint(self) -> set:
+        done = set()
+        if self.results_path.exists():
+            with open(self.results_path) as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # partial line from an interrupted run
+                    done.add((row["message_id"], row["step"], row["variant"]))
+        return done
+
+    async def evaluate(self, conversation_id: int, item: Dict, variant: Dict):
+        from bot.llm import request_hash
+
+        system_prompt = variant["prompts"][item["step"]]
+        messages = [{"role": "developer", "content": system_prompt}] + item["messages"]
+        row = {
+            "conversation_id": conversation_id,
+            "message_id": item["message_id"],
+            "step": item["step"],
+            "variant": variant["name"],
+            "model": variant["model"],
+            "prompt_hash": hashlib.sha256(system_prompt.encode()).hexdigest()[:12],
+            "request_hash": request_hash(messages),
+            "original_output": item["original"],
+            "original_chars": len(item["original"]),
+        }
+        start = time.perf_counter()
+        try:
+            completion = await self.provider.acomplete(messages, model=variant["model"],
+                                                       temperature=variant["temperature"])
+            row.update(output=completion.content, tokens_prompt=completion.tokens_prompt,
+                       tokens_completion=completion.tokens_completion, error=None)
+        except Exception as e:
+            self.errors += 1
+            row.update(output=None, tokens_prompt=None, tokens_completion=None, error=repr(e))
+        row["latency_ms"] = (time.perf_counter() - start) * 1000
+        self.results_file.write(json.dumps(row) + "\n")
+        self.completed += 1
+
+    async def _bounded(self, *args):
+        try:
+            await self.evaluate(*args)
+        finally:
+            self.semaphore.release()
+
+    async def run(self):
+        steps = self.args.steps.split(",")
+        after_id, n_convos, tasks = 0, 0, set()
+        start = time.perf_counter()
+        with open(self.results_path, "a", buffering=1) as self.results_file:
+            while self.args.limit is None or n_convos < self.args.limit:
+                batch_size = self.args.batch_size
+                if self.args.limit is not None:
+                    batch_size = min(batch_size, self.args.limit - n_convos)
+                batch = await asyncio.to_thread(fetch_batch, after_id, batch_size,
+                                                self.args.min_conversation_id)
+                if not batch:
+                    break
+                for conversation_id, msgs in batch:
+                    after_id = conversation_id
+                    n_convos += 1
+                    for item in build_step_inputs(msgs, steps):
+                        for variant in self.variants:
+                            if (item["message_id"], item["step"], variant["name"]) in self.done:
+                                continue
+                            await self.semaphore.acquire()  # backpressure: bounded in-flight calls
+                            task = asyncio.create_task(self._bounded(conversation_id, item, variant))
+                            tasks.add(task)
+                            task.add_done_callback(tasks.discard)
+                print(f"... {n_convos} conversations, {self.completed} completions, "
+                      f"{self.errors} errors, {time.perf_counter() - start:.0f}s", flush=True)
+            await asyncio.gather(*tasks)
+        print(f"Done: {n_convos} conversations, {self.completed} new completions, {self.errors} errors")
+
+
+def write_parquet(out: Path):
+    """
+    Convert the JSONL checkpoint into a columnar file.
+    """
+    try:
+        import pyarrow.json as pa_json
+        import pyarrow.parquet as pq
+    except ImportError:
+        print("pyarrow is not installed; results are in results.jsonl only")
+        return
+    table = pa_json.read_json(out / "results.jsonl")
+    pq.write_table(table, out / "results.parquet", compression="zstd")
+    print(f"Wrote {table.num_rows} rows to {out / 'results.parquet'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate prompt/model variants over historical conversations")
+    parser.add_argument("--variants", default=None, help="YAML file of variants (default: baseline only)")
+    parser.add_argument("--steps", default=",".join(STEPS), help="Comma-separated prompt names to evaluate")
+    parser.add_argument("--out", required=True, help="Output directory (also the checkpoint)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Max in-flight LLM calls")
+    parser.add_argument("--batch-size", type=int, default=200, help="Conversations fetched per query")
+    parser.add_argument("--limit", type=int, default=None, help="Max conversations")
+    parser.add_argument("--min-conversation-id", type=int, default=None)
+    parser.add_argument("--provider", default=None, help="Override LLM_PROVIDER (openai, openai_compatible, fake, replay)")
+    parser.add_argument("--database-url", default=os.getenv("SQLALCHEMY_DATABASE_URI"))
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ["SQLALCHEMY_DATABASE_URI"] = args.database_url
+    if args.provider:
+        os.environ["LLM_PROVIDER"] = args.provider
+
+    from bot.config import CurrentConfig
+    from bot.llm import get_provider
+    from bot.registry import get_registry
+
+    variants = load_variants(args.variants, dict(get_registry().prompts), CurrentConfig.openai_chat_model)
+    evaluator = Evaluator(args, get_provider(), variants)
+    asyncio.run(evaluator.run())
+    write_parquet(evaluator.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,9 @@
 import json
 import asyncio
-import aiohttp
 import os
-from typing import List, Tuple
+from typing import List, Optional, Tuple
+
+from bot.llm import LLMProvider, OpenAIProvider
 
 # Templates defined outside the class
 prompt_template = """
@@ -24,8 +25,9 @@ Respond with only the number of the reappraisal and nothing else.
 """
 
 class ReappraisalGenerator:
-    def __init__(self, api_token: str, json_file: str = "/Users/ashish/files/research/projects/precision_reap_bot_react/bot/other_vals copy 4.json"):
+    def __init__(self, api_token: Optional[str] = None, json_file: str = "/Users/ashish/files/research/projects/precision_reap_bot_react/bot/other_vals copy 4.json", provider: Optional[LLMProvider] = None):
         self.api_token = api_token
+        self.provider = provider or OpenAIProvider(api_key=api_token)
         self.reap_model = "gpt-4o"
         self.judge_model = "o3-mini"
         
@@ -42,7 +44,6 @@ class ReappraisalGenerator:
     
     async def _generate_value_reap(
         self,
-        session: aiohttp.ClientSession,
         value_name: str,
         value_description: str,
         msg_history: List[dict]
@@ -53,21 +54,13 @@ class ReappraisalGenerator:
             value_description=value_description
         )
         print(prompt)
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_token}"
-        }
-        payload = {
-            "model": self.reap_model,
-            "messages": msg_history + [{"role": "user", "content": prompt}],
-            "temperature": 1.0,
-        }
-        url = "https://api.openai.com/v1/chat/completions"
-        async with session.post(url, headers=headers, json=payload) as resp:
-            resp.raise_for_status()  # Raise exception for HTTP errors.
-            data = await resp.json()
-            reap = data["choices"][0]["message"]["content"].strip()
-            return reap
+        completion = await self.provider.acomplete(
+            msg_history + [{"role": "user", "content": prompt}],
+            model=self.reap_model,
+            temperature=1.0,
+        )
+        reap = completion.content.strip()
+        return reap
     
     def _make_reappraisal_list_str(self, reappraisal_list: List[str]) -> str:
         """Format the list of cognitive reappraisals into a numbered string."""
@@ -75,7 +68,6 @@ class ReappraisalGenerator:
     
     async def _generate_judge_reap(
         self,
-        session: aiohttp.ClientSession,
         reappraisal_list: List[str],
         msg_history: List[dict]
     ) -> str:
@@ -86,29 +78,21 @@ class ReappraisalGenerator:
         reappraisal_list_str = self._make_reappraisal_list_str(reappraisal_list)
         prompt = judge_template.format(reappraisal_list_str=reappraisal_list_str)
         print(f'judge prompt: {prompt}')
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_token}"
-        }
-        payload = {
-            "model": self.judge_model,
-            "messages": msg_history + [{"role": "user", "content": prompt}],
-            "reasoning_effort": "medium",
-        }
-        url = "https://api.openai.com/v1/chat/completions"
-        async with session.post(url, headers=headers, json=payload) as resp:
-            resp.raise_for_status()
-            data = await resp.json()
-            judge_response = data["choices"][0]["message"]["content"].strip()
-            print('judge response: ', judge_response)
-            try:
-                selected_index = int(judge_response) - 1
-                if selected_index < 0 or selected_index >= len(reappraisal_list):
-                    raise ValueError
-            except ValueError:
-                raise ValueError(f"Invalid judge response: {judge_response}")
-            # Return the actual reappraisal corresponding to the judge's choice.
-            return reappraisal_list[selected_index]
+        completion = await self.provider.acomplete(
+            msg_history + [{"role": "user", "content": prompt}],
+            model=self.judge_model,
+            reasoning_effort="medium",
+        )
+        judge_response = completion.content.strip()
+        print('judge response: ', judge_response)
+        try:
+            selected_index = int(judge_response) - 1
+            if selected_index < 0 or selected_index >= len(reappraisal_list):
+                raise ValueError
+        except ValueError:
+            raise ValueError(f"Invalid judge response: {judge_response}")
+        # Return the actual reappraisal corresponding to the judge's choice.
+        return reappraisal_list[selected_index]
     
     async def generate_reappraisal(self, msg_history: List[dict]) -> Tuple[List[str], str]:
         """
@@ -118,17 +102,15 @@ class ReappraisalGenerator:
         Returns:
             Tuple[List[str], str]: A tuple containing the list of generated reappraisals and the judge's selected reappraisal.
         """
-        async with aiohttp.ClientSession() as session:
-            # Launch asynchronous tasks for each pre-selected value.
-            tasks = [
-                self._generate_value_reap(
-                    session,
-                    val.get("name", ""),
-                    val.get("description", ""),
-                    msg_history
-                )
-                for val in self.selected_vals
-            ]
-            reappraisal_list = await asyncio.gather(*tasks)
-            selected_reappraisal = await self._generate_judge_reap(session, reappraisal_list, msg_history)
-            return reappraisal_list, selected_reappraisal
\ No newline at end of file
+        # Launch asynchronous tasks for each pre-selected value.
+        tasks = [
+            self._generate_value_reap(
+                val.get("name", ""),
+                val.get("description", ""),
+                msg_history
+            )
+            for val in self.selected_vals
+        ]
+        reappraisal_list = await asyncio.gather(*tasks)
+        selected_reappraisal = await self._generate_judge_reap(reappraisal_list, msg_history)
+        return reappraisal_list, selected_reappraisal
\ No newline at end of file
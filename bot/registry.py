@@ -0,0 +1,259 @@
+# bot/registry.py
+
+import hashlib
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+import yaml
+
+from bot.logger_setup import setup_logger
+
+logger = setup_logger()
+
+bot_dir = Path(__file__).parent
+PROMPTS_FILE = bot_dir / "prompts.yml"
+BOT_MSGS_FILE = bot_dir / "bot_msgs.yml"
+
+# States whose questions are asked one by one from bot_msgs.yml.
+# Every bot_msgs key starting with "<state>_" belongs to that state.
+RATING_STATES = ("rate_issue", "rate_reap_1", "rate_reap_2")
+
+
+def _freeze(obj: Any) -> Any:
+    """
+    Recursively convert dicts to read-only mappings and lists to tuples.
+    """
+    if isinstance(obj, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in obj.items()})
+    if isinstance(obj, list):
+        return tuple(_freeze(v) for v in obj)
+    return obj
+
+
+def _thaw(obj: Any) -> Any:
+    """
+    Inverse of _freeze, for serializing a frozen structure.
+    """
+    if isinstance(obj, Mapping):
+        return {k: _thaw(v) for k, v in obj.items()}
+    if isinstance(obj, tuple):
+        return [_thaw(v) for v in obj]
+    return obj
+
+
+@dataclass(frozen=True)
+class QuestionTemplate:
+    """
+    A pre-built, read-only rating question.
+
+    The static part of the response (role, content, options) is serialized to
+    JSON once when the registry loads. Per turn only the convo_id, msg_id and
+    convo_state are spliced onto the end of the cached bytes.
+    """
+    question_id: str
+    content: str
+    response_type: str
+    options: Mapping[str, Any]
+    body_prefix: bytes
+
+    @classmethod
+    def build(cls, question_id: str, msg: Mapping[str, Any]) -> "QuestionTemplate":
+        options = _freeze({**msg.get("options", {}), "question_id": question_id})
+        static = {
+            "role": "assistant",
+            "response_type": msg["response_type"],
+            "content": msg["content"],
+            "options": _thaw(options),
+        }
+        # Drop the closing brace so per-turn fields can be appended
+        body_prefix = json.dumps(static, separators=(",", ":")).encode()[:-1]
+        return cls(
+            question_id=question_id,
+            content=msg["content"],
+            response_type=msg["response_type"],
+            options=options,
+            body_prefix=body_prefix,
+        )
+
+    def as_bot_msg(self) -> Dict[str, Any]:
+        """
+        Return the bot_msg dict used by the state machine. The options mapping
+        is shared, not copied, and must not be mutated.
+        """
+        return {
+            "content": self.content,
+            "response_type": self.response_type,
+            "options": self.options,
+            "template": self,
+        }
+
+    def render(self, convo_id: Optional[int], msg_id: Optional[int], convo_state: str) -> bytes:
+        """
+        Return the full JSON response body for one turn.
+        """
+        convo_state = getattr(convo_state, "value", convo_state)
+        return b"".join((
+            self.body_prefix,
+            b',"convo_id":', json.dumps(convo_id).encode(),
+            b',"msg_id":', json.dumps(msg_id).encode(),
+            b',"convo_state":', json.dumps(convo_state).encode(),
+            b"}",
+        ))
+
+
+@dataclass(frozen=True)
+class Registry:
+    """
+    An immutable snapshot of prompts.yml and bot_msgs.yml.
+
+    A turn should grab one snapshot at the start and use it throughout, so a
+    reload in the middle of the turn does not mix prompt versions.
+    """
+    version: str
+    prompts: Mapping[str, str]
+    bot_msgs: Mapping[str, Mapping[str, Any]]
+    required_fields: Mapping[str, Tuple[str, ...]]
+    questions: Mapping[str, QuestionTemplate]
+    # Plain-dict options per question id (without question_id), published to
+    # registry_versions and compared against when storing message options.
+    # Treat as read-only.
+    question_options: Mapping[str, Dict[str, Any]] = field(default_factory=dict)
+    loaded_at: float = field(default_factory=time.time)
+
+    def prompt(self, name: str) -> str:
+        return self.prompts[name]
+
+    def bot_msg(self, question_id: str) -> Mapping[str, Any]:
+        return self.bot_msgs[question_id]
+
+    def question(self, question_id: str) -> QuestionTemplate:
+        return self.questions[question_id]
+
+    def required_for(self, state: str) -> Tuple[str, ...]:
+        """
+        Return the ordered question ids that must be answered in a rating state.
+        """
+        state = getattr(state, "value", state)  # accept ConvoStateEnum or its value
+        return self.required_fields.get(state, ())
+
+
+def load_registry(prompts_file: Path = PROMPTS_FILE,
+                  bot_msgs_file: Path = BOT_MSGS_FILE) -> Registry:
+    """
+    Parse both YAML files and build a new Registry snapshot.
+    The version is a short content hash over both files.
+    """
+    prompts_raw = prompts_file.read_bytes()
+    bot_msgs_raw = bot_msgs_file.read_bytes()
+
+    digest = hashlib.sha256()
+    digest.update(prompts_raw)
+    digest.update(b"\0")
+    digest.update(bot_msgs_raw)
+    version = digest.hexdigest()[:12]
+
+    prompts = yaml.safe_load(prompts_raw) or {}
+    bot_msgs = yaml.safe_load(bot_msgs_raw) or {}
+
+    required_fields = {
+        state: tuple(k for k in bot_msgs.keys() if k.startswith(f"{state}_"))
+        for state in RATING_STATES
+    }
+
+    questions = {
+        question_id: QuestionTemplate.build(question_id, bot_msgs[question_id])
+        for fields in required_fields.values()
+        for question_id in fields
+    }
+
+    question_options = {
+        question_id: {k: v for k, v in _thaw(template.options).items() if k != "question_id"}
+        for question_id, template in questions.items()
+    }
+
+    return Registry(
+        version=version,
+        prompts=_freeze(prompts),
+        bot_msgs=_freeze(bot_msgs),
+        required_fields=MappingProxyType(required_fields),
+        questions=MappingProxyType(questions),
+        question_options=MappingProxyType(question_options),
+    )
+
+
+class _RegistryHolder:
+    """
+    Holds the current Registry and swaps it when the source files change.
+
+    Reloads are checked lazily on access, at most once per `reload_interval`
+    seconds. A failed reload (e.g. a YAML syntax error while editing) keeps
+    serving the previous snapshot.
+    """
+    def __init__(self):
+        self._registry: Optional[Registry] = None
+        self._mtimes: Tuple[float, float] = (0.0, 0.0)
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+        self.reload_interval = 0.0  # 0 disables hot reload
+
+    def _stat(self) -> Tuple[float, float]:
+        return (PROMPTS_FILE.stat().st_mtime, BOT_MSGS_FILE.stat().st_mtime)
+
+    def _load(self):
+        mtimes = self._stat()
+        self._registry = load_registry(PROMPTS_FILE, BOT_MSGS_FILE)
+        self._mtimes = mtimes
+        logger.info(f"Loaded bot registry version={self._registry.version}")
+
+    def get(self) -> Registry:
+        if self._registry is None:
+            with self._lock:
+                if self._registry is None:
+                    self._load()
+        elif self.reload_interval > 0:
+            now = time.monotonic()
+            if now - self._last_check >= self.reload_interval:
+                self._maybe_reload(now)
+        return self._registry
+
+    def _maybe_reload(self, now: float):
+        if not self._lock.acquire(blocking=False):
+            return  # another thread is already checking
+        try:
+            self._last_check = now
+            if self._stat() == self._mtimes:
+                return
+            old_version = self._registry.version
+            try:
+                self._load()
+            except Exception as e:
+                logger.error("Failed to reload bot registry, keeping previous version")
+                logger.exception(e)
+                return
+            if self._registry.version != old_version:
+                logger.info(f"Bot registry reloaded: {old_version} -> {self._registry.version}")
+        finally:
+            self._lock.release()
+
+
+_holder = _RegistryHolder()
+
+
+def get_registry() -> Registry:
+    """
+    Return the current registry snapshot, loading it on first use.
+    """
+    return _holder.get()
+
+
+def enable_hot_reload(interval: float):
+    """
+    Re-check the YAML files for changes at most every `interval` seconds.
+    Pass 0 to disable.
+    """
+    _holder.reload_interval = interval
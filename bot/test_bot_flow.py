@@ -0,0 +1,25 @@
+from unittest.mock import MagicMock, patch
+
+from bot import bot_flow
+from bot.bot_flow import BotGenerateReappraisal, Chatbot
+
+
+def test_llm_queries_record_the_turn():
+    step = BotGenerateReappraisal(conversation_id=7, user_id=3)
+    step.message_id = 11
+    with patch.object(Chatbot, "query_gpt", return_value={"content": "reappraisal", "llm_model": "fake/gpt"}) \
+            as query_gpt, \
+            patch.object(BotGenerateReappraisal, "_gather_relevant_messages", return_value=[]), \
+            patch.object(BotGenerateReappraisal, "_get_session", MagicMock()), \
+            patch.object(bot_flow, "record_reappraisal") as record_reappraisal:
+        step.generate_output()
+    kwargs = query_gpt.call_args.kwargs
+    assert (kwargs["user_id"], kwargs["conversation_id"], kwargs["message_id"]) == (3, 7, 11)
+    # Analytics attribute the conversation to the model that served the reappraisal
+    kwargs = record_reappraisal.call_args.kwargs
+    assert (kwargs["reappraisal"], kwargs["llm_model"]) == ("general_reappraise", "fake/gpt")
+
+
+if __name__ == "__main__":
+    test_llm_queries_record_the_turn()
+    print("ok")
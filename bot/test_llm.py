@@ -0,0 +1,134 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from bot import llm
+
+SYSTEM = "You interview the user."
+
+
+def _fake(**kwargs):
+    return llm.FakeProvider(latency_dist="constant", latency_ms=0, prompts={SYSTEM: "issue_interview"}, **kwargs)
+
+
+def _messages(first_user_msg, *more):
+    return [{"role": "developer", "content": SYSTEM}, {"role": "user", "content": first_user_msg}, *more]
+
+
+def _config(**kwargs):
+    defaults = dict(
+        llm_provider="openai", openai_api_key="sk-test", llm_base_url=None, llm_api_key=None,
+        llm_replay_file=None, fake_llm_seed=0, fake_llm_latency_dist="constant", fake_llm_latency_ms=0,
+        fake_llm_latency_sigma=0.5, fake_llm_tokens_per_sec=0, fake_llm_failure_rate=0,
+        fake_llm_finish_after="issue_interview=3,refine_reappraisal=2",
+    )
+    return SimpleNamespace(**{**defaults, **kwargs})
+
+
+def test_fake_finishes_on_schedule():
+    provider = _fake(finish_after={"issue_interview": 3})
+    finished = ["::finished::" in provider.complete(_messages("my issue"), "m").content for _ in range(4)]
+    assert finished == [False, False, True, True]
+    # Calls are counted per conversation (its first user message)
+    assert "::finished::" not in provider.complete(_messages("another issue"), "m").content
+
+
+def test_fake_never_finishes_unscheduled_prompts():
+    provider = _fake(finish_after={})
+    assert not any("::finished::" in provider.complete(_messages("my issue"), "m").content for _ in range(5))
+
+
+def test_fake_is_deterministic():
+    a = _fake(seed=1, finish_after={}).complete(_messages("x"), "m")
+    b = _fake(seed=1, finish_after={}).complete(_messages("x"), "m")
+    c = _fake(seed=2, finish_after={}).complete(_messages("x"), "m")
+    assert (a.content, a.tokens_completion) == (b.content, b.tokens_completion)
+    assert a.content != c.content
+    assert a.raw["usage"]["completion_tokens"] == a.tokens_completion
+
+
+def test_fake_injects_failures():
+    with pytest.raises(llm.LLMError):
+        _fake(failure_rate=1.0).complete(_messages("x"), "m")
+
+
+def _recorded(messages, content="recorded"):
+    return {llm.request_hash(messages): llm.LLMCompletion(content, 1, 2, "recorded-model")}
+
+
+def test_replay_serves_recorded_completions():
+    messages = _messages("x")
+    provider = llm.ReplayProvider(recordings=_recorded(messages))
+    # Keys ignore bookkeeping fields such as "state"
+    assert provider.complete([{**m, "state": "issue_interview"} for m in messages], "m").content == "recorded"
+    assert (provider.hits, provider.misses) == (1, 0)
+
+
+def test_replay_miss_raises_without_fallback():
+    provider = llm.ReplayProvider(recordings=_recorded(_messages("x")))
+    with pytest.raises(llm.LLMError):
+        provider.complete(_messages("y"), "m")
+    with pytest.raises(llm.LLMError):
+        asyncio.run(provider.acomplete(_messages("y"), "m"))
+    assert (provider.hits, provider.misses) == (0, 2)
+
+
+def test_replay_miss_goes_to_the_fallback():
+    provider = llm.ReplayProvider(recordings={}, fallback=_fake(seed=3, finish_after={}))
+    assert provider.complete(_messages("y"), "m").content == _fake(seed=3, finish_after={}).complete(
+        _messages("y"), "m").content
+    assert provider.misses == 1
+
+
+def test_replay_database_miss_is_not_cached(monkeypatch):
+    provider = llm.ReplayProvider(use_database=True, fallback=_fake(finish_after={}))
+    lookups = []
+    monkeypatch.setattr(provider, "_lookup_database", lambda key: lookups.append(key))
+    provider.complete(_messages("y"), "m")
+    provider.complete(_messages("y"), "m")
+    assert len(lookups) == 2 and provider.recordings == {}
+
+
+def test_replay_from_file(tmp_path):
+    messages = _messages("x")
+    path = tmp_path / "recordings.jsonl"
+    path.write_text(json.dumps({"request_hash": llm.request_hash(messages), "content": "from file",
+                                "tokens_prompt": 5, "tokens_completion": 6, "model": "gpt"}) + "\n\n")
+    completion = llm.ReplayProvider.from_file(str(path)).complete(messages, "m")
+    assert (completion.content, completion.tokens_prompt, completion.model) == ("from file", 5, "gpt")
+
+
+@pytest.mark.parametrize("config, cls", [
+    (_config(), llm.OpenAIProvider),
+    (_config(llm_provider="openai_compatible", llm_base_url="http://localhost:8080/v1/"),
+     llm.OpenAICompatibleProvider),
+    (_config(llm_provider="fake"), llm.FakeProvider),
+    (_config(llm_provider="replay"), llm.ReplayProvider),
+])
+def test_provider_from_config(config, cls):
+    assert type(llm.provider_from_config(config)) is cls
+
+
+def test_provider_settings_from_config():
+    compatible = llm.provider_from_config(_config(llm_provider="openai_compatible", llm_api_key="k",
+                                                  llm_base_url="http://localhost:8080/v1/"))
+    assert compatible.url == "http://localhost:8080/v1/chat/completions"
+    assert compatible.headers["Authorization"] == "Bearer k"
+    fake = llm.provider_from_config(_config(llm_provider="fake", fake_llm_seed=4,
+                                            fake_llm_finish_after=" issue_interview = 2, "))
+    assert (fake.seed, fake.finish_after) == (4, {"issue_interview": 2})
+    assert llm.provider_from_config(_config(llm_provider="replay")).use_database
+
+
+def test_provider_config_errors():
+    with pytest.raises(ValueError, match="LLM_BASE_URL"):
+        llm.provider_from_config(_config(llm_provider="openai_compatible"))
+    with pytest.raises(ValueError, match="Unknown LLM provider"):
+        llm.provider_from_config(_config(llm_provider="nope"))
+
+
+def test_model_label():
+    assert llm.model_label("openai", "gpt-4o-mini") == "gpt-4o-mini"
+    assert llm.model_label("fake", "gpt-4o-mini") == "fake/gpt-4o-mini"
@@ -1,6 +1,6 @@
 import asyncio
 import os
-from reappraisal_generator import ReappraisalGenerator
+from bot.reappraisal_generator import ReappraisalGenerator
 
 async def main():
     messages = [
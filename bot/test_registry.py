@@ -0,0 +1,94 @@
+import json
+import os
+from types import MappingProxyType
+
+import pytest
+
+from bot import registry
+from db.models import ConvoStateEnum
+
+PROMPTS = "issue_interview: Tell me about it.\n"
+BOT_MSGS = """
+rate_issue_neg:
+  response_type: slider
+  content: How negative?
+  options: {min: 0, max: 100, labels: [low, high]}
+rate_issue_pos:
+  response_type: slider
+  content: How positive?
+  options: {min: 0, max: 100}
+"""
+
+
+def _write(path, text, mtime):
+    path.write_text(text)
+    # Explicit mtimes: the holder only reloads when they change
+    os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def files(tmp_path, monkeypatch):
+    prompts, bot_msgs = tmp_path / "prompts.yml", tmp_path / "bot_msgs.yml"
+    _write(prompts, PROMPTS, 1_000_000)
+    _write(bot_msgs, BOT_MSGS, 1_000_000)
+    monkeypatch.setattr(registry, "PROMPTS_FILE", prompts)
+    monkeypatch.setattr(registry, "BOT_MSGS_FILE", bot_msgs)
+    return prompts, bot_msgs
+
+
+def test_load_the_shipped_files():
+    reg = registry.load_registry()
+    assert reg.required_for(ConvoStateEnum.RATE_ISSUE) == ("rate_issue_neg", "rate_issue_pos")
+    assert all(reg.required_for(state) for state in registry.RATING_STATES)
+    for name in ("issue_interview", "general_reappraise", "refine_reappraisal", "label_issue"):
+        assert reg.prompt(name)
+    assert len(reg.version) == 12
+    assert registry.load_registry().version == reg.version
+
+
+def test_snapshot_is_read_only(files):
+    reg = registry.load_registry(*files)
+    options = reg.question("rate_issue_neg").as_bot_msg()["options"]
+    assert isinstance(options, MappingProxyType) and isinstance(reg.prompts, MappingProxyType)
+    assert options["labels"] == ("low", "high")
+    with pytest.raises(TypeError):
+        options["min"] = 5
+    assert reg.question_options["rate_issue_neg"] == {"min": 0, "max": 100, "labels": ["low", "high"]}
+
+
+def test_render_is_the_json_response(files):
+    template = registry.load_registry(*files).question("rate_issue_pos")
+    assert json.loads(template.render(7, 42, ConvoStateEnum.RATE_ISSUE)) == {
+        "role": "assistant",
+        "response_type": "slider",
+        "content": "How positive?",
+        "options": {"min": 0, "max": 100, "question_id": "rate_issue_pos"},
+        "convo_id": 7,
+        "msg_id": 42,
+        "convo_state": "rate_issue",
+    }
+    assert json.loads(template.render(None, None, "rate_issue"))["msg_id"] is None
+
+
+def test_reload_keeps_earlier_snapshots(files):
+    prompts, bot_msgs = files
+    holder = registry._RegistryHolder()
+    holder.reload_interval = 1e-9
+    first = holder.get()
+
+    _write(prompts, "issue_interview: Tell me more.\n", 2_000_000)
+    second = holder.get()
+    assert second.version != first.version
+    assert second.prompt("issue_interview") == "Tell me more."
+    # A turn that pinned the first snapshot keeps its prompts
+    assert first.prompt("issue_interview") == "Tell me about it."
+
+
+def test_failed_reload_keeps_serving_the_previous_snapshot(files):
+    prompts, bot_msgs = files
+    holder = registry._RegistryHolder()
+    holder.reload_interval = 1e-9
+    first = holder.get()
+
+    _write(bot_msgs, "rate_issue_neg: [unclosed\n", 2_000_000)
+    assert holder.get() is first
@@ -0,0 +1,336 @@
+# db/analytics.py
+
+import argparse
+import json
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from sqlalchemy import delete, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+
+from db.db_session import get_session
+from db.logger_setup import setup_logger
+from db.models import Conversation, ConversationRating, RATING_FIELDS, RatingAggregate, User
+
+'''
+Reappraisal-effectiveness analytics: how the rate_issue_* ratings compare
+with rate_reap_1_* and rate_reap_2_*.
+
+rating_aggregates keeps a running count, sum and sum of squares per metric
+and per (llm_model, bot_version, reappraisal). Metrics are every rating plus
+the pre/post deltas in DELTAS. When the bot generates the reappraisal it
+stamps which one it was (the registry prompt that produced it) and the
+model that served it (record_reappraisal); it adds the conversation once,
+in the transaction that moves it to COMPLETE (record_completion), so reading the
+results never touches analysis_data or conversation_ratings: summary()
+turns the few aggregate rows into means and standard deviations, and the
+gateway's /admin/analytics serves it from a short in-process cache.
+
+A full recompute rebuilds the aggregates with NumPy from the completed
+conversations (or, for offline analysis, from a db/export.py Parquet
+export), vectorized over all conversations at once:
+
+    python -m db.analytics recompute
+    python -m db.analytics report --from-export exports/
+
+Like the export, only consenting users' non-ephemeral conversations count.
+'''
+
+logger = setup_logger()
+
+# metric: (after, before); positive means the rating went up
+DELTAS = {
+    "delta_reap_1_neg": ("rate_reap_1_neg", "rate_issue_neg"),
+    "delta_reap_1_pos": ("rate_reap_1_pos", "rate_issue_pos"),
+    "delta_reap_2_neg": ("rate_reap_2_neg", "rate_issue_neg"),
+    "delta_reap_2_pos": ("rate_reap_2_pos", "rate_issue_pos"),
+    "delta_refine_neg": ("rate_reap_2_neg", "rate_reap_1_neg"),
+    "delta_refine_pos": ("rate_reap_2_pos", "rate_reap_1_pos"),
+}
+METRICS = RATING_FIELDS + tuple(DELTAS)
+GROUP_KEYS = ("llm_model", "bot_version", "reappraisal")
+UNKNOWN = "unknown"
+CACHE_SECONDS = 60
+
+
+def metric_values(ratings: Mapping[str, Optional[float]]) -> Dict[str, float]:
+    """
+    The metrics of one conversation's ratings, skipping unanswered ones.
+    """
+    values = {field: ratings[field] for field in RATING_FIELDS if ratings.get(field) is not None}
+    for metric, (after, before) in DELTAS.items():
+        if after in values and before in values:
+            values[metric] = values[after] - values[before]
+    return values
+
+
+def _consenting():
+    return (User.research_consent.is_(True)) & (Conversation.ephemeral.is_(False)) & \
+        (Conversation.deleted_at.is_(None))
+
+
+def record_reappraisal(session, user_id: int, conversation_id: int, reappraisal: str,
+                       llm_model: Optional[str]) -> None:
+    """
+    Stamp the conversation's ratings row with the reappraisal it was shown
+    and the model that generated it, creating the row if needed.
+    (No commit here.)
+    """
+    now = datetime.now(timezone.utc)
+    stmt = insert(ConversationRating).values(
+        conversation_id=conversation_id, user_id=user_id, reappraisal=reappraisal, llm_model=llm_model,
+        created_at=now, updated_at=now)
+    session.execute(stmt.on_conflict_do_update(
+        index_elements=[ConversationRating.conversation_id],
+        set_={"reappraisal": reappraisal, "llm_model": llm_model, "updated_at": now},
+    ))
+
+
+def record_completion(session, conversation_id: int, bot_version: Optional[str]) -> bool:
+    """
+    Stamp the conversation's ratings row as completed and add it to
+    rating_aggregates under the model and reappraisal record_reappraisal()
+    stamped. Does nothing if it was already counted; returns whether it
+    was added. (No commit here.)
+    """
+    now = datetime.now(timezone.utc)
+    ratings = session.execute(
+        update(ConversationRating)
+        .where(ConversationRating.conversation_id == conversation_id, ConversationRating.completed_at.is_(None))
+        .values(completed_at=now, bot_version=bot_version, updated_at=now)
+        .returning(*[getattr(ConversationRating, field) for field in RATING_FIELDS],
+                   ConversationRating.llm_model, ConversationRating.reappraisal)
+    ).mappings().first()
+    if ratings is None:
+        return False
+    counted = session.execute(
+        select(Conversation.id)
+        .join(User, User.id == Conversation.user_id)
+        .where(Conversation.id == conversation_id, _consenting())
+    ).first()
+    values = metric_values(ratings)
+    if counted is None or not values:
+        return False
+    stmt = insert(RatingAggregate).values([
+        {"llm_model": ratings["llm_model"] or UNKNOWN, "bot_version": bot_version or UNKNOWN,
+         "reappraisal": ratings["reappraisal"] or UNKNOWN, "metric": metric,
+         "n": 1, "total": value, "total_sq": value * value, "updated_at": now}
+        for metric, value in values.items()
+    ])
+    session.execute(stmt.on_conflict_do_update(
+        index_elements=[RatingAggregate.llm_model, RatingAggregate.bot_version, RatingAggregate.reappraisal,
+                        RatingAggregate.metric],
+        set_={
+            "n": RatingAggregate.n + stmt.excluded.n,
+            "total": RatingAggregate.total + stmt.excluded.total,
+            "total_sq": RatingAggregate.total_sq + stmt.excluded.total_sq,
+            "updated_at": now,
+        },
+    ))
+    return True
+
+
+# ======================= Full recompute =======================
+
+def aggregate(columns: Mapping, llm_models, bot_versions, reappraisals) -> List[Dict]:
+    """
+    Vectorized aggregation: `columns` maps each rating field to a float
+    array (NaN = unanswered), one element per conversation, and
+    llm_models / bot_versions / reappraisals label the same conversations.
+    Returns rating_aggregates rows.
+    """
+    import numpy as np
+
+    labels, codes = zip(*(np.unique(np.asarray(keys, dtype=object).astype(str), return_inverse=True)
+                          for keys in (llm_models, bot_versions, reappraisals)))
+    # One code per (model, version, reappraisal) combination
+    groups, group_index = np.unique(np.ravel_multi_index(codes, [len(l) for l in labels]), return_inverse=True)
+    group_keys = np.unravel_index(groups, [len(l) for l in labels])
+
+    values = {field: np.asarray(columns[field], dtype=float) for field in RATING_FIELDS}
+    for metric, (after, before) in DELTAS.items():
+        values[metric] = values[after] - values[before]  # NaN unless both were answered
+
+    rows = []
+    for metric in METRICS:
+        answered = ~np.isnan(values[metric])
+        group, value = group_index[answered], values[metric][answered]
+        n = np.bincount(group, minlength=len(groups))
+        total = np.bincount(group, weights=value, minlength=len(groups))
+        total_sq = np.bincount(group, weights=value * value, minlength=len(groups))
+        for g in np.flatnonzero(n):
+            rows.append({
+                **{key: str(labels[i][group_keys[i][g]]) for i, key in enumerate(GROUP_KEYS)},
+                "metric": metric, "n": int(n[g]), "total": float(total[g]), "total_sq": float(total_sq[g]),
+            })
+    return rows
+
+
+def load_columns(session, batch_size: int = 10_000) -> Tuple[Dict, List, List, List]:
+    """
+    Rating columns of every counted conversation, streamed from the database.
+    """
+    import numpy as np
+
+    result = session.execute(
+        select(*[getattr(ConversationRating, field) for field in RATING_FIELDS],
+               ConversationRating.llm_model, ConversationRating.bot_version, ConversationRating.reappraisal)
+        .join(Conversation, Conversation.id == ConversationRating.conversation_id)
+        .join(User, User.id == Conversation.user_id)
+        .where(ConversationRating.completed_at.is_not(None), _consenting())
+        .execution_options(yield_per=batch_size)
+    )
+    chunks, llm_models, bot_versions, reappraisals = [], [], [], []
+    for rows in result.partitions():
+        # None becomes NaN
+        chunks.append(np.array([row[:len(RATING_FIELDS)] for row in rows], dtype=float))
+        llm_models.extend(row.llm_model or UNKNOWN for row in rows)
+        bot_versions.extend(row.bot_version or UNKNOWN for row in rows)
+        reappraisals.extend(row.reappraisal or UNKNOWN for row in rows)
+    matrix = np.concatenate(chunks) if chunks else np.empty((0, len(RATING_FIELDS)))
+    return {field: matrix[:, i] for i, field in enumerate(RATING_FIELDS)}, llm_models, bot_versions, reappraisals
+
+
+def load_export_columns(export_dir: Path) -> Tuple[Dict, List, List, List]:
+    """
+    Rating columns of the completed conversations in a db/export.py export,
+    keeping the latest version of conversations exported more than once.
+    """
+    import numpy as np
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(export_dir / "conversations",
+                          columns=["id", "changed_at", "completed_at", *GROUP_KEYS, *RATING_FIELDS])
+    table = table.filter(pc.is_valid(table["completed_at"]))
+    ids = table["id"].to_numpy()
+    changed = table["changed_at"].cast("int64").to_numpy()
+    order = np.lexsort((changed, ids))
+    # Last row of each id in (id, changed_at) order
+    latest = order[np.append(ids[order][1:] != ids[order][:-1], True)]
+    table = table.take(latest)
+    columns = {field: table[field].to_numpy(zero_copy_only=False).astype(float) for field in RATING_FIELDS}
+    llm_models = [m or UNKNOWN for m in table["llm_model"].to_pylist()]
+    bot_versions = [v or UNKNOWN for v in table["bot_version"].to_pylist()]
+    reappraisals = [r or UNKNOWN for r in table["reappraisal"].to_pylist()]
+    return columns, llm_models, bot_versions, reappraisals
+
+
+def recompute() -> int:
+    """
+    Rebuild rating_aggregates from conversation_ratings. The table is locked
+    against concurrent record_completion() calls while it is rebuilt.
+    Returns the number of conversations counted.
+    """
+    with get_session() as session:
+        session.execute(text("LOCK TABLE rating_aggregates IN EXCLUSIVE MODE"))
+        columns, llm_models, bot_versions, reappraisals = load_columns(session)
+        rows = aggregate(columns, llm_models, bot_versions, reappraisals)
+        now = datetime.now(timezone.utc)
+        session.execute(delete(RatingAggregate))
+        if rows:
+            session.execute(insert(RatingAggregate), [{**row, "updated_at": now} for row in rows])
+        session.commit()
+    logger.info("Recomputed rating aggregates over %d conversations", len(llm_models))
+    return len(llm_models)
+
+
+# ======================= Reading =======================
+
+def _stats(n: int, total: float, total_sq: float) -> Dict:
+    mean = total / n
+    variance = (total_sq - total * total / n) / (n - 1) if n > 1 else None
+    return {"n": n, "mean": mean, "sd": math.sqrt(max(variance, 0.0)) if variance is not None else None}
+
+
+def _add(sums: Dict[str, List[float]], row) -> None:
+    metric = sums.setdefault(row["metric"], [0, 0.0, 0.0])
+    metric[0] += row["n"]
+    metric[1] += row["total"]
+    metric[2] += row["total_sq"]
+
+
+def _all_stats(sums: Dict[str, List[float]]) -> Dict:
+    return {metric: _stats(*sums[metric]) for metric in METRICS if metric in sums}
+
+
+def summarize(rows) -> Dict:
+    """
+    Means and standard deviations per metric: overall, per
+    (llm_model, bot_version, reappraisal), and per value of each of those
+    keys alone ("by").
+    """
+    groups: Dict[Tuple[str, ...], Dict] = {}
+    overall: Dict[str, List[float]] = {}
+    by: Dict[str, Dict[str, Dict]] = {key: {} for key in GROUP_KEYS}
+    for row in rows:
+        row = row if isinstance(row, Mapping) else row._mapping
+        groups.setdefault(tuple(row[key] for key in GROUP_KEYS), {})[row["metric"]] = \
+            _stats(row["n"], row["total"], row["total_sq"])
+        _add(overall, row)
+        for key in GROUP_KEYS:
+            _add(by[key].setdefault(row[key], {}), row)
+    return {
+        "overall": _all_stats(overall),
+        "by": {key: {value: _all_stats(sums) for value, sums in sorted(values.items())}
+               for key, values in by.items()},
+        "groups": [
+            {**dict(zip(GROUP_KEYS, group)), "metrics": metrics}
+            for group, metrics in sorted(groups.items())
+        ],
+    }
+
+
+def summary(session) -> Dict:
+    rows = session.execute(
+        select(RatingAggregate.llm_model, RatingAggregate.bot_version, RatingAggregate.reappraisal,
+               RatingAggregate.metric,
+               RatingAggregate.n, RatingAggregate.total, RatingAggregate.total_sq)
+    ).all()
+    return summarize(rows)
+
+
+_cache: Tuple[float, Optional[Dict]] = (0.0, None)
+_cache_lock = threading.Lock()
+
+
+def cached_summary(max_age: float = CACHE_SECONDS) -> Dict:
+    """
+    summary(), computed at most once per `max_age` seconds per process.
+    """
+    global _cache
+    expires, value = _cache
+    if value is not None and time.monotonic() < expires:
+        return value
+    with _cache_lock:
+        expires, value = _cache
+        if value is None or time.monotonic() >= expires:
+            with get_session() as session:
+                value = {**summary(session), "generated_at": datetime.now(timezone.utc).isoformat()}
+            _cache = (time.monotonic() + max_age, value)
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reappraisal-effectiveness analytics")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("recompute")
+    report = sub.add_parser("report")
+    report.add_argument("--from-export", type=Path, help="compute from a db/export.py export instead")
+    args = parser.parse_args()
+
+    if args.command == "recompute":
+        print(f"Counted {recompute()} conversations")
+    elif args.from_export:
+        print(json.dumps(summarize(aggregate(*load_export_columns(args.from_export))), indent=2))
+    else:
+        with get_session() as session:
+            print(json.dumps(summary(session), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+# db/cache.py
+
+import json
+import os
+import select
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from db.db_session import get_engine, json_serializer
+from db.logger_setup import setup_logger
+
+'''
+Two-tier read cache shared by the gateway's and the bot's workers.
+
+  - local: an LRU dict in each process, CACHE_LOCAL_MAX_ENTRIES entries
+  - shared: a Redis-compatible server at CACHE_REDIS_URL (optional; without
+    it only the local tier is used)
+
+Off unless CACHE_TTL_SECONDS is set: values are JSON-serializable (dicts,
+lists), kept for CACHE_TTL_SECONDS in both tiers.
+
+Invalidation: crud's write functions call invalidate(session, key). The
+keys are sent with pg_notify() inside the writing transaction, so Postgres
+delivers them only if it commits, to every process LISTENing on
+CHANNEL; after the commit the writer also deletes them from the
+shared tier and its own local tier. Each process LISTENs from a thread
+started on its first lookup. The local tier is only used while that
+listener is connected (and is emptied whenever it reconnects), so a
+process never serves entries whose invalidation it may have missed.
+
+Stampedes: on a local miss only one thread per process loads a key; with
+a shared tier, only one process does (a SET NX lock), the others wait up to
+LOCK_WAIT_SECONDS for its value before loading it themselves.
+
+A load that races a write can still store the value read just before it;
+that entry lives at most CACHE_TTL_SECONDS. The writing client does not
+see it: for that long after its write it reads with cached=False, which
+bypasses both tiers (flask_app/utils.py recent_write()).
+'''
+
+logger = setup_logger()
+
+TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "0"))
+LOCAL_MAX_ENTRIES = int(os.getenv("CACHE_LOCAL_MAX_ENTRIES", "10000"))
+REDIS_URL = os.getenv("CACHE_REDIS_URL")
+CHANNEL = "cache_invalidate"
+KEY_PREFIX = "reap:"
+LOCK_SECONDS = 5.0
+LOCK_WAIT_SECONDS = 2.0
+LOCK_POLL_SECONDS = 0.05
+# NOTIFY payloads are limited to 8000 bytes
+MAX_PAYLOAD_BYTES = 7000
+
+_PENDING = "cache_invalidate"
+_COMMITTING = "cache_invalidate_committing"
+
+
+def user_key(user_id: int) -> str:
+    return f"user:{int(user_id)}"
+
+
+def conversations_key(user_id: int) -> str:
+    return f"conversations:{int(user_id)}"
+
+
+def messages_key(conversation_id: int) -> str:
+    return f"messages:{int(conversation_id)}"
+
+
+def enabled() -> bool:
+    return TTL_SECONDS > 0
+
+
+class LocalCache:
+    """
+    Thread-safe LRU dict whose entries expire after `ttl` seconds.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped on every eviction; a load that saw another value is not stored
+        self.generation = 0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, value, generation: int):
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def evict(self, keys: Iterable[str]):
+        with self._lock:
+            self.generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+
+_local = LocalCache(LOCAL_MAX_ENTRIES, TTL_SECONDS)
+# key -> [lock, number of threads using it], for one load per key at a time
+_loading: Dict[str, List] = {}
+_loading_lock = threading.Lock()
+
+_redis = None
+_redis_lock = threading.Lock()
+
+
+def _shared():
+    """
+    The shared-tier client, created on first use; None without CACHE_REDIS_URL.
+    """
+    global _redis
+    if _redis is None and REDIS_URL:
+        with _redis_lock:
+            if _redis is None:
+                import redis
+                _redis = redis.Redis.from_url(REDIS_URL, socket_timeout=1.0, socket_connect_timeout=1.0)
+    return _redis
+
+
+def _shared_get(client, key: str):
+    raw = client.get(KEY_PREFIX + key)
+    return None if raw is None else (json.loads(raw),)
+
+
+# ======================= Invalidation listener =======================
+
+_listener_pid: Optional[int] = None
+_listening = threading.Event()
+
+
+def _listen():
+    backoff = 1.0
+    while True:
+        conn = None
+        try:
+            # Detached: a pooled connection must not sit in LISTEN forever
+            conn = get_engine().raw_connection()
+            conn.detach()
+            dbapi = conn.driver_connection
+            dbapi.autocommit = True
+            cursor = dbapi.cursor()
+            cursor.execute(f"LISTEN {CHANNEL}")
+            # Anything cached before now may have missed an invalidation
+            _local.clear()
+            _listening.set()
+            backoff = 1.0
+            while True:
+                if select.select([dbapi], [], [], 30) == ([], [], []):
+                    # Idle; make sure the connection is still alive
+                    cursor.execute("SELECT 1")
+                dbapi.poll()
+                while dbapi.notifies:
+                    notify = dbapi.notifies.pop(0)
+                    _local.evict(notify.payload.split("\n"))
+        except Exception:
+            logger.warning("Cache invalidation listener disconnected; retrying in %.0fs", backoff, exc_info=True)
+        finally:
+            _listening.clear()
+            _local.clear()
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+        time.sleep(backoff)
+        backoff = min(backoff * 2, 30.0)
+
+
+def _ensure_listener():
+    # Per process: threads do not survive a gunicorn fork
+    global _listener_pid
+    pid = os.getpid()
+    if _listener_pid == pid:
+        return
+    with _loading_lock:
+        if _listener_pid == pid:
+            return
+        _listening.clear()
+        _local.clear()
+        threading.Thread(target=_listen, name="cache-listener", daemon=True).start()
+        _listener_pid = pid
+
+
+def invalidate(session: Session, *keys: str):
+    """
+    Drop `keys` from every process's cache once `session` commits.
+    (Nothing happens if it rolls back.)
+    """
+    if enabled():
+        session.info.setdefault(_PENDING, set()).update(keys)
+
+
+@event.listens_for(Session, "before_commit")
+def _notify_invalidations(session):
+    keys = session.info.pop(_PENDING, None)
+    if not keys:
+        return
+    payloads, chunk, size = [], [], 0
+    for key in sorted(keys):
+        if chunk and size + len(key) + 1 > MAX_PAYLOAD_BYTES:
+            payloads.append("\n".join(chunk))
+            chunk, size = [], 0
+        chunk.append(key)
+        size += len(key) + 1
+    payloads.append("\n".join(chunk))
+    for payload in payloads:
+        session.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": payload})
+    session.info[_COMMITTING] = keys
+
+
+@event.listens_for(Session, "after_commit")
+def _evict_committed(session):
+    keys = session.info.pop(_COMMITTING, None)
+    if not keys:
+        return
+    _local.evict(keys)
+    client = _shared()
+    if client is not None:
+        try:
+            client.delete(*(KEY_PREFIX + key for key in keys))
+        except Exception:
+            logger.warning("Could not invalidate %d shared cache keys", len(keys), exc_info=True)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_invalidations(session, previous_transaction):
+    session.info.pop(_PENDING, None)
+    session.info.pop(_COMMITTING, None)
+
+
+# ======================= Lookups =======================
+
+def get_or_load(key: str, loader: Callable[[], Any], cached: bool = True):
+    """
+    The cached value of `key`, else loader()'s result (cached unless None).
+
+    Args:
+        key (str): Cache key, e.g. messages_key(conversation_id).
+        loader (Callable): Reads the value from the database.
+        cached (bool): Whether the cache may answer; pass False right
+            after the client's own write, so it reads the database and not
+            a value stored by a load that raced the write.
+
+    Returns:
+        The cached or freshly loaded value.
+    """
+    if not (cached and enabled()):
+        return loader()
+    _ensure_listener()
+    if not _listening.is_set():
+        return _load_shared(key, loader)
+    entry = _local.get(key)
+    if entry is not None:
+        return entry[1]
+
+    with _loading_lock:
+        slot = _loading.setdefault(key, [threading.Lock(), 0])
+        slot[1] += 1
+    key_lock = slot[0]
+    try:
+        with key_lock:
+            # Another thread may have loaded it while we waited
+            entry = _local.get(key)
+            if entry is not None:
+                return entry[1]
+            generation = _local.generation
+            value = _load_shared(key, loader)
+            if value is not None:
+                _local.set(key, value, generation)
+            return value
+    finally:
+        with _loading_lock:
+            slot[1] -= 1
+            if slot[1] == 0:
+                _loading.pop(key, None)
+
+
+def _load_shared(key: str, loader: Callable[[], Any]):
+    client = _shared()
+    if client is None:
+        return loader()
+    try:
+        cached = _shared_get(client, key)
+        if cached is not None:
+            return cached[0]
+        token = uuid.uuid4().hex
+        lock = f"{KEY_PREFIX}lock:{key}"
+        if not client.set(lock, token, nx=True, px=int(LOCK_SECONDS * 1000)):
+            deadline = time.monotonic() + LOCK_WAIT_SECONDS
+            while time.monotonic() < deadline:
+                time.sleep(LOCK_POLL_SECONDS)
+                cached = _shared_get(client, key)
+                if cached is not None:
+                    return cached[0]
+            return loader()
+    except Exception:
+        logger.warning("Shared cache unavailable; loading %s from the database", key, exc_info=True)
+        return loader()
+
+    try:
+        value = loader()
+        if value is not None:
+            try:
+                client.set(KEY_PREFIX + key, json_serializer(value), px=int(TTL_SECONDS * 1000))
+            except Exception:
+                logger.warning("Could not store %s in the shared cache", key, exc_info=True)
+        return value
+    finally:
+        try:
+            # Only our own lock (it may have expired and been taken since)
+            if client.get(lock) == token.encode():
+                client.delete(lock)
+        except Exception:
+            pass
+
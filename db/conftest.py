@@ -0,0 +1,45 @@
+# db/conftest.py
+
+import os
+import time
+
+import pytest
+
+'''
+Tests that need Postgres run against the scratch database at
+TEST_DATABASE_URI: init_db() creates its tables and the tests write and
+delete rows (retention purges everything expired in it). They are skipped
+when TEST_DATABASE_URI is not set.
+
+    TEST_DATABASE_URI=postgresql://localhost/reap_test python -m pytest -q
+'''
+
+TEST_DATABASE_URI = os.getenv("TEST_DATABASE_URI")
+
+
+@pytest.fixture(scope="session")
+def pg_engine():
+    if not TEST_DATABASE_URI:
+        pytest.skip("TEST_DATABASE_URI not set")
+    from db import db_session
+
+    # get_engine() reads the URI on first use
+    os.environ["SQLALCHEMY_DATABASE_URI"] = TEST_DATABASE_URI
+    if db_session._engine is not None:
+        db_session._engine.dispose()
+        db_session._engine = None
+    db_session.init_db()
+    return db_session.get_engine()
+
+
+@pytest.fixture
+def user_id(pg_engine):
+    from db.db_session import get_session
+    from db.models import User
+
+    with get_session() as session:
+        # Not crud.create_user, which needs the Flask app's config
+        user = User(email=f"test-{time.time_ns()}@example.com", age=0)
+        session.add(user)
+        session.commit()
+        return user.id
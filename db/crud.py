@@ -1,7 +1,7 @@
 # db/crud.py
 
 from typing import Optional, List, Dict
-from sqlalchemy import select, func
+from sqlalchemy import select, func, cast, literal_column, tuple_, Float
 from sqlalchemy.orm import Session
 from datetime import datetime, timezone, timedelta
 from sqlalchemy.sql import or_, and_
@@ -12,12 +12,19 @@ from db.models import (
     Donation, 
     Support,
     AnalysisData,
+    ConversationRating,
+    RATING_FIELDS,
     LLMQuery,
+    LLMPayload,
     RoleEnum,
     ResponseTypeEnum,
-    ConvoStateEnum
+    ConvoStateEnum,
+    MESSAGE_SEARCH_CONFIG,
+    MESSAGE_SEARCH_VECTOR,
 )
+from sqlalchemy.dialects.postgresql import insert
 from flask import current_app
+from db import cache, payloads
 import secrets
 
 # ======================= Helper Functions =======================
@@ -38,6 +45,43 @@ def include_deleted_records(query, model, include_deleted: bool):
     return query
 
 
+# Tolerated clock skew between the services when bounding partitioned
+# queries by a conversation's creation time
+PARTITION_BOUND_SLACK = timedelta(days=1)
+
+
+def created_since(query, model, since):
+    """
+    Helper function to restrict a query on a partitioned table (messages,
+    llm_queries) to rows created at or after `since`, so Postgres only scans
+    the monthly partitions that can contain them.
+
+    Args:
+        query: The SQLAlchemy query object.
+        model: The partitioned model class (e.g., Message).
+        since: A datetime, a scalar subquery, or None for no bound.
+
+    Returns:
+        The modified query.
+    """
+    if since is not None:
+        query = query.where(model.created_at >= since)
+    return query
+
+
+def conversation_start_bound(conversation_id: int):
+    """
+    Lower bound on the created_at of a conversation's messages, as a scalar
+    subquery so it costs no extra round trip. Postgres prunes partitions with
+    it at execution time.
+    """
+    return (
+        select(Conversation.created_at - PARTITION_BOUND_SLACK)
+        .where(Conversation.id == conversation_id)
+        .scalar_subquery()
+    )
+
+
 # ======================= USERS =======================
 def get_user_by_id(
     session: Session, 
@@ -143,6 +187,7 @@ def update_user(
     for key, value in kwargs.items():
         setattr(user, key, value)
     user.updated_at = datetime.now(timezone.utc)
+    cache.invalidate(session, cache.user_key(user.id))
     return user
 
 
@@ -162,6 +207,7 @@ def soft_delete_user(
     """
     user.deleted_at = datetime.now(timezone.utc)
     user.updated_at = datetime.now(timezone.utc)
+    cache.invalidate(session, cache.user_key(user.id))
     return user
 
 
@@ -232,6 +278,7 @@ def create_conversation(
         deleted_at=None
     )
     session.add(conversation)
+    cache.invalidate(session, cache.conversations_key(user_id))
     return conversation
 
 
@@ -254,6 +301,7 @@ def update_conversation(
     for key, value in kwargs.items():
         setattr(conversation, key, value)
     conversation.updated_at = datetime.now(timezone.utc)
+    cache.invalidate(session, cache.conversations_key(conversation.user_id))
     return conversation
 
 
@@ -273,6 +321,7 @@ def soft_delete_conversation(
     """
     conversation.deleted_at = datetime.now(timezone.utc)
     conversation.updated_at = datetime.now(timezone.utc)
+    cache.invalidate(session, cache.conversations_key(conversation.user_id))
     return conversation
 
 
@@ -280,7 +329,8 @@ def soft_delete_conversation(
 def get_message_by_id(
     session: Session,
     message_id: int,
-    include_deleted: bool = False
+    include_deleted: bool = False,
+    created_at: Optional[datetime] = None
 ) -> Optional[Message]:
     """
     Fetch a Message by its ID, optionally including soft-deleted messages.
@@ -289,11 +339,15 @@ def get_message_by_id(
         session (Session): The database session.
         message_id (int): The ID of the message to fetch.
         include_deleted (bool): Whether to include soft-deleted messages.
+        created_at (Optional[datetime]): The message's creation time, if known;
+            limits the lookup to one partition.
 
     Returns:
         Optional[Message]: The Message object if found, else None.
     """
     stmt = select(Message).where(Message.id == message_id)
+    if created_at is not None:
+        stmt = stmt.where(Message.created_at == created_at)
     stmt = include_deleted_records(stmt, Message, include_deleted)
     result = session.execute(stmt)
     return result.scalar_one_or_none()
@@ -302,7 +356,8 @@ def get_message_by_id(
 def get_conversation_messages(
     session: Session,
     conversation_id: int,
-    include_deleted: bool = False
+    include_deleted: bool = False,
+    since: Optional[datetime] = None
 ) -> List[Message]:
     """
     Fetch all messages for a given conversation, optionally including soft-deleted messages.
@@ -311,12 +366,16 @@ def get_conversation_messages(
         session (Session): The database session.
         conversation_id (int): The ID of the conversation.
         include_deleted (bool): Whether to include soft-deleted messages.
+        since (Optional[datetime]): Lower bound on created_at for partition
+            pruning; defaults to the conversation's creation time.
 
     Returns:
         List[Message]: A list of Message objects.
     """
     stmt = select(Message).where(Message.conversation_id == conversation_id)
+    stmt = created_since(stmt, Message, since if since is not None else conversation_start_bound(conversation_id))
     stmt = include_deleted_records(stmt, Message, include_deleted)
+    stmt = stmt.order_by(Message.created_at, Message.id)
     result = session.execute(stmt)
     return result.scalars().all()
 
@@ -324,7 +383,8 @@ def get_conversation_messages(
 def get_user_messages(
     session: Session,
     user_id: int,
-    include_deleted: bool = False
+    include_deleted: bool = False,
+    since: Optional[datetime] = None
 ) -> List[Message]:
     """
     Fetch all messages for a given user, optionally including soft-deleted messages.
@@ -333,16 +393,90 @@ def get_user_messages(
         session (Session): The database session.
         user_id (int): The ID of the user.
         include_deleted (bool): Whether to include soft-deleted messages.
+        since (Optional[datetime]): Only messages created at or after this time
+            (skips older partitions).
 
     Returns:
         List[Message]: A list of Message objects.
     """
     stmt = select(Message).where(Message.user_id == user_id)
+    stmt = created_since(stmt, Message, since)
     stmt = include_deleted_records(stmt, Message, include_deleted)
     result = session.execute(stmt)
     return result.scalars().all()
 
 
+def search_user_conversations(
+    session: Session,
+    user_id: int,
+    query: str,
+    limit: int = 20,
+    after: Optional[tuple] = None
+) -> List:
+    """
+    Full-text search of a user's own messages, one hit per conversation.
+
+    Matches the user's live messages in their non-deleted, non-ephemeral
+    conversations through messages_content_search_index, ranks each
+    conversation by its best message and highlights that message.
+
+    Args:
+        session (Session): The database session.
+        user_id (int): The ID of the user searching.
+        query (str): Search terms (websearch syntax: "quoted phrases", -excluded, or).
+        limit (int): Maximum number of conversations to return.
+        after (Optional[tuple]): (rank, conversation_id) of the last hit of the
+            previous page (keyset pagination).
+
+    Returns:
+        List: Rows of (conversation_id, oneline_summary, last_active_at, rank, snippet),
+            best first. The snippet is HTML-escaped with matches wrapped in <mark>.
+    """
+    config = literal_column(f"'{MESSAGE_SEARCH_CONFIG}'")
+    vector = literal_column(MESSAGE_SEARCH_VECTOR)
+    tsquery = func.websearch_to_tsquery(config, query)
+    rank = cast(func.ts_rank(vector, tsquery), Float)
+    matches = (
+        select(
+            Message.conversation_id,
+            Message.content,
+            rank.label("rank"),
+            func.row_number().over(
+                partition_by=Message.conversation_id, order_by=(rank.desc(), Message.id)
+            ).label("position"),
+        )
+        .join(Conversation, Conversation.id == Message.conversation_id)
+        .where(
+            Message.user_id == user_id,
+            Message.role == RoleEnum.USER,
+            Message.deleted_at.is_(None),
+            vector.op("@@")(tsquery),
+            Conversation.user_id == user_id,
+            Conversation.deleted_at.is_(None),
+            Conversation.ephemeral.is_(False),
+        )
+        .subquery()
+    )
+    escaped = func.replace(func.replace(func.replace(matches.c.content, "&", "&amp;"), "<", "&lt;"), ">", "&gt;")
+    stmt = (
+        select(
+            matches.c.conversation_id,
+            Conversation.oneline_summary,
+            Conversation.last_active_at,
+            matches.c.rank,
+            func.ts_headline(config, escaped, tsquery,
+                             "StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=20, MinWords=5")
+            .label("snippet"),
+        )
+        .join(Conversation, Conversation.id == matches.c.conversation_id)
+        .where(matches.c.position == 1)
+    )
+    if after is not None:
+        stmt = stmt.where(tuple_(matches.c.rank, matches.c.conversation_id) < tuple_(*after))
+    stmt = stmt.order_by(matches.c.rank.desc(), matches.c.conversation_id.desc()).limit(limit)
+    return session.execute(stmt).all()
+
+
 def create_message(
     session: Session,
     user_id: int,
@@ -352,6 +486,7 @@ def create_message(
     role: RoleEnum,
     response_type: ResponseTypeEnum,
     options: Optional[Dict] = None,
+    bot_version: Optional[str] = None,
 ) -> Message:
     """
     Create a new Message record.
@@ -365,6 +500,8 @@ def create_message(
         state (ConvoStateEnum): The state of the conversation.
         role (RoleEnum): The role of the message sender.
         response_type (ResponseTypeEnum): The type of response (e.g., text, image).
+        options (Optional[Dict]): Response options (e.g., slider config).
+        bot_version (Optional[str]): Version of the prompts/bot messages that produced the message.
 
     Returns:
         Message: The newly created message object. 
@@ -381,11 +518,14 @@ def create_message(
         response_type=response_type,
         options=options,
         state=state,
+        bot_version=bot_version,
         created_at=datetime.now(timezone.utc),
         updated_at=datetime.now(timezone.utc),
         deleted_at=None
     )
     session.add(msg)
+    # The conversation list labels conversations by their first user message
+    cache.invalidate(session, cache.messages_key(conversation_id), cache.conversations_key(user_id))
     return msg
 
 
@@ -408,6 +548,7 @@ def update_message(
     for key, value in kwargs.items():
         setattr(message, key, value)
     message.updated_at = datetime.now(timezone.utc)
+    cache.invalidate(session, cache.messages_key(message.conversation_id))
     return message
 
 
@@ -427,6 +568,7 @@ def soft_delete_message(
     """
     message.deleted_at = datetime.now(timezone.utc)
     message.updated_at = datetime.now(timezone.utc)
+    cache.invalidate(session, cache.messages_key(message.conversation_id))
     return message
 
 
@@ -673,6 +815,46 @@ def soft_delete_support_query(
 
 # ======================= AnalysisData =======================
 
+def parse_rating(content) -> Optional[float]:
+    """
+    The numeric value of a rating as sent by the client, or None.
+    """
+    try:
+        return float(content)
+    except (TypeError, ValueError):
+        return None
+
+
+def upsert_conversation_rating(
+    session: Session,
+    user_id: int,
+    conversation_id: int,
+    field: str,
+    value: Optional[float]
+    ) -> None:
+    """
+    Set one rating column of the conversation's conversation_ratings row,
+    creating the row on the first rating, and mark the field answered (also
+    when `value` is None). Fields without a column are ignored.
+    (No commit here, so it lands in the same transaction as the analysis_data row.)
+    """
+    if field not in RATING_FIELDS:
+        return
+    now = datetime.now(timezone.utc)
+    stmt = insert(ConversationRating).values(
+        conversation_id=conversation_id, user_id=user_id, answered_fields=[field], created_at=now, updated_at=now,
+        **{field: value})
+    answered = ConversationRating.answered_fields
+    session.execute(stmt.on_conflict_do_update(
+        index_elements=[ConversationRating.conversation_id],
+        set_={
+            field: stmt.excluded[field],
+            "answered_fields": func.array_append(func.array_remove(answered, field), field),
+            "updated_at": now,
+        },
+    ))
+
+
 def create_analysis_data(
     session: Session, 
     user_id: int,
@@ -681,20 +863,36 @@ def create_analysis_data(
     content: str
     ) -> AnalysisData:
     """
-    Create a new row in the analysis_data table.
+    Create a new row in the analysis_data table and record the rating in
+    conversation_ratings.
     """
+    value = parse_rating(content)
     data = AnalysisData(
         user_id=user_id,
         conversation_id=conversation_id,
         field=field,
         content=content,
+        value=value,
         created_at=datetime.now(timezone.utc),
         updated_at=datetime.now(timezone.utc),
         deleted_at=None
     )
     session.add(data)
+    upsert_conversation_rating(session, user_id, conversation_id, field, value)
     return data
 
+
+def get_conversation_ratings(
+    session: Session,
+    conversation_id: int
+    ) -> Optional[ConversationRating]:
+    """
+    Fetch the wide ratings row of a conversation (None before the first rating).
+    """
+    stmt = select(ConversationRating).where(ConversationRating.conversation_id == conversation_id)
+    result = session.execute(stmt)
+    return result.scalar_one_or_none()
+
 def get_user_analysis_data(
     session: Session, 
     user_id: int, 
@@ -731,20 +929,64 @@ def update_analyis_data(session: Session, data: AnalysisData, **kwargs) -> Analy
     """
     for key, value in kwargs.items():
         setattr(data, key, value)
+    if "content" in kwargs and "value" not in kwargs:
+        data.value = parse_rating(data.content)
     data.updated_at = datetime.now(timezone.utc)
+    if {"content", "value", "field"} & kwargs.keys():
+        upsert_conversation_rating(session, data.user_id, data.conversation_id, data.field, data.value)
     return data
 
 
 # ======================= LLM QUERIES =======================
 
-def create_llm_query(session: Session, user_id: int, completion: Dict, message_id: int=None, **kwargs) -> LLMQuery:
+def get_or_create_llm_payload(session: Session, obj) -> LLMPayload:
+    """
+    Store a JSON payload compressed in llm_payloads, once per distinct content.
+
+    Args:
+        session (Session): The database session.
+        obj: The JSON-serializable payload.
+
+    Returns:
+        LLMPayload: The new or existing payload row. (No commit here)
+    """
+    content_hash, data, size_raw = payloads.encode(obj)
+    while True:
+        now = datetime.now(timezone.utc)
+        # Concurrent workers may store the same content; the unique hash decides
+        session.execute(
+            insert(LLMPayload)
+            .values(content_hash=content_hash, data=data, size_raw=size_raw, size_compressed=len(data),
+                    created_at=now, updated_at=now)
+            .on_conflict_do_nothing(index_elements=[LLMPayload.content_hash])
+        )
+        # Locked so db/retention.py cannot delete an unreferenced payload
+        # before the llm_queries row that reuses it commits
+        payload = session.execute(
+            select(LLMPayload).where(LLMPayload.content_hash == content_hash).with_for_update(key_share=True)
+        ).scalar_one_or_none()
+        if payload is not None:
+            return payload
+        # Deleted by retention between the insert and the lock; store it again
+
+
+def create_llm_query(session: Session, user_id: int, completion: Dict, message_id: int=None,
+                     conversation_id: int = None, request_messages: Optional[List[Dict]] = None, **kwargs) -> LLMQuery:
     """
     Create a new row in the llm_queries table.
+    The completion (compacted) and the request messages go to llm_payloads.
+    Extra keyword args (tokens_prompt, llm_model, latency_ms, request_hash, ...) are set on the row.
     """
+    completion_payload = get_or_create_llm_payload(session, payloads.compact_completion(completion))
+    request_payload = None
+    if request_messages is not None:
+        request_payload = get_or_create_llm_payload(session, request_messages)
     data = LLMQuery(
         user_id=user_id,
+        conversation_id=conversation_id,
         message_id=message_id,
-        completion=completion,
+        completion_payload_id=completion_payload.id,
+        request_payload_id=request_payload.id if request_payload else None,
         created_at=datetime.now(timezone.utc),
         updated_at=datetime.now(timezone.utc),
         deleted_at=None,
@@ -753,6 +995,25 @@ def create_llm_query(session: Session, user_id: int, completion: Dict, message_i
     session.add(data)
     return data
 
+
+def get_llm_query_completion(session: Session, llm_query: LLMQuery) -> Optional[Dict]:
+    """
+    The completion payload of an LLM query, from whichever tier holds it
+    (inline JSONB for old rows, llm_payloads, or an archive file).
+    """
+    if llm_query.completion_payload_id is None:
+        return llm_query.completion
+    return payloads.load(llm_query.completion_payload)
+
+
+def get_llm_query_request_messages(session: Session, llm_query: LLMQuery) -> Optional[List[Dict]]:
+    """
+    The request messages of an LLM query, from whichever tier holds them.
+    """
+    if llm_query.request_payload_id is None:
+        return llm_query.request_messages
+    return payloads.load(llm_query.request_payload)
+
 def update_llm_query(session: Session, data: LLMQuery, **kwargs) -> LLMQuery:
     """
     Update fields on the llm_queries table.
@@ -760,4 +1021,31 @@ def update_llm_query(session: Session, data: LLMQuery, **kwargs) -> LLMQuery:
     for key, value in kwargs.items():
         setattr(data, key, value)
     data.updated_at = datetime.now(timezone.utc)
-    return data
\ No newline at end of file
+    return data
+
+
+def get_llm_query_by_request_hash(
+    session: Session,
+    request_hash: str,
+    include_deleted: bool = False,
+    since: Optional[datetime] = None
+) -> Optional[LLMQuery]:
+    """
+    Fetch the most recent LLM query recorded for a request hash.
+
+    Args:
+        session (Session): The database session.
+        request_hash (str): Content hash of the request messages.
+        include_deleted (bool): Whether to include soft-deleted rows.
+        since (Optional[datetime]): Only consider rows created at or after this
+            time (skips older partitions).
+
+    Returns:
+        Optional[LLMQuery]: The LLMQuery object if found, else None.
+    """
+    stmt = select(LLMQuery).where(LLMQuery.request_hash == request_hash)
+    stmt = created_since(stmt, LLMQuery, since)
+    stmt = include_deleted_records(stmt, LLMQuery, include_deleted)
+    stmt = stmt.order_by(LLMQuery.created_at.desc(), LLMQuery.id.desc()).limit(1)
+    result = session.execute(stmt)
+    return result.scalar_one_or_none()
@@ -2,30 +2,204 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm import Session
 from db.models import Base
+from db import stats as db_stats
+from db.logger_setup import setup_logger
+from telemetry import tracing
 import os
+import json
+import threading
+import time
+from collections.abc import Mapping
 from contextlib import contextmanager
+from typing import Optional, Tuple
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-# Load database URL from configuration
-DATABASE_URL = os.getenv("SQLALCHEMY_DATABASE_URI")
+def _json_default(obj):
+    """
+    Serialize read-only mappings (e.g. the bot's frozen message templates) as dicts.
+    """
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def json_serializer(obj) -> str:
+    return json.dumps(obj, default=_json_default)
+
+
+logger = setup_logger()
+
+_engine = None
+_engine_lock = threading.Lock()
+
+# Bound to the engine on first use, see get_engine()
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+
+def get_engine():
+    """
+    Create the engine on first use rather than at import, so importing the
+    services stays cheap and a gunicorn master running with preload_app
+    never opens connections that its workers would inherit.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                # Read at first use so CLI tools can set it after import
+                engine = create_engine(os.getenv("SQLALCHEMY_DATABASE_URI"), json_serializer=json_serializer,
+                                       poolclass=db_stats.TimedQueuePool)
+                db_stats.install(engine)
+                tracing.instrument_engine(engine)
+                SessionLocal.configure(bind=engine)
+                _engine = engine
+    return _engine
+
+
+# ======================= Read replica =======================
+#
+# When SQLALCHEMY_REPLICA_URI points at a streaming replica,
+# get_session(readonly=True) reads from it. A client that has just written
+# carries the primary's WAL position at that moment (min_lsn, the gateway
+# keeps it in a short-lived cookie); its reads stay on the primary until the
+# replica has replayed that far. Reads also fall back to the primary while
+# the replica lags more than DB_REPLICA_MAX_LAG_SECONDS or is unreachable.
+# A second plain Postgres works as the "replica" in tests: it reports no
+# replay position and counts as caught up.
+
+REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "10"))
+# How long one check of the replica's position is reused
+REPLICA_STATUS_TTL = 1.0
+
+_replica_engine = None
+ReplicaSessionLocal = sessionmaker(autocommit=False, autoflush=False)
+_replica_status: Tuple[float, Optional[int], float] = (0.0, None, 0.0)
+
+
+def get_replica_engine():
+    """
+    The replica engine, created on first use; None when no replica is configured.
+    """
+    global _replica_engine
+    if _replica_engine is None and os.getenv("SQLALCHEMY_REPLICA_URI"):
+        with _engine_lock:
+            if _replica_engine is None:
+                engine = create_engine(os.getenv("SQLALCHEMY_REPLICA_URI"), json_serializer=json_serializer,
+                                       poolclass=db_stats.TimedQueuePool)
+                db_stats.install(engine)
+                tracing.instrument_engine(engine)
+                ReplicaSessionLocal.configure(bind=engine)
+                _replica_engine = engine
+    return _replica_engine
+
+
+def parse_lsn(lsn: Optional[str]) -> Optional[int]:
+    """
+    '16/B374D848' -> its 64-bit WAL position, None if not an LSN.
+    """
+    try:
+        high, low = lsn.split("/")
+        return (int(high, 16) << 32) + int(low, 16)
+    except (AttributeError, ValueError):
+        return None
+
+
+def primary_lsn() -> str:
+    """
+    The primary's current WAL position, to pin a client that just wrote.
+    """
+    with get_engine().connect() as conn:
+        return conn.exec_driver_sql("SELECT pg_current_wal_lsn()::text").scalar()
 
-# Create the engine and initialize the database
-engine = create_engine(DATABASE_URL)
-Base.metadata.create_all(bind=engine)
 
-# Create a configured session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def replica_status() -> Tuple[Optional[int], float]:
+    """
+    (replayed WAL position, lag in seconds) of the replica, checked at most
+    once per REPLICA_STATUS_TTL. The position is None on a server that is
+    not a standby. Raises if the replica is unreachable.
+    """
+    global _replica_status
+    checked_at, replay_lsn, lag = _replica_status
+    if time.monotonic() - checked_at < REPLICA_STATUS_TTL:
+        return replay_lsn, lag
+    # On a raw DBAPI connection so the probe is not counted against the
+    # request's query budget (db/stats.py)
+    conn = get_replica_engine().raw_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT pg_last_wal_replay_lsn()::text,
+                   CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END
+        """)
+        replay, lag = cursor.fetchone()
+        cursor.close()
+    finally:
+        conn.close()
+    replay_lsn, lag = parse_lsn(replay), float(lag or 0)
+    _replica_status = (time.monotonic(), replay_lsn, lag)
+    for observer in db_stats.replica_lag_observers:
+        observer(lag)
+    return replay_lsn, lag
+
+
+def _use_replica(min_lsn: Optional[str]) -> bool:
+    if get_replica_engine() is None:
+        return False
+    try:
+        replay_lsn, lag = replica_status()
+    except Exception:
+        logger.warning("Read replica unavailable; reading from the primary", exc_info=True)
+        return False
+    if lag > REPLICA_MAX_LAG:
+        return False
+    wanted = parse_lsn(min_lsn)
+    return wanted is None or replay_lsn is None or replay_lsn >= wanted
+
+
+def init_db():
+    """
+    Create any missing tables. Schema changes go through the Alembic
+    migrations in flask_app/migrations; this is for scratch databases
+    (benchmarks, replays).
+    """
+    from db.partitions import ensure_partitions
+    engine = get_engine()
+    Base.metadata.create_all(bind=engine)
+    # create_all only makes the partitioned parents
+    ensure_partitions(engine)
+
+
+def _after_fork_in_child():
+    # Connections inherited from the parent must not be shared; drop them
+    # from the pool without closing the parent's sockets.
+    if _engine is not None:
+        _engine.dispose(close=False)
+    if _replica_engine is not None:
+        _replica_engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
 
 @contextmanager
-def get_session():
+def get_session(readonly: bool = False, min_lsn: Optional[str] = None):
     """
     Provides a transactional scope for database operations.
+
+    readonly=True reads from the replica when one is configured and has
+    replayed up to min_lsn (the client's last write, see primary_lsn());
+    otherwise, and for every read-write session, the primary is used.
     """
-    session = SessionLocal()  # Initialize a new database session
+    if readonly and _use_replica(min_lsn):
+        session = ReplicaSessionLocal()
+    else:
+        get_engine()
+        session = SessionLocal()  # Initialize a new database session
     try:
         yield session  # Provide the session to the context
     finally:
-        session.close()  # Ensure the session is always closed
\ No newline at end of file
+        session.close()  # Ensure the session is always closed
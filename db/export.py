@@ -0,0 +1,325 @@
+# db/export.py
+
+import argparse
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import func, select, true
+
+from db.db_session import get_session
+from db.logger_setup import setup_logger
+from db.models import Conversation, ConversationRating, LLMQuery, Message, RATING_FIELDS, User
+
+'''
+Research export of consenting users' conversations and messages to Parquet.
+
+    python -m db.export                 # everything new since the last run
+    python -m db.export --full          # start over (also picks up consent changes)
+
+Two datasets are written under RESEARCH_EXPORT_DIR, one directory each,
+as part files named after the run:
+
+    conversations/  one row per conversation: state, timestamps, every
+                    rating (from conversation_ratings), the model and
+                    bot version of completed ones, and message and LLM
+                    usage totals (llm_queries.conversation_id)
+    messages/       one row per message; a user message carries the LLM
+                    usage of the turn it started (llm_queries.message_id)
+
+llm_queries rows from before the bot recorded conversation_id and
+message_id (migration f2c4e6a80012) are not attributed to anything.
+
+Rows are streamed from a server-side cursor and written one row group per
+batch, so memory stays bounded by --batch-size whatever the table sizes.
+
+Only users with research_consent are exported; deleted rows and ephemeral
+conversations are skipped. _state.json keeps each dataset's watermark:
+messages resume after the last exported id, conversations after the last
+change (conversation or rating update), so a conversation that changed
+again appears in a later part too; keep the row with the latest
+changed_at. Rows newer than SETTLE_SECONDS are left for the next run, so
+transactions still open at export time are not skipped.
+'''
+
+logger = setup_logger()
+
+EXPORT_DIR = Path(os.getenv("RESEARCH_EXPORT_DIR", "exports"))
+STATE_FILE = "_state.json"
+BATCH_SIZE = 10_000
+ROWS_PER_FILE = 1_000_000
+SETTLE_SECONDS = 600
+
+
+def _columns(fields) -> pa.Schema:
+    return pa.schema([pa.field(name, type_) for name, type_ in fields])
+
+
+MESSAGE_SCHEMA = _columns([
+    ("id", pa.int64()),
+    ("conversation_id", pa.int64()),
+    ("user_id", pa.int64()),
+    ("state", pa.string()),
+    ("role", pa.string()),
+    ("response_type", pa.string()),
+    ("content", pa.string()),
+    ("question_id", pa.string()),
+    ("bot_version", pa.string()),
+    ("llm_model", pa.string()),
+    ("tokens_prompt", pa.int64()),
+    ("tokens_completion", pa.int64()),
+    ("llm_queries", pa.int64()),
+    ("llm_tokens_prompt", pa.int64()),
+    ("llm_tokens_completion", pa.int64()),
+    ("llm_latency_ms", pa.float64()),
+    ("created_at", pa.timestamp("us")),
+])
+
+CONVERSATION_SCHEMA = _columns([
+    ("id", pa.int64()),
+    ("user_id", pa.int64()),
+    ("state", pa.string()),
+    ("oneline_summary", pa.string()),
+    *[(field, pa.float64()) for field in RATING_FIELDS],
+    ("reappraisal", pa.string()),
+    ("llm_model", pa.string()),
+    ("bot_version", pa.string()),
+    ("messages", pa.int64()),
+    ("tokens_prompt", pa.int64()),
+    ("tokens_completion", pa.int64()),
+    ("llm_queries", pa.int64()),
+    ("llm_tokens_prompt", pa.int64()),
+    ("llm_tokens_completion", pa.int64()),
+    ("llm_latency_ms", pa.float64()),
+    ("created_at", pa.timestamp("us")),
+    ("last_active_at", pa.timestamp("us")),
+    ("completed_at", pa.timestamp("us")),
+    ("changed_at", pa.timestamp("us")),
+])
+
+
+def _consenting():
+    return (User.research_consent.is_(True)) & (User.deleted_at.is_(None))
+
+
+def _llm_usage(*where):
+    """
+    Lateral subquery summing the live llm_queries rows matching `where`.
+    """
+    return (
+        select(
+            func.count().label("llm_queries"),
+            func.sum(LLMQuery.tokens_prompt).label("llm_tokens_prompt"),
+            func.sum(LLMQuery.tokens_completion).label("llm_tokens_completion"),
+            func.sum(LLMQuery.latency_ms).label("llm_latency_ms"),
+        )
+        .where(*where, LLMQuery.deleted_at.is_(None))
+        .lateral("usage")
+    )
+
+
+def messages_query(after_id: int, until: datetime):
+    """
+    Messages of consenting users with id > after_id, created before `until`.
+    """
+    usage = _llm_usage(LLMQuery.message_id == Message.id)
+    return (
+        select(
+            Message.id, Message.conversation_id, Message.user_id, Message.state, Message.role,
+            Message.response_type, Message.content,
+            func.coalesce(Message.options["question_id"].astext, Message.options["questionId"].astext)
+            .label("question_id"),
+            Message.bot_version, Message.llm_model, Message.tokens_prompt, Message.tokens_completion,
+            usage.c.llm_queries, usage.c.llm_tokens_prompt, usage.c.llm_tokens_completion, usage.c.llm_latency_ms,
+            Message.created_at,
+        )
+        .join(User, User.id == Message.user_id)
+        .join(Conversation, Conversation.id == Message.conversation_id)
+        .outerjoin(usage, true())
+        .where(
+            _consenting(),
+            Message.id > after_id,
+            Message.created_at < until,
+            Message.deleted_at.is_(None),
+            Conversation.deleted_at.is_(None),
+            Conversation.ephemeral.is_(False),
+        )
+        .order_by(Message.id)
+    )
+
+
+def conversations_query(after: Optional[datetime], until: datetime):
+    """
+    Consenting users' conversations whose row or ratings changed in (after, until).
+    """
+    totals = (
+        select(
+            func.count().label("messages"),
+            func.sum(Message.tokens_prompt).label("tokens_prompt"),
+            func.sum(Message.tokens_completion).label("tokens_completion"),
+        )
+        .where(Message.conversation_id == Conversation.id, Message.deleted_at.is_(None))
+        .lateral("totals")
+    )
+    usage = _llm_usage(LLMQuery.conversation_id == Conversation.id)
+    changed_at = func.greatest(Conversation.updated_at, ConversationRating.updated_at)
+    query = (
+        select(
+            Conversation.id, Conversation.user_id, Conversation.state, Conversation.oneline_summary,
+            *[getattr(ConversationRating, field) for field in RATING_FIELDS],
+            ConversationRating.reappraisal, ConversationRating.llm_model, ConversationRating.bot_version,
+            totals.c.messages, totals.c.tokens_prompt, totals.c.tokens_completion,
+            usage.c.llm_queries, usage.c.llm_tokens_prompt, usage.c.llm_tokens_completion, usage.c.llm_latency_ms,
+            Conversation.created_at, Conversation.last_active_at, ConversationRating.completed_at,
+            changed_at.label("changed_at"),
+        )
+        .join(User, User.id == Conversation.user_id)
+        .outerjoin(ConversationRating, ConversationRating.conversation_id == Conversation.id)
+        .outerjoin(totals, true())
+        .outerjoin(usage, true())
+        .where(
+            _consenting(),
+            Conversation.deleted_at.is_(None),
+            Conversation.ephemeral.is_(False),
+            changed_at < until,
+        )
+        .order_by(changed_at, Conversation.id)
+    )
+    if after is not None:
+        query = query.where(changed_at > after)
+    return query
+
+
+def _value(value):
+    # Enum members are exported by value ("rate_issue"), not by name
+    return getattr(value, "value", value)
+
+
+def _table(rows, schema: pa.Schema) -> pa.Table:
+    columns = {name: [] for name in schema.names}
+    for row in rows:
+        for name, value in zip(schema.names, row):
+            columns[name].append(_value(value))
+    return pa.Table.from_pydict(columns, schema=schema)
+
+
+class PartWriter:
+    """
+    Writes row groups to <dir>/part-<run>-<n>.parquet, starting a new file
+    every `rows_per_file` rows. Files are written under a .tmp name and
+    renamed when complete.
+    """
+
+    def __init__(self, directory: Path, run: str, schema: pa.Schema, rows_per_file: int = ROWS_PER_FILE):
+        self.directory = directory
+        self.run = run
+        self.schema = schema
+        self.rows_per_file = rows_per_file
+        self.files: List[Path] = []
+        self.rows = 0
+        self._writer = None
+        self._path = None
+        self._file_rows = 0
+
+    def write(self, table: pa.Table):
+        if self._writer is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._path = self.directory / f"part-{self.run}-{len(self.files):04d}.parquet"
+            self._writer = pq.ParquetWriter(f"{self._path}.tmp", self.schema, compression="zstd")
+        self._writer.write_table(table)
+        self._file_rows += table.num_rows
+        self.rows += table.num_rows
+        if self._file_rows >= self.rows_per_file:
+            self._finish()
+
+    def _finish(self):
+        self._writer.close()
+        os.replace(f"{self._path}.tmp", self._path)
+        self.files.append(self._path)
+        self._writer, self._file_rows = None, 0
+
+    def close(self):
+        if self._writer is not None:
+            self._finish()
+
+
+def _stream(session, query, writer: PartWriter, batch_size: int):
+    """
+    Stream `query` into `writer`; returns the last row written (or None).
+    """
+    result = session.execute(query.execution_options(yield_per=batch_size))
+    last = None
+    for rows in result.partitions():
+        writer.write(_table(rows, writer.schema))
+        last = rows[-1]
+        logger.info("Exported %d rows to %s", writer.rows, writer.directory)
+    return last
+
+
+def load_state(out: Path) -> Dict:
+    path = out / STATE_FILE
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def save_state(out: Path, state: Dict):
+    tmp = out / f"{STATE_FILE}.tmp"
+    tmp.write_text(json.dumps(state, indent=2))
+    os.replace(tmp, out / STATE_FILE)
+
+
+def export(out: Path = EXPORT_DIR, full: bool = False, batch_size: int = BATCH_SIZE,
+           rows_per_file: int = ROWS_PER_FILE) -> Dict[str, int]:
+    """
+    Export everything new since the last run (or everything, with full=True).
+    The watermarks only advance once a dataset's files are complete.
+    Returns the number of rows written per dataset.
+    """
+    out.mkdir(parents=True, exist_ok=True)
+    state = {} if full else load_state(out)
+    # Naive UTC, like the stored timestamps
+    until = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=SETTLE_SECONDS)
+    run = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}"
+    counts = {}
+
+    after_id = state.get("messages", {}).get("last_id", 0)
+    writer = PartWriter(out / "messages", run, MESSAGE_SCHEMA, rows_per_file)
+    with get_session() as session:
+        last = _stream(session, messages_query(after_id, until), writer, batch_size)
+    writer.close()
+    if last is not None:
+        state["messages"] = {"last_id": last.id}
+        save_state(out, state)
+    counts["messages"] = writer.rows
+
+    after = state.get("conversations", {}).get("changed_at")
+    writer = PartWriter(out / "conversations", run, CONVERSATION_SCHEMA, rows_per_file)
+    with get_session() as session:
+        last = _stream(session, conversations_query(after and datetime.fromisoformat(after), until),
+                       writer, batch_size)
+    writer.close()
+    if last is not None:
+        state["conversations"] = {"changed_at": last.changed_at.isoformat()}
+        save_state(out, state)
+    counts["conversations"] = writer.rows
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export consenting users' conversations and messages to Parquet")
+    parser.add_argument("--out", type=Path, default=EXPORT_DIR)
+    parser.add_argument("--full", action="store_true", help="ignore the watermarks and export everything")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--rows-per-file", type=int, default=ROWS_PER_FILE)
+    args = parser.parse_args()
+
+    counts = export(args.out, args.full, args.batch_size, args.rows_per_file)
+    for dataset, rows in counts.items():
+        print(f"{dataset:14} {rows} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+# db/message_options.py
+
+import json
+import threading
+from collections.abc import Mapping
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, text
+from sqlalchemy.dialects.postgresql import insert
+
+from db.logger_setup import setup_logger
+from db.models import RegistryVersion
+
+'''
+Compact storage for the options of question messages.
+
+A slider question's options (min, max, step, five labels) come from
+bot_msgs.yml and used to be copied into Message.options for every bot
+question and every user reply. Now such rows store only a reference:
+
+    {"question_id": "rate_issue_neg", "registry_version": "469021642394"}
+
+A user reply's reference also keeps what the client added to the options
+(its "questionId" and slider "defaultValue"), so hydrating it gives back
+every key the client sent, plus the registry's question_id and labels.
+
+The bot publishes each registry version's question options to
+registry_versions the first time it stores a reference to it. Readers
+(the gateway's /get_messages) hydrate references back into full options.
+They use an in-process cache keyed by version: a version's content never
+changes, so nothing needs invalidating.
+
+Options that do not match the registry (free-form or unknown questions)
+are stored as they are. The client sends the question id as "questionId"
+on replies; both spellings are accepted.
+'''
+
+logger = setup_logger()
+
+REF_KEYS = frozenset(("question_id", "registry_version"))
+# Keys the client adds to the options of a reply; kept on its reference
+CLIENT_KEYS = frozenset(("questionId", "defaultValue"))
+# Keys that do not have to match the registry: the id itself, the client's
+# keys, and the version of an already compacted reference
+IGNORED_KEYS = REF_KEYS | CLIENT_KEYS
+
+_versions: Dict[str, Dict[str, Dict]] = {}
+_published = set()
+_lock = threading.Lock()
+
+
+def question_id_of(options) -> Optional[str]:
+    if isinstance(options, Mapping):
+        return options.get("question_id") or options.get("questionId")
+    return None
+
+
+def is_ref(options) -> bool:
+    return isinstance(options, Mapping) and REF_KEYS <= set(options) <= REF_KEYS | CLIENT_KEYS
+
+
+def _plain(value):
+    # The bot's templates are frozen (read-only mappings, tuples)
+    if isinstance(value, Mapping):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    return value
+
+
+def compact_options(options, registry_version: str, questions: Mapping):
+    """
+    Return a reference for options that match the registry's question
+    (with the client's keys, if any), otherwise the options unchanged.
+    """
+    question_id = question_id_of(options)
+    registered = questions.get(question_id) if question_id else None
+    if registered is None:
+        return options
+    for key, value in options.items():
+        if key not in IGNORED_KEYS and registered.get(key) != _plain(value):
+            return options
+    client = {key: _plain(value) for key, value in options.items() if key in CLIENT_KEYS}
+    return {"question_id": question_id, "registry_version": registry_version, **client}
+
+
+def publish_registry_version(session, registry_version: str, questions: Mapping):
+    """
+    Make sure registry_versions has this version's questions (once per process).
+    """
+    if registry_version in _published:
+        return
+    now = datetime.now(timezone.utc)
+    session.execute(
+        insert(RegistryVersion)
+        .values(version=registry_version, questions=dict(questions), created_at=now, updated_at=now)
+        .on_conflict_do_nothing(index_elements=[RegistryVersion.version])
+    )
+    with _lock:
+        _published.add(registry_version)
+        _versions.setdefault(registry_version, dict(questions))
+
+
+def _load_versions(session, versions):
+    rows = session.execute(
+        select(RegistryVersion.version, RegistryVersion.questions).where(RegistryVersion.version.in_(versions))
+    ).all()
+    with _lock:
+        for version, questions in rows:
+            _versions[version] = questions
+    for version in set(versions) - {version for version, _ in rows}:
+        logger.warning("Unknown registry version %s in message options", version)
+
+
+def hydrate_options(session, options_list: List) -> List:
+    """
+    Expand references into full options. Loads unseen registry versions in
+    one query; everything else is served from memory.
+    """
+    missing = {o["registry_version"] for o in options_list if is_ref(o) and o["registry_version"] not in _versions}
+    if missing:
+        _load_versions(session, missing)
+    out = []
+    for options in options_list:
+        if is_ref(options):
+            registered = _versions.get(options["registry_version"], {}).get(options["question_id"])
+            if registered is not None:
+                client = {key: value for key, value in options.items() if key in CLIENT_KEYS}
+                options = {**registered, **client, "question_id": options["question_id"]}
+        out.append(options)
+    return out
+
+
+def compact_existing(conn, batch_size: int = 1000) -> int:
+    """
+    Rewrite the options of existing messages as references, in batches that
+    each commit on their own (run on an autocommit connection).
+
+    Historical registry versions are not on disk anymore, so each version's
+    questions are rebuilt from the bot messages that carried them (the
+    newest per question); rows without bot_version are grouped as "legacy".
+    Returns the number of rows rewritten.
+    """
+    rows = conn.execute(text("""
+        SELECT DISTINCT ON (version, question_id)
+               COALESCE(bot_version, 'legacy') AS version, options->>'question_id' AS question_id, options
+        FROM messages
+        WHERE role = 'ASSISTANT' AND jsonb_typeof(options) = 'object' AND options ? 'question_id'
+              AND options - 'question_id' <> '{}'::jsonb
+        ORDER BY version, question_id, created_at DESC
+    """)).all()
+    registries: Dict[str, Dict[str, Dict]] = {}
+    for version, question_id, options in rows:
+        registries.setdefault(version, {})[question_id] = {k: v for k, v in options.items() if k != "question_id"}
+    now = datetime.now(timezone.utc)
+    for version, questions in registries.items():
+        conn.execute(
+            insert(RegistryVersion)
+            .values(version=version, questions=questions, created_at=now, updated_at=now)
+            .on_conflict_do_nothing(index_elements=[RegistryVersion.version])
+        )
+
+    total, last_id = 0, 0
+    while True:
+        batch = conn.execute(text("""
+            SELECT id, created_at, COALESCE(bot_version, 'legacy') AS version, options
+            FROM messages
+            WHERE id > :last_id AND jsonb_typeof(options) = 'object'
+                  AND (options ? 'question_id' OR options ? 'questionId')
+                  AND NOT options ? 'registry_version'
+            ORDER BY id
+            LIMIT :limit
+        """), {"last_id": last_id, "limit": batch_size}).all()
+        if not batch:
+            break
+        updates = []
+        for id_, created_at, version, options in batch:
+            compact = compact_options(options, version, registries.get(version, {}))
+            if compact is not options:
+                updates.append({"id": id_, "created_at": created_at, "options": compact})
+        if updates:
+            conn.execute(text("UPDATE messages SET options = CAST(:options AS jsonb) "
+                              "WHERE id = :id AND created_at = :created_at"),
+                         [{**u, "options": json.dumps(u["options"])} for u in updates])
+        total += len(updates)
+        last_id = batch[-1].id
+        logger.info("Compacted options of %d messages (%d so far)", len(updates), total)
+    return total
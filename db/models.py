@@ -6,16 +6,19 @@ from sqlalchemy import (
     Column,
     String,
     Integer,
+    BigInteger,
     Float,
     Boolean,
     Text,
     ForeignKey,
     DateTime,
     Enum as SQLAlchemyEnum,
+    LargeBinary,
     create_engine,
     Index,
+    text,
 )
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from sqlalchemy.orm import (
     DeclarativeBase,
     Mapped,
@@ -32,6 +35,22 @@ from sqlalchemy.orm import declarative_base
 Base = declarative_base()
 
 
+def live_index(name: str, *columns) -> Index:
+    """
+    A partial index over the rows that aren't soft-deleted, the only ones
+    crud reads by default (include_deleted_records). Columns are names or
+    text() for ordering, e.g. text('updated_at DESC').
+    """
+    return Index(name, *columns, postgresql_where=text('deleted_at IS NULL'))
+
+
+def deleted_index(table: str) -> Index:
+    """
+    The soft-deleted rows in (deleted_at, id) order, walked by db/retention.py.
+    """
+    return Index(f'{table}_deleted_at_index', 'deleted_at', 'id', postgresql_where=text('deleted_at IS NOT NULL'))
+
+
 class RoleEnum(str, Enum):
     USER = "user"
     ASSISTANT = "assistant"
@@ -67,6 +86,9 @@ class ResponseTypeEnum(str, Enum):
 
 class User(UserMixin, Base):
     __tablename__ = 'users'
+    __table_args__ = (
+        live_index('users_email_live_index', 'email'),
+    )
     
     # Identifiers
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
@@ -106,6 +128,10 @@ class User(UserMixin, Base):
     
 class Conversation(Base):
     __tablename__ = 'conversations'
+    __table_args__ = (
+        # get_user_conversations: a user's list, most recently updated first
+        live_index('conversations_user_id_updated_at_live_index', 'user_id', text('updated_at DESC')),
+    )
     
     # Identifiers
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
@@ -129,10 +155,26 @@ class Conversation(Base):
     Index('conversations_user_id_index', user_id)
 
 
+# Full-text search over what users wrote (crud.search_user_conversations).
+# An expression index rather than a stored tsvector column, which would
+# rewrite every partition to add; queries must repeat this expression.
+MESSAGE_SEARCH_CONFIG = 'english'
+MESSAGE_SEARCH_VECTOR = f"to_tsvector('{MESSAGE_SEARCH_CONFIG}', content)"
+
+
 class Message(Base):
     __tablename__ = 'messages'
-    
-    # Identifiers
+    # Monthly range partitions on created_at, see db/partitions.py
+    __table_args__ = (
+        Index('messages_content_search_index', text(MESSAGE_SEARCH_VECTOR), postgresql_using='gin',
+              postgresql_where=text("role = 'USER' AND deleted_at IS NULL")),
+        live_index('messages_conversation_id_created_at_live_index', 'conversation_id', 'created_at'),
+        live_index('messages_user_id_created_at_live_index', 'user_id', 'created_at'),
+        deleted_index('messages'),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
+    
+    # Identifiers (the partition key has to be part of the primary key)
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), nullable=False)
     conversation_id: Mapped[int] = mapped_column(Integer, ForeignKey('conversations.id'), nullable=False)
@@ -142,7 +184,7 @@ class Message(Base):
     content: Mapped[str] = mapped_column(String, nullable=False)
     role: Mapped[RoleEnum] = mapped_column(SQLAlchemyEnum(RoleEnum), nullable=False)
     response_type: Mapped[ResponseTypeEnum] = mapped_column(SQLAlchemyEnum(ResponseTypeEnum), nullable=False)
-    options: Mapped[dict] = mapped_column(JSONB, nullable=True)
+    options: Mapped[dict] = mapped_column(JSONB, nullable=True)  # question options are stored as a reference, see db/message_options.py
     tokens_prompt: Mapped[int] = mapped_column(Integer, nullable=True)
     tokens_completion: Mapped[int] = mapped_column(Integer, nullable=True)
     llm_model: Mapped[str] = mapped_column(String, nullable=True)
@@ -150,7 +192,7 @@ class Message(Base):
     bot_version: Mapped[str] = mapped_column(String, nullable=True)
     
     # Timestamps
-    created_at: Mapped[datetime] = mapped_column(default=lambda: datetime.now(timezone.utc))
+    created_at: Mapped[datetime] = mapped_column(primary_key=True, default=lambda: datetime.now(timezone.utc))
     updated_at: Mapped[datetime] = mapped_column(default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
     deleted_at: Mapped[datetime] = mapped_column(default=None, nullable=True)
     
@@ -164,6 +206,11 @@ class Message(Base):
 
 class AnalysisData(Base):
     __tablename__ = 'analysis_data'
+    __table_args__ = (
+        live_index('analysis_data_conversation_id_updated_at_live_index', 'conversation_id', text('updated_at DESC')),
+        live_index('analysis_data_user_id_updated_at_live_index', 'user_id', text('updated_at DESC')),
+        deleted_index('analysis_data'),
+    )
     
     # Identifiers
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
@@ -173,7 +220,8 @@ class AnalysisData(Base):
     
     # Data
     field: Mapped[str] = mapped_column(String, nullable=False)
-    content: Mapped[int] = mapped_column(String, nullable=True)
+    content: Mapped[str] = mapped_column(String, nullable=True)  # as sent by the client
+    value: Mapped[float] = mapped_column(Float, nullable=True)  # content parsed as a number, if it is one
     
     # Timestamps
     created_at: Mapped[datetime] = mapped_column(default=lambda: datetime.now(timezone.utc))
@@ -189,12 +237,108 @@ class AnalysisData(Base):
     Index('ratings_user_id_index', user_id)
     Index('ratings_conversation_id_index', conversation_id)
     # Index('ratings_message_id_index', message_id)
+
+
+# Rating questions with a column in conversation_ratings (the rate_* keys of
+# bot/bot_msgs.yml). A new question needs a column and a migration here.
+RATING_FIELDS = (
+    "rate_issue_neg",
+    "rate_issue_pos",
+    "rate_reap_1_success",
+    "rate_reap_1_care",
+    "rate_reap_1_believe",
+    "rate_reap_1_neg",
+    "rate_reap_1_pos",
+    "rate_reap_2_success",
+    "rate_reap_2_care",
+    "rate_reap_2_believe",
+    "rate_reap_2_neg",
+    "rate_reap_2_pos",
+)
+
+
+class ConversationRating(Base):
+    """
+    One row per conversation with every rating as a column, kept in step
+    with analysis_data by crud.create_analysis_data in the same transaction.
+    """
+    __tablename__ = 'conversation_ratings'
+    
+    # Identifiers
+    conversation_id: Mapped[int] = mapped_column(Integer, ForeignKey('conversations.id'), primary_key=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), nullable=False)
+    
+    # Data (NULL until answered)
+    rate_issue_neg: Mapped[float] = mapped_column(Float, nullable=True)
+    rate_issue_pos: Mapped[float] = mapped_column(Float, nullable=True)
+    rate_reap_1_success: Mapped[float] = mapped_column(Float, nullable=True)
+    rate_reap_1_care: Mapped[float] = mapped_column(Float, nullable=True)
+    rate_reap_1_believe: Mapped[float] = mapped_column(Float, nullable=True)
+    rate_reap_1_neg: Mapped[float] = mapped_column(Float, nullable=True)
+    rate_reap_1_pos: Mapped[float] = mapped_column(Float, nullable=True)
+    rate_reap_2_success: Mapped[float] = mapped_column(Float, nullable=True)
+    rate_reap_2_care: Mapped[float] = mapped_column(Float, nullable=True)
+    rate_reap_2_believe: Mapped[float] = mapped_column(Float, nullable=True)
+    rate_reap_2_neg: Mapped[float] = mapped_column(Float, nullable=True)
+    rate_reap_2_pos: Mapped[float] = mapped_column(Float, nullable=True)
+    # Every question answered so far, numeric or not: a non-numeric answer
+    # leaves its column NULL but still counts as answered
+    answered_fields: Mapped[list] = mapped_column(ARRAY(String), nullable=False, default=list,
+                                                  server_default=text("'{}'"))
+    
+    # What produced the reappraisals: the registry prompt behind the reappraisal
+    # and the model that served it (stamped when it is generated), and the bot
+    # version (stamped when the conversation completes)
+    reappraisal: Mapped[str] = mapped_column(String, nullable=True)
+    llm_model: Mapped[str] = mapped_column(String, nullable=True)
+    bot_version: Mapped[str] = mapped_column(String, nullable=True)
+    
+    # Timestamps
+    created_at: Mapped[datetime] = mapped_column(default=lambda: datetime.now(timezone.utc))
+    updated_at: Mapped[datetime] = mapped_column(default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    completed_at: Mapped[datetime] = mapped_column(default=None, nullable=True)  # counted in rating_aggregates
+    
+    # Relationships
+    conversation = relationship('Conversation', backref='rating_row')
+    user = relationship('User', backref='conversation_ratings')
+    
+    # Indexes
+    Index('conversation_ratings_user_id_index', user_id)
+
+    def answered(self) -> set:
+        answered = set(self.answered_fields or ())
+        return {f for f in RATING_FIELDS if f in answered or getattr(self, f) is not None}
     
     
     
     
+class RatingAggregate(Base):
+    """
+    Running count, sum and sum of squares of one rating metric over the
+    completed conversations of one (llm_model, bot_version, reappraisal), see db/analytics.py.
+    """
+    __tablename__ = 'rating_aggregates'
+    
+    # Identifiers
+    llm_model: Mapped[str] = mapped_column(String, primary_key=True)
+    bot_version: Mapped[str] = mapped_column(String, primary_key=True)
+    reappraisal: Mapped[str] = mapped_column(String, primary_key=True)
+    metric: Mapped[str] = mapped_column(String, primary_key=True)
+    
+    # Data
+    n: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    total: Mapped[float] = mapped_column(Float, nullable=False, default=0)
+    total_sq: Mapped[float] = mapped_column(Float, nullable=False, default=0)
+    
+    # Timestamps
+    updated_at: Mapped[datetime] = mapped_column(default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+
+
 class Donation(Base):
     __tablename__ = 'donations'
+    __table_args__ = (
+        live_index('donations_user_id_live_index', 'user_id'),
+    )
     
     # Identifiers
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
@@ -216,6 +360,9 @@ class Donation(Base):
     
 class Support(Base):
     __tablename__ = 'support'
+    __table_args__ = (
+        live_index('support_user_id_live_index', 'user_id'),
+    )
     
     # Identifiers
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
@@ -243,28 +390,98 @@ class Support(Base):
 
 class LLMQuery(Base):
     __tablename__ = 'llm_queries'
+    # Monthly range partitions on created_at, see db/partitions.py
+    __table_args__ = (
+        # get_llm_query_by_request_hash: the newest live query for a request
+        live_index('llm_queries_request_hash_created_at_live_index',
+                   'request_hash', text('created_at DESC'), text('id DESC')),
+        deleted_index('llm_queries'),
+        # db/retention.py: is a payload still referenced (also the FK check on delete)
+        Index('llm_queries_completion_payload_id_index', 'completion_payload_id'),
+        Index('llm_queries_request_payload_id_index', 'request_payload_id'),
+        # db/retention.py and db/export.py: a conversation's queries
+        Index('llm_queries_conversation_id_index', 'conversation_id'),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
     
     # Identifiers
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), nullable=True)
-    message_id: Mapped[int] = mapped_column(Integer, ForeignKey('messages.id'), nullable=True)
+    # No foreign key: adding one to the partitioned table validates every partition
+    conversation_id: Mapped[int] = mapped_column(Integer, nullable=True)
+    # No foreign key: messages is partitioned and its primary key is (id, created_at)
+    message_id: Mapped[int] = mapped_column(Integer, nullable=True)
     
     # Data
-    completion: Mapped[JSONB] = mapped_column(JSONB, nullable=False)
     tokens_prompt: Mapped[int] = mapped_column(Integer, nullable=True)
     tokens_completion: Mapped[int] = mapped_column(Integer, nullable=True)
     llm_model: Mapped[str] = mapped_column(String, nullable=True)
+    latency_ms: Mapped[float] = mapped_column(Float, nullable=True)
+    
+    # Request side, for record-and-replay
+    request_hash: Mapped[str] = mapped_column(String, nullable=True)  # sha256 of the request messages
+    
+    # Payloads live in llm_payloads; read them with crud.get_llm_query_completion()
+    # and get_llm_query_request_messages()
+    completion_payload_id: Mapped[int] = mapped_column(Integer, ForeignKey('llm_payloads.id'), nullable=True)
+    request_payload_id: Mapped[int] = mapped_column(Integer, ForeignKey('llm_payloads.id'), nullable=True)
+    # Inline payloads of rows from before llm_payloads (see db/payloads.py backfill)
+    completion: Mapped[JSONB] = mapped_column(JSONB, nullable=True)
+    request_messages: Mapped[JSONB] = mapped_column(JSONB, nullable=True)
     
     
     # Timestamps
-    created_at: Mapped[datetime] = mapped_column(default=lambda: datetime.now(timezone.utc))
+    created_at: Mapped[datetime] = mapped_column(primary_key=True, default=lambda: datetime.now(timezone.utc))
     updated_at: Mapped[datetime] = mapped_column(default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
     deleted_at: Mapped[datetime] = mapped_column(default=None, nullable=True)
     
     # Relationships
     user = relationship('User', backref='llm_queries')
-    message = relationship('Message', backref='llm_queries')
+    message = relationship('Message', primaryjoin='foreign(LLMQuery.message_id) == Message.id', backref='llm_queries')
+    completion_payload = relationship('LLMPayload', foreign_keys=[completion_payload_id])
+    request_payload = relationship('LLMPayload', foreign_keys=[request_payload_id])
     
     # Indexes
     Index('llm_queries_user_id_index', user_id)
-    Index('llm_queries_message_id_index', message_id)
\ No newline at end of file
+    Index('llm_queries_message_id_index', message_id)
+    Index('llm_queries_request_hash_index', request_hash)
+
+
+class LLMPayload(Base):
+    __tablename__ = 'llm_payloads'
+    
+    # Identifiers
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    content_hash: Mapped[str] = mapped_column(String, nullable=False, unique=True)  # sha256 of the canonical JSON
+    
+    # Data (zlib-compressed JSON, see db/payloads.py)
+    data: Mapped[bytes] = mapped_column(LargeBinary, nullable=True)  # NULL once archived
+    size_raw: Mapped[int] = mapped_column(Integer, nullable=False)
+    size_compressed: Mapped[int] = mapped_column(Integer, nullable=False)
+    archive_path: Mapped[str] = mapped_column(String, nullable=True)  # relative to LLM_PAYLOAD_ARCHIVE_DIR
+    archived_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    
+    # Timestamps
+    created_at: Mapped[datetime] = mapped_column(default=lambda: datetime.now(timezone.utc))
+    updated_at: Mapped[datetime] = mapped_column(default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    deleted_at: Mapped[datetime] = mapped_column(default=None, nullable=True)
+    
+    # Indexes
+    Index('llm_payloads_created_at_index', created_at)
+
+
+class RegistryVersion(Base):
+    __tablename__ = 'registry_versions'
+    
+    # Identifiers
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    version: Mapped[str] = mapped_column(String, nullable=False, unique=True)  # Registry.version of the bot
+    
+    # Data: {question_id: options} from bot_msgs.yml, referenced by compact
+    # Message.options (see db/message_options.py)
+    questions: Mapped[dict] = mapped_column(JSONB, nullable=False)
+    
+    # Timestamps
+    created_at: Mapped[datetime] = mapped_column(default=lambda: datetime.now(timezone.utc))
+    updated_at: Mapped[datetime] = mapped_column(default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    deleted_at: Mapped[datetime] = mapped_column(default=None, nullable=True)
@@ -0,0 +1,223 @@
+# db/partitions.py
+
+import argparse
+import re
+import threading
+import time
+from datetime import date, datetime, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+
+from db.db_session import get_engine
+from db.logger_setup import setup_logger
+
+'''
+Monthly range partitions for the tables that grow with traffic.
+
+messages and llm_queries are partitioned on created_at (see the
+b7e2c4d90002 migration). Each month lives in <table>_<YYYY>_<MM>; rows
+from before partitioning live in <table>_legacy. There is no default
+partition, so a month must exist before rows for it arrive:
+ensure_partitions() creates the current month and MONTHS_AHEAD more, and
+the bot runs it periodically (start_maintenance).
+
+New partitions are created as plain tables and then attached, which only
+takes a SHARE UPDATE EXCLUSIVE lock on the parent. Old months are detached
+CONCURRENTLY, so neither blocks reads or writes on the parent; the
+detached table can then be dumped and dropped at leisure.
+
+    python -m db.partitions list
+    python -m db.partitions ensure --months-ahead 3
+    python -m db.partitions detach messages messages_2025_01
+'''
+
+logger = setup_logger()
+
+PARTITIONED_TABLES = ("messages", "llm_queries")
+MONTHS_AHEAD = 3
+# Give up instead of queueing behind long transactions (and blocking
+# everything queued behind us); the next maintenance run retries
+LOCK_TIMEOUT = "5s"
+# Serializes partition creation across workers
+ADVISORY_LOCK_KEY = 7_345_001
+
+
+def month_start(d) -> date:
+    return date(d.year, d.month, 1)
+
+
+def add_months(d: date, months: int) -> date:
+    index = d.year * 12 + d.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_{month:%Y_%m}"
+
+
+def list_partitions(conn, table: str) -> List[Tuple[str, str]]:
+    """
+    (partition name, bound expression) for each partition of `table`.
+    """
+    rows = conn.execute(text("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = CAST(:table AS regclass)
+        ORDER BY c.relname
+    """), {"table": table})
+    return [(name, bound) for name, bound in rows]
+
+
+def _bound_date(value: str) -> Optional[date]:
+    # "MINVALUE" or "'2026-11-01 00:00:00'"
+    match = re.match(r"'(\d{4})-(\d{2})-(\d{2})", value)
+    return date(*map(int, match.groups())) if match else None
+
+
+def partition_ranges(conn, table: str) -> List[Tuple[Optional[date], Optional[date]]]:
+    """
+    [from, to) of each partition; None stands for MINVALUE / MAXVALUE.
+    """
+    ranges = []
+    for _, bound in list_partitions(conn, table):
+        match = re.search(r"FROM \((.*?)\) TO \((.*?)\)", bound or "")
+        if match:
+            ranges.append((_bound_date(match.group(1)), _bound_date(match.group(2))))
+    return ranges
+
+
+def create_partition(conn, table: str, month: date) -> bool:
+    """
+    Create and attach the partition of `table` for `month` unless an existing
+    partition (e.g. <table>_legacy) already covers it. Run inside a
+    transaction; returns whether a partition was created.
+    """
+    name = partition_name(table, month)
+    lo, hi = month.isoformat(), add_months(month, 1).isoformat()
+    for start, end in partition_ranges(conn, table):
+        if (start is None or start <= month) and (end is None or month < end):
+            return False
+    conn.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+    conn.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    # Lets ATTACH skip its validation scan (trivial here, the table is empty)
+    conn.execute(text(f"ALTER TABLE {name} ADD CONSTRAINT {name}_bounds "
+                      f"CHECK (created_at >= '{lo}' AND created_at < '{hi}')"))
+    conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ('{lo}') TO ('{hi}')"))
+    conn.execute(text(f"ALTER TABLE {name} DROP CONSTRAINT {name}_bounds"))
+    return True
+
+
+def ensure_partitions(engine=None, months_ahead: int = MONTHS_AHEAD, now: Optional[datetime] = None,
+                      tables=PARTITIONED_TABLES) -> List[str]:
+    """
+    Make sure partitions exist from the current month through `months_ahead`
+    months ahead. Returns the names of the partitions created.
+    """
+    engine = engine or get_engine()
+    first = month_start(now or datetime.now(timezone.utc))
+    created = []
+    for table in tables:
+        for offset in range(months_ahead + 1):
+            month = add_months(first, offset)
+            # One short transaction per partition keeps the parent lock brief
+            with engine.begin() as conn:
+                if not conn.execute(text("SELECT pg_try_advisory_xact_lock(:key)"),
+                                    {"key": ADVISORY_LOCK_KEY}).scalar():
+                    logger.info("Partition maintenance running elsewhere; skipping")
+                    return created
+                if create_partition(conn, table, month):
+                    created.append(partition_name(table, month))
+    if created:
+        logger.info("Created partitions: %s", ", ".join(created))
+    return created
+
+
+def detach_partition(table: str, name: str, engine=None):
+    """
+    Detach a partition without blocking the parent. The partition becomes a
+    standalone table for archival (pg_dump -t <name>) and DROP.
+    """
+    engine = engine or get_engine()
+    if not name.startswith(f"{table}_"):
+        raise ValueError(f"{name} is not a partition of {table}")
+    # DETACH ... CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f"SET lock_timeout = '{LOCK_TIMEOUT}'"))
+        conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name} CONCURRENTLY"))
+    logger.info("Detached partition %s from %s", name, table)
+
+
+def create_index_concurrently(conn, table: str, name: str, definition: str):
+    """
+    Build an index on a partitioned table without blocking writes: CREATE
+    INDEX CONCURRENTLY does not work on the parent, so the index is created
+    ON ONLY the parent (invalid), built concurrently on each partition and
+    attached, which makes it valid. `definition` is everything after the
+    table name, e.g. "(user_id, created_at) WHERE deleted_at IS NULL".
+    Run on an autocommit connection; safe to re-run after a failure.
+    """
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON ONLY {table} {definition}"))
+    for partition, _ in list_partitions(conn, table):
+        child = f"{partition}_{name[len(table) + 1:] if name.startswith(f'{table}_') else name}"
+        # A failed concurrent build leaves an invalid index behind; rebuild it
+        if conn.execute(text("SELECT 1 FROM pg_index WHERE indexrelid = to_regclass(:child) AND NOT indisvalid"),
+                        {"child": child}).first() is not None:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY {child}"))
+        conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {child} ON {partition} {definition}"))
+        attached = conn.execute(text("SELECT 1 FROM pg_inherits WHERE inhrelid = CAST(:child AS regclass)"),
+                                {"child": child}).first()
+        if attached is None:
+            conn.execute(text(f"ALTER INDEX {name} ATTACH PARTITION {child}"))
+
+
+def _maintain(interval: float, months_ahead: int):
+    while True:
+        try:
+            ensure_partitions(months_ahead=months_ahead)
+        except Exception:
+            logger.exception("Partition maintenance failed")
+        time.sleep(interval)
+
+
+_maintenance_thread: Optional[threading.Thread] = None
+
+
+def start_maintenance(interval: float, months_ahead: int = MONTHS_AHEAD):
+    """
+    Run ensure_partitions() now and every `interval` seconds in a daemon
+    thread (no-op if interval is 0 or it is running).
+    """
+    global _maintenance_thread
+    if interval <= 0 or _maintenance_thread is not None:
+        return
+    _maintenance_thread = threading.Thread(target=_maintain, args=(interval, months_ahead),
+                                           name="partition-maintenance", daemon=True)
+    _maintenance_thread.start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage monthly partitions of messages and llm_queries")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list")
+    ensure = sub.add_parser("ensure")
+    ensure.add_argument("--months-ahead", type=int, default=MONTHS_AHEAD)
+    detach = sub.add_parser("detach")
+    detach.add_argument("table", choices=PARTITIONED_TABLES)
+    detach.add_argument("partition")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        with get_engine().connect() as conn:
+            for table in PARTITIONED_TABLES:
+                for name, bound in list_partitions(conn, table):
+                    print(f"{table:12} {name:24} {bound}")
+    elif args.command == "ensure":
+        print("\n".join(ensure_partitions(months_ahead=args.months_ahead)) or "nothing to create")
+    else:
+        detach_partition(args.table, args.partition)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+# db/payloads.py
+
+import argparse
+import hashlib
+import json
+import os
+import zipfile
+import zlib
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import select, update
+
+from db.db_session import get_session
+from db.logger_setup import setup_logger
+from db.models import LLMPayload, LLMQuery
+
+'''
+Cold storage for LLM request and completion payloads.
+
+llm_queries rows stay slim (model, tokens, latency, message link, request
+hash). The completion and the request messages are stored once per
+distinct content in llm_payloads as zlib-compressed canonical JSON, keyed
+by sha256, so retried and replayed requests (and the long system prompts
+they repeat) are not stored twice. Completions are compacted first: ids,
+timestamps, fingerprints and null fields are dropped.
+
+After LLM_PAYLOAD_ARCHIVE_DAYS the compressed bytes move out of Postgres
+into zip files under LLM_PAYLOAD_ARCHIVE_DIR (one file per archive run,
+one member per content hash) and the row keeps only the file's path.
+crud.get_llm_query_completion() and get_llm_query_request_messages() read
+whichever tier holds a payload.
+
+    python -m db.payloads archive --older-than-days 30
+    python -m db.payloads backfill     # move pre-llm_payloads inline JSONB out of llm_queries
+'''
+
+logger = setup_logger()
+
+ARCHIVE_DIR = Path(os.getenv("LLM_PAYLOAD_ARCHIVE_DIR", "archive/llm_payloads"))
+ARCHIVE_AFTER_DAYS = int(os.getenv("LLM_PAYLOAD_ARCHIVE_DAYS", "30"))
+COMPRESSION_LEVEL = 6
+
+# Per-call noise in a chat completion; nothing reads these back
+COMPLETION_DROP_KEYS = ("id", "created", "object", "system_fingerprint", "service_tier")
+
+
+def _drop_nulls(obj):
+    if isinstance(obj, dict):
+        return {k: _drop_nulls(v) for k, v in obj.items() if v is not None}
+    if isinstance(obj, list):
+        return [_drop_nulls(v) for v in obj]
+    return obj
+
+
+def compact_completion(raw: Dict) -> Dict:
+    """
+    The parts of a completion worth keeping: model, choices and usage.
+    """
+    return _drop_nulls({k: v for k, v in (raw or {}).items() if k not in COMPLETION_DROP_KEYS})
+
+
+def encode(obj) -> Tuple[str, bytes, int]:
+    """
+    (sha256 of the canonical JSON, compressed bytes, uncompressed size).
+    """
+    raw = json.dumps(obj, sort_keys=True, separators=(",", ":"), default=str).encode()
+    return hashlib.sha256(raw).hexdigest(), zlib.compress(raw, COMPRESSION_LEVEL), len(raw)
+
+
+def decode(data: bytes):
+    return json.loads(zlib.decompress(data))
+
+
+@lru_cache(maxsize=8)
+def _open_archive(path: str) -> zipfile.ZipFile:
+    # Archive files are immutable once written, so open handles can be reused
+    return zipfile.ZipFile(ARCHIVE_DIR / path)
+
+
+def read_archived(path: str, content_hash: str) -> bytes:
+    return _open_archive(path).read(content_hash)
+
+
+def load(payload: Optional[LLMPayload]):
+    """
+    Rehydrate a payload from Postgres or, once archived, from its zip file.
+    """
+    if payload is None:
+        return None
+    if payload.data is not None:
+        return decode(payload.data)
+    return decode(read_archived(payload.archive_path, payload.content_hash))
+
+
+def archive(older_than_days: int = ARCHIVE_AFTER_DAYS, batch_size: int = 5000) -> int:
+    """
+    Move payloads older than `older_than_days` into a new zip file, in
+    batches. Rows are only updated after the file has been written and
+    synced. Returns the number of payloads archived.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+    ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    total, last_id = 0, 0
+    while True:
+        with get_session() as session:
+            rows = session.execute(
+                select(LLMPayload.id, LLMPayload.content_hash, LLMPayload.data)
+                .where(LLMPayload.id > last_id, LLMPayload.data.is_not(None), LLMPayload.created_at < cutoff)
+                .order_by(LLMPayload.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            name = f"llm_payloads-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{rows[0].id}-{rows[-1].id}.zip"
+            tmp = ARCHIVE_DIR / f"{name}.tmp"
+            # Already compressed: store the members as they are
+            with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_STORED) as zf:
+                for row in rows:
+                    zf.writestr(row.content_hash, row.data)
+            with open(tmp, "rb") as f:
+                os.fsync(f.fileno())
+            os.replace(tmp, ARCHIVE_DIR / name)
+
+            session.execute(
+                update(LLMPayload)
+                .where(LLMPayload.id.in_([row.id for row in rows]))
+                .values(data=None, archive_path=name, archived_at=datetime.now(timezone.utc),
+                        updated_at=datetime.now(timezone.utc))
+            )
+            session.commit()
+            total += len(rows)
+            last_id = rows[-1].id
+            logger.info("Archived %d payloads to %s", len(rows), name)
+    return total
+
+
+def backfill(batch_size: int = 1000) -> int:
+    """
+    Move the inline completion / request_messages JSONB of older llm_queries
+    rows into llm_payloads. Returns the number of rows moved.
+    """
+    from db.crud import get_or_create_llm_payload
+
+    total = 0
+    while True:
+        with get_session() as session:
+            rows = session.scalars(
+                select(LLMQuery)
+                .where((LLMQuery.completion.is_not(None)) | (LLMQuery.request_messages.is_not(None)))
+                .order_by(LLMQuery.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            for row in rows:
+                if row.completion is not None:
+                    row.completion_payload_id = get_or_create_llm_payload(
+                        session, compact_completion(row.completion)).id
+                if row.request_messages is not None:
+                    row.request_payload_id = get_or_create_llm_payload(session, row.request_messages).id
+                row.completion = None
+                row.request_messages = None
+            session.commit()
+            total += len(rows)
+            logger.info("Moved payloads of %d llm_queries rows (%d so far)", len(rows), total)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM payload cold storage")
+    sub = parser.add_subparsers(dest="command", required=True)
+    archive_parser = sub.add_parser("archive")
+    archive_parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS)
+    archive_parser.add_argument("--batch-size", type=int, default=5000)
+    backfill_parser = sub.add_parser("backfill")
+    backfill_parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.command == "archive":
+        print(f"Archived {archive(args.older_than_days, args.batch_size)} payloads")
+    else:
+        print(f"Moved payloads of {backfill(args.batch_size)} rows")
+
+
+if __name__ == "__main__":
+    main()
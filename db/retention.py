@@ -0,0 +1,379 @@
+# db/retention.py
+
+import argparse
+import gzip
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from db.db_session import get_engine
+from db.logger_setup import setup_logger
+from db.partitions import LOCK_TIMEOUT
+
+'''
+Retention: hard-delete (or archive, then delete) rows nobody reads anymore.
+
+  - ephemeral conversations inactive for RETENTION_EPHEMERAL_DAYS, and
+    soft-deleted conversations older than RETENTION_DELETED_DAYS, with
+    their messages, llm_queries (by llm_queries.conversation_id),
+    analysis_data and conversation_ratings
+  - soft-deleted messages (with the llm_queries of their turn), analysis_data
+    and llm_queries rows older than RETENTION_DELETED_DAYS
+  - llm_payloads no llm_queries row references anymore (they hold the
+    request messages, i.e. the conversation text). Payloads already moved
+    to a db.payloads zip file lose their row; the report lists how many
+    members of each zip file are orphaned that way, for whoever prunes
+    LLM_PAYLOAD_ARCHIVE_DIR.
+
+llm_queries rows written before the bot recorded conversation_id and
+message_id (migration f2c4e6a80012) belong to no conversation; only their
+own soft delete removes them.
+
+Rows go in small batches, each its own short transaction, walked in key
+order (conversation id; (deleted_at, id) through the *_deleted_at_index
+partial indexes; payload id) so no batch rescans what earlier ones
+removed. Between batches the job sleeps --pause seconds and, while any
+replica's replay lag exceeds --max-replica-lag, waits for it to catch up.
+
+With --archive-dir (or RETENTION_ARCHIVE_DIR) the deleted rows are first
+appended as JSON lines to <dir>/<table>-<run>.jsonl.gz, synced to disk
+before each batch commits.
+
+    python -m db.retention                              # report what would go
+    python -m db.retention --execute --archive-dir archive/retention
+
+The bot can also run it periodically (BOT_RETENTION_INTERVAL, default off);
+an advisory lock keeps runs from overlapping.
+'''
+
+logger = setup_logger()
+
+EPHEMERAL_DAYS = int(os.getenv("RETENTION_EPHEMERAL_DAYS", "7"))
+DELETED_DAYS = int(os.getenv("RETENTION_DELETED_DAYS", "30"))
+ARCHIVE_DIR = os.getenv("RETENTION_ARCHIVE_DIR")
+BATCH_SIZE = 500
+CONVERSATION_BATCH_SIZE = 50
+PAUSE_SECONDS = 0.2
+MAX_REPLICA_LAG_SECONDS = 5.0
+STATEMENT_TIMEOUT = "30s"
+ADVISORY_LOCK_KEY = 7_345_002
+
+# Soft-deleted rows purged on their own: (table, partitioned on created_at)
+SOFT_DELETED_TABLES = (("messages", True), ("analysis_data", False), ("llm_queries", True))
+# Every table the job deletes from; each appears in the report's row counts
+TABLES = ("conversations", "messages", "llm_queries", "llm_payloads", "analysis_data", "conversation_ratings")
+
+
+class Archive:
+    """
+    One gzip JSON-lines file per table for the run, synced per batch.
+    """
+
+    def __init__(self, directory: Optional[str], run: str):
+        self.directory = Path(directory) if directory else None
+        self.run = run
+        self._files = {}
+
+    def write(self, table: str, rows: List):
+        if self.directory is None or not rows:
+            return
+        f = self._files.get(table)
+        if f is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            raw = open(self.directory / f"{table}-{self.run}.jsonl.gz", "ab")
+            f = self._files[table] = gzip.GzipFile(fileobj=raw, mode="ab")
+        for row in rows:
+            f.write(json.dumps(row, default=str).encode() + b"\n")
+
+    def sync(self):
+        for f in self._files.values():
+            f.flush()
+            f.fileobj.flush()
+            os.fsync(f.fileobj.fileno())
+
+    def close(self):
+        for f in self._files.values():
+            raw = f.fileobj
+            f.close()
+            raw.close()
+        self._files = {}
+
+
+def replica_lag(conn) -> float:
+    """
+    Worst replay lag among streaming replicas, in seconds (0 without any).
+    """
+    lag = conn.execute(text("SELECT EXTRACT(EPOCH FROM max(replay_lag)) FROM pg_stat_replication")).scalar()
+    return float(lag or 0)
+
+
+class Throttle:
+    def __init__(self, pause: float, max_replica_lag: float):
+        self.pause = pause
+        self.max_replica_lag = max_replica_lag
+
+    def wait(self, conn):
+        time.sleep(self.pause)
+        while self.max_replica_lag > 0:
+            lag = replica_lag(conn)
+            conn.rollback()  # the next batch begins its own transaction
+            if lag <= self.max_replica_lag:
+                break
+            logger.info("Replica lag %.1fs above %.1fs; waiting", lag, self.max_replica_lag)
+            time.sleep(max(self.pause, 1.0))
+
+
+def _begin(conn):
+    tx = conn.begin()
+    conn.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+    conn.execute(text(f"SET LOCAL statement_timeout = '{STATEMENT_TIMEOUT}'"))
+    return tx
+
+
+def _count(counts: Dict, table: str, rows: int):
+    counts[table] = counts.get(table, 0) + rows
+
+
+def purge_conversations(conn, archive: Archive, throttle: Throttle, ephemeral_before: datetime,
+                        deleted_before: datetime, batch_size: int, execute: bool) -> Dict[str, int]:
+    """
+    Delete expired conversations and everything that hangs off them.
+    """
+    expired = """
+        FROM conversations
+        WHERE (ephemeral AND last_active_at < :ephemeral_before) OR deleted_at < :deleted_before
+    """
+    params = {"ephemeral_before": ephemeral_before, "deleted_before": deleted_before}
+    if not execute:
+        return {"conversations": conn.execute(text(f"SELECT count(*) {expired}"), params).scalar()}
+
+    counts, last_id = {}, 0
+    while True:
+        with _begin(conn) as tx:
+            ids = conn.execute(text(f"SELECT id {expired} AND id > :last_id ORDER BY id LIMIT :limit"),
+                               {**params, "last_id": last_id, "limit": batch_size}).scalars().all()
+            if not ids:
+                break
+            # Children first
+            for table, where in (
+                ("llm_queries", "conversation_id = ANY(:ids)"),
+                ("analysis_data", "conversation_id = ANY(:ids)"),
+                ("conversation_ratings", "conversation_id = ANY(:ids)"),
+                ("messages", "conversation_id = ANY(:ids)"),
+                ("conversations", "id = ANY(:ids)"),
+            ):
+                rows = conn.execute(text(f"DELETE FROM {table} t WHERE {where} RETURNING to_jsonb(t)"),
+                                    {"ids": ids}).scalars().all()
+                archive.write(table, rows)
+                _count(counts, table, len(rows))
+            archive.sync()
+            tx.commit()
+        last_id = ids[-1]
+        throttle.wait(conn)
+    return counts
+
+
+def purge_soft_deleted(conn, table: str, partitioned: bool, archive: Archive, throttle: Throttle,
+                       deleted_before: datetime, batch_size: int, execute: bool) -> Dict[str, int]:
+    """
+    Delete rows of `table` soft-deleted before `deleted_before` (and, for
+    messages, their llm_queries).
+    """
+    if not execute:
+        return {table: conn.execute(text(f"SELECT count(*) FROM {table} WHERE deleted_at < :before"),
+                                    {"before": deleted_before}).scalar()}
+
+    match = "t.id = b.id AND t.created_at = b.created_at" if partitioned else "t.id = b.id"
+    counts, last = {}, (datetime.min, 0)
+    while True:
+        with _begin(conn) as tx:
+            rows = conn.execute(text(f"""
+                WITH b AS (
+                    SELECT id{', created_at' if partitioned else ''} FROM {table}
+                    WHERE deleted_at < :before AND (deleted_at, id) > (:last_deleted_at, :last_id)
+                    ORDER BY deleted_at, id
+                    LIMIT :limit
+                )
+                DELETE FROM {table} t USING b WHERE {match}
+                RETURNING t.deleted_at, t.id, to_jsonb(t) AS row
+            """), {"before": deleted_before, "last_deleted_at": last[0], "last_id": last[1],
+                   "limit": batch_size}).all()
+            if not rows:
+                break
+            archive.write(table, [row.row for row in rows])
+            _count(counts, table, len(rows))
+            if table == "messages":
+                queries = conn.execute(text("DELETE FROM llm_queries t WHERE message_id = ANY(:ids) "
+                                            "RETURNING to_jsonb(t)"),
+                                       {"ids": [row.id for row in rows]}).scalars().all()
+                archive.write("llm_queries", queries)
+                _count(counts, "llm_queries", len(queries))
+            archive.sync()
+            tx.commit()
+        last = max((row.deleted_at, row.id) for row in rows)
+        throttle.wait(conn)
+    return counts
+
+
+def purge_orphan_payloads(conn, archive: Archive, throttle: Throttle, batch_size: int,
+                          execute: bool) -> Dict:
+    """
+    Delete llm_payloads rows that no llm_queries row references. Runs after
+    the other steps, so it picks up the payloads of the queries they
+    deleted (a dry run only counts payloads that are orphaned already).
+    Returns the row count and, per archive zip file, its orphaned members.
+    """
+    orphan = """
+        NOT EXISTS (SELECT 1 FROM llm_queries q WHERE q.completion_payload_id = p.id)
+        AND NOT EXISTS (SELECT 1 FROM llm_queries q WHERE q.request_payload_id = p.id)
+    """
+    if not execute:
+        rows = conn.execute(text(f"""
+            SELECT archive_path, count(*) AS n FROM llm_payloads p WHERE {orphan} GROUP BY archive_path
+        """)).all()
+        return {"llm_payloads": sum(row.n for row in rows),
+                "orphaned_archive_members": {row.archive_path: row.n for row in rows if row.archive_path}}
+
+    counts, members, last_id = {"llm_payloads": 0}, {}, 0
+    while True:
+        with _begin(conn) as tx:
+            last = conn.execute(text("SELECT max(id) FROM (SELECT id FROM llm_payloads WHERE id > :last_id "
+                                     "ORDER BY id LIMIT :limit) b"),
+                                {"last_id": last_id, "limit": batch_size}).scalar()
+            if last is None:
+                break
+            # SKIP LOCKED: a payload being reused (crud.get_or_create_llm_payload) is not orphaned
+            try:
+                rows = conn.execute(text(f"""
+                    WITH b AS (
+                        SELECT id FROM llm_payloads p
+                        WHERE id > :last_id AND id <= :last AND {orphan}
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    DELETE FROM llm_payloads t USING b WHERE t.id = b.id
+                    RETURNING t.archive_path, to_jsonb(t) AS row
+                """), {"last_id": last_id, "last": last}).all()
+            except IntegrityError:
+                # A query reusing one of them committed after our snapshot; next run
+                logger.info("Payloads %d-%d referenced again; skipped", last_id + 1, last)
+                tx.rollback()
+                last_id = last
+                continue
+            archive.write("llm_payloads", [row.row for row in rows])
+            _count(counts, "llm_payloads", len(rows))
+            for row in rows:
+                if row.archive_path is not None:
+                    _count(members, row.archive_path, 1)
+            archive.sync()
+            tx.commit()
+        last_id = last
+        if rows:
+            throttle.wait(conn)
+    if members:
+        logger.info("Orphaned payload archive members: %s", json.dumps(members))
+    return {**counts, "orphaned_archive_members": members}
+
+
+def run(execute: bool = False, ephemeral_days: int = EPHEMERAL_DAYS, deleted_days: int = DELETED_DAYS,
+        archive_dir: Optional[str] = ARCHIVE_DIR, batch_size: int = BATCH_SIZE,
+        conversation_batch_size: int = CONVERSATION_BATCH_SIZE, pause: float = PAUSE_SECONDS,
+        max_replica_lag: float = MAX_REPLICA_LAG_SECONDS, engine=None) -> Optional[Dict]:
+    """
+    One retention pass. Without `execute` only counts what would be deleted.
+    Returns a report of rows and seconds per step, or None if another run
+    holds the lock.
+    """
+    engine = engine or get_engine()
+    now = datetime.now(timezone.utc)
+    ephemeral_before = now - timedelta(days=ephemeral_days)
+    deleted_before = now - timedelta(days=deleted_days)
+    run_id = f"{now:%Y%m%dT%H%M%S}"
+    archive = Archive(archive_dir, run_id)
+    throttle = Throttle(pause, max_replica_lag)
+    report = {"run": run_id, "execute": execute, "steps": {}, "rows": dict.fromkeys(TABLES, 0)}
+
+    with engine.connect() as conn:
+        if not conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY}).scalar():
+            conn.commit()
+            logger.info("Retention running elsewhere; skipping")
+            return None
+        conn.commit()
+        try:
+            steps = [("conversations", lambda: purge_conversations(
+                conn, archive, throttle, ephemeral_before, deleted_before, conversation_batch_size, execute))]
+            steps += [(table, lambda table=table, partitioned=partitioned: purge_soft_deleted(
+                conn, table, partitioned, archive, throttle, deleted_before, batch_size, execute))
+                for table, partitioned in SOFT_DELETED_TABLES]
+            # Last: payloads of the llm_queries deleted above
+            steps.append(("llm_payloads", lambda: purge_orphan_payloads(conn, archive, throttle, batch_size, execute)))
+            for name, step in steps:
+                start = time.perf_counter()
+                counts = step()
+                if not execute:
+                    conn.rollback()
+                members = counts.pop("orphaned_archive_members", None)
+                if members is not None:
+                    report["orphaned_archive_members"] = members
+                report["steps"][name] = {"rows": counts, "seconds": round(time.perf_counter() - start, 3)}
+                for table, rows in counts.items():
+                    _count(report["rows"], table, rows)
+        finally:
+            archive.close()
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+            conn.commit()
+
+    logger.info("Retention %s: %s", "run" if execute else "dry run", json.dumps(report["steps"]))
+    return report
+
+
+def _retain(interval: float):
+    while True:
+        try:
+            run(execute=True)
+        except Exception:
+            logger.exception("Retention run failed")
+        time.sleep(interval)
+
+
+_retention_thread: Optional[threading.Thread] = None
+
+
+def start_retention(interval: float):
+    """
+    Run a retention pass every `interval` seconds in a daemon thread
+    (no-op if interval is 0 or it is running).
+    """
+    global _retention_thread
+    if interval <= 0 or _retention_thread is not None:
+        return
+    _retention_thread = threading.Thread(target=_retain, args=(interval,), name="retention", daemon=True)
+    _retention_thread.start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Delete expired ephemeral and soft-deleted rows")
+    parser.add_argument("--execute", action="store_true", help="delete (default: only count)")
+    parser.add_argument("--ephemeral-days", type=int, default=EPHEMERAL_DAYS)
+    parser.add_argument("--deleted-days", type=int, default=DELETED_DAYS)
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--conversation-batch-size", type=int, default=CONVERSATION_BATCH_SIZE)
+    parser.add_argument("--pause", type=float, default=PAUSE_SECONDS, help="seconds between batches")
+    parser.add_argument("--max-replica-lag", type=float, default=MAX_REPLICA_LAG_SECONDS,
+                        help="wait while a replica lags more than this many seconds (0 disables)")
+    args = parser.parse_args()
+
+    report = run(args.execute, args.ephemeral_days, args.deleted_days, args.archive_dir, args.batch_size,
+                 args.conversation_batch_size, args.pause, args.max_replica_lag)
+    print(json.dumps(report, indent=2) if report else "Retention running elsewhere")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+# db/stats.py
+
+import asyncio
+import functools
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+from db.logger_setup import setup_logger, setup_slow_query_logger
+
+logger = setup_logger()
+slow_query_logger = setup_slow_query_logger()
+
+# Statements slower than this go to logs/slow_queries.log (parameters redacted)
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+# The same statement this many times in one request is reported as an N+1 candidate
+N_PLUS_ONE_THRESHOLD = int(os.getenv("DB_N_PLUS_ONE_THRESHOLD", "3"))
+# Raise instead of logging when a query_budget() is exceeded (set in tests)
+ENFORCE_QUERY_BUDGETS = os.getenv("DB_ENFORCE_QUERY_BUDGETS", "").lower() in ("1", "true", "yes")
+
+
+class DBStats:
+    """
+    Process-wide counters for SQL statements and connection-pool checkouts.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.statements = 0
+            self.statement_time = 0.0
+            self.checkouts = 0
+            self.checkout_time = 0.0
+            self.checkout_waits = 0
+            self.checkout_wait_time = 0.0
+
+    def record_statement(self, elapsed: float):
+        with self._lock:
+            self.statements += 1
+            self.statement_time += elapsed
+
+    def record_checkout(self, elapsed: float, waited: bool):
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_time += elapsed
+            if waited:
+                self.checkout_waits += 1
+                self.checkout_wait_time += elapsed
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "statements": self.statements,
+                "statement_time": self.statement_time,
+                "checkouts": self.checkouts,
+                "checkout_time": self.checkout_time,
+                "checkout_waits": self.checkout_waits,
+                "checkout_wait_time": self.checkout_wait_time,
+            }
+
+
+stats = DBStats()
+
+# Called with (elapsed, waited) after every pool checkout, e.g. to feed
+# the Prometheus histogram in telemetry/metrics.py
+checkout_observers: List[Callable[[float, bool], None]] = []
+# Called with the elapsed time after every SQL statement, e.g. to add it to
+# the current turn's Server-Timing breakdown (telemetry/timing.py)
+statement_observers: List[Callable[[float], None]] = []
+# Called with the read replica's lag in seconds whenever db_session checks
+# it, e.g. to set the Prometheus gauge in telemetry/metrics.py
+replica_lag_observers: List[Callable[[float], None]] = []
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool that records how long each checkout took and whether it had
+    to wait for a connection because the pool and its overflow were exhausted.
+    """
+    def _do_get(self):
+        waited = self.checkedin() == 0 and self._max_overflow > -1 and self.overflow() >= self._max_overflow
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            elapsed = time.perf_counter() - start
+            stats.record_checkout(elapsed, waited)
+            for observer in checkout_observers:
+                observer(elapsed, waited)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """
+    Raised by query_budget() in test mode.
+    """
+
+
+class QueryTracker:
+    """
+    Statements issued during one request or turn, by statement text.
+    Statements are parameterized, so the same text with different
+    parameters (one query per row) counts as a repeat.
+    """
+    def __init__(self, label: str):
+        self.label = label
+        self.statements = 0
+        self.statement_time = 0.0
+        self.by_statement: Counter = Counter()
+
+    def record(self, statement: str, elapsed: float):
+        self.statements += 1
+        self.statement_time += elapsed
+        self.by_statement[statement] += 1
+
+    def repeated(self, threshold: int = None) -> List[Tuple[str, int]]:
+        """
+        Statements executed at least `threshold` times (N+1 candidates).
+        """
+        threshold = threshold or N_PLUS_ONE_THRESHOLD
+        return [(stmt, n) for stmt, n in self.by_statement.most_common() if n >= threshold]
+
+    def report(self):
+        for stmt, n in self.repeated():
+            logger.warning(f"Possible N+1 in {self.label}: {n}x {_one_line(stmt)[:300]}")
+
+
+_trackers: ContextVar[Tuple[QueryTracker, ...]] = ContextVar("query_trackers", default=())
+
+
+def start_tracking(label: str):
+    """
+    Start counting statements for the current request; returns (tracker, token)
+    for stop_tracking(). Trackers nest: a statement counts for every open one.
+    """
+    tracker = QueryTracker(label)
+    return tracker, _trackers.set(_trackers.get() + (tracker,))
+
+
+def stop_tracking(tracker: QueryTracker, token, report: bool = True):
+    _trackers.reset(token)
+    if report:
+        tracker.report()
+
+
+@contextmanager
+def track_queries(label: str, report: bool = True):
+    tracker, token = start_tracking(label)
+    try:
+        yield tracker
+    finally:
+        stop_tracking(tracker, token, report)
+
+
+def current_tracker() -> Optional[QueryTracker]:
+    trackers = _trackers.get()
+    return trackers[-1] if trackers else None
+
+
+def query_budget(max_statements: int):
+    """
+    Declare how many SQL statements a view or function may issue.
+    Exceeding it logs a warning, or raises QueryBudgetExceeded when
+    DB_ENFORCE_QUERY_BUDGETS is set (e.g. in tests).
+
+        @chat_bp.route('/get_messages')
+        @query_budget(3)
+        @login_required
+        def get_messages_route(): ...
+    """
+    def check(fn, tracker):
+        if tracker.statements <= max_statements:
+            return
+        repeated = tracker.repeated(2)
+        detail = f"; repeated: {repeated[0][1]}x {_one_line(repeated[0][0])[:200]}" if repeated else ""
+        msg = f"{fn.__qualname__} issued {tracker.statements} SQL statements (budget {max_statements}){detail}"
+        if ENFORCE_QUERY_BUDGETS:
+            raise QueryBudgetExceeded(msg)
+        logger.warning(msg)
+
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with track_queries(fn.__qualname__, report=False) as tracker:
+                    result = await fn(*args, **kwargs)
+                check(fn, tracker)
+                return result
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with track_queries(fn.__qualname__, report=False) as tracker:
+                result = fn(*args, **kwargs)
+            check(fn, tracker)
+            return result
+        return wrapper
+    return decorator
+
+
+def _one_line(statement: str) -> str:
+    return " ".join(statement.split())
+
+
+def _redact(parameters):
+    """
+    Keep the shape of bind parameters but not their values, which can
+    contain user messages.
+    """
+    if isinstance(parameters, dict):
+        return {k: type(v).__name__ for k, v in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return f"[{len(parameters)} parameter sets]"
+        return [type(v).__name__ for v in parameters]
+    return type(parameters).__name__
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._stats_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._stats_start
+    stats.record_statement(elapsed)
+    for tracker in _trackers.get():
+        tracker.record(statement, elapsed)
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        trackers = _trackers.get()
+        label = trackers[0].label if trackers else "-"
+        slow_query_logger.warning(f"{elapsed * 1000:.1f} ms [{label}] {_one_line(statement)} "
+                                  f"params={_redact(parameters)}")
+    for observer in statement_observers:
+        observer(elapsed)
+
+
+def install(engine):
+    """
+    Attach the statement counters to an engine.
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
@@ -0,0 +1,79 @@
+import math
+
+import numpy as np
+import pytest
+
+from db import analytics
+from db.models import RATING_FIELDS
+
+NAN = float("nan")
+
+
+def _columns(**answered):
+    """
+    Rating columns of a few conversations, unanswered unless given.
+    """
+    n = len(next(iter(answered.values())))
+    return {field: np.array(answered.get(field, [NAN] * n), dtype=float) for field in RATING_FIELDS}
+
+
+def _by_key(rows):
+    return {(row["llm_model"], row["bot_version"], row["reappraisal"], row["metric"]): row for row in rows}
+
+
+def test_aggregate_groups_by_model_version_and_reappraisal():
+    columns = _columns(rate_issue_neg=[80, 60, 70, 50], rate_reap_1_neg=[50, NAN, 40, 45])
+    rows = _by_key(analytics.aggregate(
+        columns,
+        llm_models=["gpt", "gpt", "gpt", "fake/gpt"],
+        bot_versions=["v1", "v1", "v1", "v1"],
+        reappraisals=["general_reappraise", "general_reappraise", "general_reappraise", "unknown"],
+    ))
+
+    issue = rows[("gpt", "v1", "general_reappraise", "rate_issue_neg")]
+    assert (issue["n"], issue["total"], issue["total_sq"]) == (3, 210.0, 80**2 + 60**2 + 70**2)
+    # The delta counts only conversations that answered both ratings
+    delta = rows[("gpt", "v1", "general_reappraise", "delta_reap_1_neg")]
+    assert (delta["n"], delta["total"], delta["total_sq"]) == (2, -60.0, 30**2 + 30**2)
+    assert rows[("fake/gpt", "v1", "unknown", "delta_reap_1_neg")]["total"] == -5.0
+    # Nothing for metrics nobody answered
+    assert not any(metric == "rate_issue_pos" for *_, metric in rows)
+    assert len(rows) == 6
+
+
+def test_aggregate_of_nothing():
+    assert analytics.aggregate(_columns(rate_issue_neg=[]), [], [], []) == []
+
+
+def test_aggregate_matches_record_completion():
+    # The recompute and the per-conversation path agree on every metric
+    ratings = [
+        {"rate_issue_neg": 80.0, "rate_reap_1_neg": 50.0, "rate_reap_2_neg": 30.0},
+        {"rate_issue_neg": 60.0, "rate_issue_pos": 10.0, "rate_reap_2_pos": 40.0},
+    ]
+    columns = {field: np.array([r.get(field, NAN) for r in ratings]) for field in RATING_FIELDS}
+    rows = {row["metric"]: row for row in analytics.aggregate(columns, ["m"] * 2, ["v"] * 2, ["r"] * 2)}
+
+    expected = {}
+    for r in ratings:
+        for metric, value in analytics.metric_values(r).items():
+            n, total, total_sq = expected.get(metric, (0, 0.0, 0.0))
+            expected[metric] = (n + 1, total + value, total_sq + value * value)
+    assert {metric: (row["n"], row["total"], row["total_sq"]) for metric, row in rows.items()} == expected
+
+
+def test_summarize_breaks_down_by_each_key():
+    rows = [
+        {"llm_model": "gpt", "bot_version": "v1", "reappraisal": "a", "metric": "rate_issue_neg",
+         "n": 2, "total": 100.0, "total_sq": 5200.0},
+        {"llm_model": "gpt", "bot_version": "v1", "reappraisal": "b", "metric": "rate_issue_neg",
+         "n": 1, "total": 20.0, "total_sq": 400.0},
+    ]
+    summary = analytics.summarize(rows)
+    assert summary["overall"]["rate_issue_neg"]["n"] == 3
+    assert summary["overall"]["rate_issue_neg"]["mean"] == pytest.approx(40.0)
+    assert summary["by"]["llm_model"]["gpt"]["rate_issue_neg"]["n"] == 3
+    assert summary["by"]["reappraisal"]["a"]["rate_issue_neg"]["sd"] == pytest.approx(math.sqrt(200.0))
+    assert summary["by"]["reappraisal"]["b"]["rate_issue_neg"]["sd"] is None
+    assert [(g["reappraisal"], g["metrics"]["rate_issue_neg"]["mean"]) for g in summary["groups"]] == \
+        [("a", 50.0), ("b", 20.0)]
@@ -0,0 +1,148 @@
+import time
+from unittest.mock import Mock
+
+import pytest
+from sqlalchemy.orm import Session
+
+from db import cache
+
+
+class DictRedis:
+    """
+    The part of the redis client API db/cache.py uses, over a dict.
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, nx=False, px=None):
+        if nx and key in self.data:
+            return False
+        self.data[key] = value.encode() if isinstance(value, str) else value
+        return True
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+
+class Loader:
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+@pytest.fixture
+def shared(monkeypatch):
+    """
+    Cache on, a fresh local tier, a connected listener and a dict shared tier.
+    """
+    client = DictRedis()
+    monkeypatch.setattr(cache, "TTL_SECONDS", 60.0)
+    monkeypatch.setattr(cache, "_local", cache.LocalCache(100, 60.0))
+    monkeypatch.setattr(cache, "_redis", client)
+    monkeypatch.setattr(cache, "_ensure_listener", lambda: None)
+    cache._listening.set()
+    yield client
+    cache._listening.clear()
+
+
+def test_local_entries_expire():
+    local = cache.LocalCache(10, 0.05)
+    local.set("k", {"v": 1}, local.generation)
+    assert local.get("k")[1] == {"v": 1}
+    time.sleep(0.1)
+    assert local.get("k") is None
+
+
+def test_local_evicts_least_recently_used():
+    local = cache.LocalCache(2, 60)
+    local.set("a", 1, local.generation)
+    local.set("b", 2, local.generation)
+    local.get("a")
+    local.set("c", 3, local.generation)
+    assert local.get("b") is None
+    assert local.get("a")[1] == 1 and local.get("c")[1] == 3
+
+
+def test_local_drops_loads_that_raced_an_eviction():
+    local = cache.LocalCache(10, 60)
+    generation = local.generation
+    local.evict(["k"])
+    local.set("k", "read before the eviction", generation)
+    assert local.get("k") is None
+
+
+def test_disabled_cache_always_loads(monkeypatch):
+    monkeypatch.setattr(cache, "TTL_SECONDS", 0.0)
+    loader = Loader({"v": 1})
+    cache.get_or_load("k", loader)
+    cache.get_or_load("k", loader)
+    assert loader.calls == 2
+
+
+def test_lookups_are_served_from_the_cache(shared):
+    loader = Loader({"v": 1})
+    assert cache.get_or_load("k", loader) == {"v": 1}
+    assert cache.get_or_load("k", loader) == {"v": 1}
+    assert loader.calls == 1
+    assert shared.get(cache.KEY_PREFIX + "k") == b'{"v": 1}'
+
+
+def test_uncached_lookups_skip_both_tiers(shared):
+    cache.get_or_load("k", Loader({"v": "stale"}))
+    loader = Loader({"v": "fresh"})
+    assert cache.get_or_load("k", loader, cached=False) == {"v": "fresh"}
+    assert loader.calls == 1
+
+
+def test_without_the_listener_only_the_shared_tier_is_used(shared):
+    cache._listening.clear()
+    cache.get_or_load("k", Loader({"v": 1}))
+    assert cache._local.get("k") is None
+    loader = Loader({"v": 2})
+    assert cache.get_or_load("k", loader) == {"v": 1}
+    assert loader.calls == 0
+
+
+def _session():
+    # A write in progress, without a database: pg_notify statements are only recorded
+    session = Session()
+    session.execute = Mock()
+    session.begin()
+    return session
+
+
+def test_commit_invalidates_both_tiers(shared):
+    cache.get_or_load("k", Loader({"v": 1}))
+    cache.get_or_load("other", Loader({"v": 1}))
+
+    session = _session()
+    cache.invalidate(session, "k")
+    assert cache.get_or_load("k", Loader({"v": 2})) == {"v": 1}
+    session.commit()
+
+    (stmt, params), _ = session.execute.call_args
+    assert "pg_notify" in str(stmt) and params == {"channel": cache.CHANNEL, "payload": "k"}
+    assert cache._local.get("k") is None and shared.get(cache.KEY_PREFIX + "k") is None
+    assert cache.get_or_load("k", Loader({"v": 2})) == {"v": 2}
+    assert cache._local.get("other")[1] == {"v": 1}
+
+
+def test_rollback_keeps_cached_values(shared):
+    cache.get_or_load("k", Loader({"v": 1}))
+
+    session = _session()
+    cache.invalidate(session, "k")
+    session.rollback()
+    session.commit()
+
+    session.execute.assert_not_called()
+    assert cache.get_or_load("k", Loader({"v": 2})) == {"v": 1}
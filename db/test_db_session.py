@@ -0,0 +1,67 @@
+import pytest
+
+from db import db_session
+
+
+@pytest.mark.parametrize("lsn, position", [
+    ("16/B374D848", (0x16 << 32) + 0xB374D848),
+    ("0/0", 0),
+    (None, None),
+    ("", None),
+    ("16B374D848", None),
+    ("16/xyz", None),
+    ("wrote", None),
+])
+def test_parse_lsn(lsn, position):
+    assert db_session.parse_lsn(lsn) == position
+
+
+@pytest.fixture
+def replica(monkeypatch):
+    """
+    A configured replica whose (replay position, lag) is replica.status.
+    """
+    class Replica:
+        status = (db_session.parse_lsn("1/100"), 0.0)
+
+    def replica_status():
+        if isinstance(Replica.status, Exception):
+            raise Replica.status
+        return Replica.status
+
+    monkeypatch.setattr(db_session, "get_replica_engine", lambda: object())
+    monkeypatch.setattr(db_session, "replica_status", replica_status)
+    monkeypatch.setattr(db_session, "REPLICA_MAX_LAG", 10.0)
+    return Replica
+
+
+def test_no_replica_configured(monkeypatch):
+    monkeypatch.setattr(db_session, "get_replica_engine", lambda: None)
+    assert not db_session._use_replica(None)
+
+
+@pytest.mark.parametrize("min_lsn", [None, "", "not-an-lsn", "wrote"])
+def test_missing_or_invalid_lsn_reads_the_replica(replica, min_lsn):
+    assert db_session._use_replica(min_lsn)
+
+
+@pytest.mark.parametrize("min_lsn, expected", [("1/FF", True), ("1/100", True), ("1/101", False), ("2/0", False)])
+def test_replica_must_have_replayed_the_clients_write(replica, min_lsn, expected):
+    assert db_session._use_replica(min_lsn) is expected
+
+
+def test_lagging_replica_falls_back_to_the_primary(replica):
+    replica.status = (db_session.parse_lsn("1/100"), 10.5)
+    assert not db_session._use_replica(None)
+    replica.status = (db_session.parse_lsn("1/100"), 10.0)
+    assert db_session._use_replica(None)
+
+
+def test_non_standby_counts_as_caught_up(replica):
+    replica.status = (None, 0.0)
+    assert db_session._use_replica("FF/0")
+
+
+def test_unreachable_replica_falls_back_to_the_primary(replica):
+    replica.status = ConnectionError("replica down")
+    assert not db_session._use_replica("1/0")
@@ -0,0 +1,42 @@
+from datetime import datetime
+
+import pyarrow.parquet as pq
+
+from db import export
+from db.crud import create_conversation, create_llm_query, create_message
+from db.db_session import get_session
+from db.models import ConvoStateEnum, ResponseTypeEnum, RoleEnum, User
+
+
+def test_query_columns_match_the_schemas():
+    until = datetime.now()
+    for query, schema in ((export.messages_query(0, until), export.MESSAGE_SCHEMA),
+                          (export.conversations_query(None, until), export.CONVERSATION_SCHEMA)):
+        assert [c.name for c in query.selected_columns] == schema.names
+
+
+def test_conversation_llm_usage_is_exported(pg_engine, user_id, tmp_path, monkeypatch):
+    # Export rows as soon as they are committed
+    monkeypatch.setattr(export, "SETTLE_SECONDS", 0)
+    with get_session() as session:
+        session.get(User, user_id).research_consent = True
+        convo = create_conversation(session, user_id)
+        session.flush()
+        msg = create_message(session, user_id, convo.id, "hello", ConvoStateEnum.ISSUE_INTERVIEW, RoleEnum.USER,
+                             ResponseTypeEnum.TEXT)
+        session.flush()
+        for tokens_prompt, tokens_completion in ((100, 20), (150, 30)):
+            create_llm_query(session, user_id, {"model": "test", "choices": []}, message_id=msg.id,
+                             conversation_id=convo.id, tokens_prompt=tokens_prompt,
+                             tokens_completion=tokens_completion, latency_ms=5.0)
+        session.commit()
+        convo_id, msg_id = convo.id, msg.id
+
+    export.export(tmp_path, full=True)
+
+    conversation = next(row for row in pq.read_table(tmp_path / "conversations").to_pylist()
+                        if row["id"] == convo_id)
+    assert (conversation["llm_queries"], conversation["llm_tokens_prompt"],
+            conversation["llm_tokens_completion"]) == (2, 250, 50)
+    message = next(row for row in pq.read_table(tmp_path / "messages").to_pylist() if row["id"] == msg_id)
+    assert (message["llm_queries"], message["llm_tokens_prompt"]) == (2, 250)
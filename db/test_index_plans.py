@@ -0,0 +1,104 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+from db import crud
+from db.db_session import get_session
+from db.partitions import PARTITIONED_TABLES
+
+'''
+EXPLAIN-plan assertions for the hot reads in db/crud.py: each query must
+be able to use its partial "live rows" index (see the b8e0a2c40008
+migration). The real crud functions run against the scratch database at
+TEST_DATABASE_URI (db/conftest.py), but every SELECT is replaced by its
+EXPLAIN.
+
+Sequential scans are disabled for the session, so on a small or empty
+database the planner still reports which index it *can* use; a missing
+index or a predicate that does not match shows up as a failure.
+'''
+
+
+class _NoRows:
+    def scalars(self):
+        return self
+
+    def all(self):
+        return []
+
+    def scalar_one_or_none(self):
+        return None
+
+    def first(self):
+        return None
+
+
+class ExplainSession:
+    """
+    Stands in for a Session: records the plan of each statement executed
+    instead of running it.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.plans = []
+
+    def execute(self, stmt, *args, **kwargs):
+        sql = str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+        plan = self.session.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+        self.plans.append(plan if isinstance(plan, list) else json.loads(plan))
+        return _NoRows()
+
+
+def _index_names(node):
+    names = {node["Index Name"]} if "Index Name" in node else set()
+    for child in node.get("Plans", ()):
+        names |= _index_names(child)
+    return names
+
+
+RECENT = datetime.now(timezone.utc) - timedelta(days=7)
+
+CHECKS = [
+    ("get_user_by_email", lambda s: crud.get_user_by_email(s, "someone@example.com"),
+     "users_email_live_index"),
+    ("get_user_conversations", lambda s: crud.get_user_conversations(s, 1),
+     "conversations_user_id_updated_at_live_index"),
+    ("get_conversation_messages", lambda s: crud.get_conversation_messages(s, 1, since=RECENT),
+     "messages_conversation_id_created_at_live_index"),
+    ("get_user_messages", lambda s: crud.get_user_messages(s, 1, since=RECENT),
+     "messages_user_id_created_at_live_index"),
+    ("get_user_donations", lambda s: crud.get_user_donations(s, 1),
+     "donations_user_id_live_index"),
+    ("get_user_support_queries", lambda s: crud.get_user_support_queries(s, 1),
+     "support_user_id_live_index"),
+    ("get_conversation_analysis_data", lambda s: crud.get_conversation_analysis_data(s, 1),
+     "analysis_data_conversation_id_updated_at_live_index"),
+    ("get_user_analysis_data", lambda s: crud.get_user_analysis_data(s, 1),
+     "analysis_data_user_id_updated_at_live_index"),
+    ("get_llm_query_by_request_hash", lambda s: crud.get_llm_query_by_request_hash(s, "0" * 64, since=RECENT),
+     "llm_queries_request_hash_created_at_live_index"),
+]
+
+
+@pytest.fixture(scope="module")
+def explain_session(pg_engine):
+    with get_session() as session:
+        session.execute(text("SET enable_seqscan = off"))
+        session.execute(text("ANALYZE"))
+        yield session
+        session.rollback()
+
+
+@pytest.mark.parametrize("call, index", [check[1:] for check in CHECKS], ids=[check[0] for check in CHECKS])
+def test_hot_reads_use_their_live_index(explain_session, call, index):
+    explain = ExplainSession(explain_session)
+    call(explain)
+    # Partition indexes are named <partition>_<suffix of the parent index>
+    table = next((t for t in PARTITIONED_TABLES if index.startswith(f"{t}_")), None)
+    suffix = index[len(table):] if table else index
+    used = set().union(*(_index_names(plan[0]["Plan"]) for plan in explain.plans))
+    assert any(u == index or u.endswith(suffix) for u in used), f"used: {sorted(used)}"
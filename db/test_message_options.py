@@ -0,0 +1,69 @@
+from types import MappingProxyType
+
+import pytest
+
+from db import message_options
+from db.message_options import compact_options, hydrate_options, is_ref
+
+VERSION = "0123456789ab"
+QUESTIONS = {
+    "rate_issue_neg": {"min": 0, "max": 100, "step": 1, "labels": ["Not at all", "Extremely"]},
+}
+
+
+class _NoVersions:
+    def execute(self, stmt):
+        return self
+
+    def all(self):
+        return []
+
+
+@pytest.fixture(autouse=True)
+def published(monkeypatch):
+    # As if publish_registry_version had run in this process
+    monkeypatch.setitem(message_options._versions, VERSION, QUESTIONS)
+
+
+def _round_trip(options):
+    stored = compact_options(options, VERSION, QUESTIONS)
+    return stored, hydrate_options(None, [stored])[0]
+
+
+def test_bot_question_round_trip():
+    # The bot's templates are frozen
+    options = MappingProxyType({"min": 0, "max": 100, "step": 1, "labels": ("Not at all", "Extremely"),
+                                "question_id": "rate_issue_neg"})
+    stored, hydrated = _round_trip(options)
+    assert stored == {"question_id": "rate_issue_neg", "registry_version": VERSION}
+    assert hydrated == {**QUESTIONS["rate_issue_neg"], "question_id": "rate_issue_neg"}
+
+
+def test_user_reply_round_trip():
+    # What the slider sends back: no labels, the client's own keys
+    options = {"min": 0, "max": 100, "step": 1, "defaultValue": None, "questionId": "rate_issue_neg"}
+    stored, hydrated = _round_trip(options)
+    assert is_ref(stored)
+    assert stored == {"question_id": "rate_issue_neg", "registry_version": VERSION,
+                      "questionId": "rate_issue_neg", "defaultValue": None}
+    assert hydrated.items() >= options.items()
+    assert hydrated["labels"] == QUESTIONS["rate_issue_neg"]["labels"]
+    assert hydrated["question_id"] == "rate_issue_neg"
+
+
+@pytest.mark.parametrize("options", [
+    {"min": 0, "max": 10, "question_id": "rate_issue_neg"},
+    {"min": 0, "question_id": "not_in_the_registry"},
+    {"free": "form"},
+    [],
+    None,
+])
+def test_other_options_are_stored_as_they_are(options):
+    stored, hydrated = _round_trip(options)
+    assert stored is options and hydrated is options
+    assert not is_ref(options)
+
+
+def test_unknown_version_stays_a_reference():
+    ref = {"question_id": "rate_issue_neg", "registry_version": "ffffffffffff"}
+    assert hydrate_options(_NoVersions(), [ref]) == [ref]
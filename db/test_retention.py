@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select
+
+from bot.bot_flow import BotIssueInterview
+from bot.llm import FakeProvider, get_provider, set_provider
+from db import retention
+from db.crud import create_conversation, create_message
+from db.db_session import get_session
+from db.models import Conversation, ConvoStateEnum, LLMPayload, LLMQuery, ResponseTypeEnum, RoleEnum
+
+
+def _conversation_with_query(user_id, text):
+    """
+    A conversation with one user message and the LLM query of its turn,
+    recorded the way the bot records it. Returns (conversation id, query id).
+    """
+    with get_session() as session:
+        convo = create_conversation(session, user_id)
+        session.flush()
+        msg = create_message(session, user_id, convo.id, text, ConvoStateEnum.ISSUE_INTERVIEW, RoleEnum.USER,
+                             ResponseTypeEnum.TEXT)
+        session.commit()
+        convo_id, msg_id = convo.id, msg.id
+
+    step = BotIssueInterview(convo_id, user_id)
+    step.message_id = msg_id
+    output = step._query_llm("You are a test.", [{"role": "user", "content": text}])
+    return convo_id, output["llm_query_id"]
+
+
+def _payload_ids(session, query_id):
+    query = session.execute(select(LLMQuery).where(LLMQuery.id == query_id)).scalar_one()
+    return query.completion_payload_id, query.request_payload_id
+
+
+def test_purging_a_conversation_removes_its_queries_and_payloads(pg_engine, user_id):
+    previous = get_provider()
+    set_provider(FakeProvider(seed=1, latency_dist="constant", latency_ms=0, prompts={}))
+    try:
+        purged, purged_query = _conversation_with_query(user_id, f"purge me {datetime.now().isoformat()}")
+        kept, kept_query = _conversation_with_query(user_id, f"keep me {datetime.now().isoformat()}")
+    finally:
+        set_provider(previous)
+
+    with get_session() as session:
+        query = session.execute(select(LLMQuery).where(LLMQuery.id == purged_query)).scalar_one()
+        assert query.conversation_id == purged and query.message_id is not None
+        purged_payloads = _payload_ids(session, purged_query)
+        kept_payloads = _payload_ids(session, kept_query)
+        session.get(Conversation, purged).deleted_at = datetime.now(timezone.utc) - timedelta(days=60)
+        session.commit()
+
+    report = retention.run(execute=True, deleted_days=30, pause=0, max_replica_lag=0, engine=pg_engine)
+    assert report["rows"]["llm_queries"] >= 1 and report["rows"]["llm_payloads"] >= 2
+
+    with get_session() as session:
+        queries = session.execute(select(LLMQuery.id).where(LLMQuery.conversation_id.in_([purged, kept])))
+        assert set(queries.scalars()) == {kept_query}
+        payloads = session.execute(select(LLMPayload.id).where(LLMPayload.id.in_(purged_payloads + kept_payloads)))
+        assert set(payloads.scalars()) == set(kept_payloads)
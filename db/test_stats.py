@@ -0,0 +1,92 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from db import stats
+
+
+def _run(*statements):
+    tracker = stats.current_tracker()
+    for statement in statements:
+        tracker.record(statement, 0.001)
+
+
+def test_repeated_uses_the_threshold(monkeypatch):
+    monkeypatch.setattr(stats, "N_PLUS_ONE_THRESHOLD", 3)
+    tracker = stats.QueryTracker("test")
+    for statement in ["SELECT a"] * 4 + ["SELECT b"] * 2 + ["SELECT c"]:
+        tracker.record(statement, 0.001)
+    assert tracker.repeated() == [("SELECT a", 4)]
+    assert tracker.repeated(2) == [("SELECT a", 4), ("SELECT b", 2)]
+    assert tracker.statements == 7 and tracker.statement_time == pytest.approx(0.007)
+
+
+def test_within_budget(monkeypatch):
+    monkeypatch.setattr(stats, "ENFORCE_QUERY_BUDGETS", True)
+
+    @stats.query_budget(2)
+    def view():
+        _run("SELECT a", "SELECT b")
+        return "ok"
+
+    assert view() == "ok"
+    assert view.__name__ == "view"
+    assert stats.current_tracker() is None
+
+
+def test_over_budget_raises_when_enforced(monkeypatch):
+    monkeypatch.setattr(stats, "ENFORCE_QUERY_BUDGETS", True)
+
+    @stats.query_budget(2)
+    def view():
+        _run("SELECT a", "SELECT   b\n WHERE id = %(id)s", "SELECT   b\n WHERE id = %(id)s")
+
+    with pytest.raises(stats.QueryBudgetExceeded, match=r"issued 3 SQL statements \(budget 2\); "
+                                                        r"repeated: 2x SELECT b WHERE id"):
+        view()
+
+
+def test_over_budget_only_warns_by_default(monkeypatch):
+    monkeypatch.setattr(stats, "ENFORCE_QUERY_BUDGETS", False)
+
+    @stats.query_budget(1)
+    def view():
+        _run("SELECT a", "SELECT b")
+        return "ok"
+
+    assert view() == "ok"
+
+
+def test_async_budget(monkeypatch):
+    monkeypatch.setattr(stats, "ENFORCE_QUERY_BUDGETS", True)
+
+    @stats.query_budget(1)
+    async def handler(n):
+        await asyncio.sleep(0)
+        _run(*["SELECT a"] * n)
+        return n
+
+    assert asyncio.run(handler(1)) == 1
+    with pytest.raises(stats.QueryBudgetExceeded):
+        asyncio.run(handler(2))
+
+
+def test_statements_count_for_every_open_tracker(monkeypatch):
+    monkeypatch.setattr(stats, "ENFORCE_QUERY_BUDGETS", True)
+
+    def execute(statement):
+        # What the engine's cursor hooks see for one statement
+        context = SimpleNamespace()
+        stats._before_cursor_execute(None, None, statement, {}, context, False)
+        stats._after_cursor_execute(None, None, statement, {}, context, False)
+
+    @stats.query_budget(2)
+    def view():
+        execute("SELECT a")
+        execute("SELECT b")
+
+    with stats.track_queries("request", report=False) as request:
+        view()
+        execute("SELECT c")
+    assert request.statements == 3
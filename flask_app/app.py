@@ -1,13 +1,18 @@
 
 from dotenv import load_dotenv
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response
 from werkzeug.exceptions import HTTPException
 from flask_app.logger_setup import setup_logger
 from werkzeug.middleware.proxy_fix import ProxyFix
 
 # Import extensions
-from flask_app.extensions import init_extensions, login_manager, db
+from flask_app.extensions import init_extensions, login_manager
 from flask_app.config import CurrentConfig
+from flask_app.utils import remember_write
+from telemetry import log, metrics, profiling, timing, tracing
+import uuid
+from db import analytics, stats as db_stats
+import time
 
 def create_app(config=CurrentConfig):
     # Load environment variables
@@ -16,9 +21,13 @@ def create_app(config=CurrentConfig):
     # Create and configure the Flask app
     app = Flask(__name__)
     app.config.from_object(config)
+    missing = [key for key in ('SECRET_KEY', 'SQLALCHEMY_DATABASE_URI') if not app.config.get(key)]
+    if missing:
+        raise RuntimeError(f"Missing required settings: {', '.join(missing)}")
     # app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
     # Initialize logger
+    log.set_service('gateway')
     logger = setup_logger()
     app.logger = logger
 
@@ -37,17 +46,128 @@ def create_app(config=CurrentConfig):
     app.register_blueprint(support_bp, url_prefix='/api/support')
     
     # User loader
+    from db import cache
     from db.db_session import get_session
     from db.crud import get_user_by_id
+    from db.models import User
     @login_manager.user_loader
     def load_user(user_id):
-        with get_session() as session:
-            return get_user_by_id(session, user_id)
+        # Routes only use current_user's id and email; both are cached
+        def load():
+            with get_session() as session:
+                user = get_user_by_id(session, user_id)
+                return {'id': user.id, 'email': user.email} if user else None
+        fields = cache.get_or_load(cache.user_key(user_id), load)
+        return User(**fields) if fields else None
         
     # Health Check
     @app.route('/health', methods=['GET'])
     def health():
         return {'status': 'healthy'}, 200
+
+    # Metrics (aggregated across gunicorn workers, see telemetry/metrics.py)
+    metrics.install_db_hooks()
+
+    @app.route('/metrics', methods=['GET'])
+    def get_metrics():
+        body, content_type = metrics.render_latest()
+        return Response(body, content_type=content_type)
+
+    timing.install_db_hooks()
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+        # Server-Timing breakdown, see telemetry/timing.py and blueprints/chat.py
+        g.turn_timing, g.turn_timing_token = timing.start('gateway')
+        # Correlates this request's log lines with the bot's (X-Turn-Id)
+        g.turn_id = uuid.uuid4().hex[:16]
+        g.log_token = log.bind(turn_id=g.turn_id)
+        # SQL statements per request; repeats are logged as N+1 candidates
+        rule = request.url_rule.rule if request.url_rule else 'unmatched'
+        g.query_tracker, g.query_tracker_token = db_stats.start_tracking(f"{request.method} {rule}")
+
+    @app.after_request
+    def record_request_metrics(response):
+        start = g.get('request_start')
+        if start is not None:
+            # Label by route template, not the raw path, to bound cardinality
+            endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+            metrics.observe_request('gateway', request.method, endpoint, response.status_code,
+                                    time.perf_counter() - start)
+        return response
+
+    # Read-your-writes for endpoints served from the read replica
+    @app.after_request
+    def pin_reads_after_write(response):
+        try:
+            return remember_write(response)
+        except Exception:
+            app.logger.exception('Could not read the primary WAL position')
+            return response
+
+    # Tracing (see telemetry/tracing.py; off unless an exporter is configured)
+    tracing.init_tracing('gateway')
+
+    @app.before_request
+    def start_trace():
+        name = f"{request.method} {request.url_rule.rule if request.url_rule else 'unmatched'}"
+        g.trace_span, g.trace_token = tracing.start_server_span(name, request.headers)
+
+    @app.after_request
+    def add_trace_header(response):
+        g.trace_status = response.status_code
+        trace_id = tracing.current_trace_id()
+        if trace_id:
+            response.headers['X-Trace-Id'] = trace_id
+        return response
+
+    @app.teardown_request
+    def end_request_timer(error=None):
+        token = g.pop('turn_timing_token', None)
+        if token is not None:
+            timing.stop(token)
+        token = g.pop('log_token', None)
+        if token is not None:
+            log.unbind(token)
+        token = g.pop('query_tracker_token', None)
+        if token is not None:
+            db_stats.stop_tracking(g.pop('query_tracker'), token)
+
+    # Opt-in sampling profiler (see telemetry/profiling.py)
+    @app.before_request
+    def start_profiler():
+        token = request.headers.get(profiling.PROFILE_HEADER)
+        if token:
+            g.profiler = profiling.profile_request('gateway', f"{request.method} {request.path}", token)
+
+    @app.after_request
+    def stop_profiler(response):
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            response.headers[profiling.OUTPUT_HEADER] = str(profiler.stop())
+        return response
+
+    @app.route('/admin/profile', methods=['POST'])
+    def admin_profile():
+        if not profiling.authorized(request.headers.get(profiling.PROFILE_HEADER)):
+            return {'error': 'Forbidden'}, 403
+        profiler = profiling.start_profiler('gateway', 'window', seconds=request.args.get('seconds', 10, type=float))
+        if profiler is None:
+            return {'error': 'A profile is already running'}, 409
+        return {'profile': str(profiler.path), 'seconds': profiler.max_seconds}, 202
+
+    @app.route('/admin/analytics', methods=['GET'])
+    def admin_analytics():
+        if not profiling.authorized(request.headers.get('X-Admin-Token')):
+            return {'error': 'Forbidden'}, 403
+        return analytics.cached_summary(), 200
+
+    @app.teardown_request
+    def end_trace(error=None):
+        span = g.pop('trace_span', None)
+        if span is not None:
+            tracing.end_server_span(span, g.pop('trace_token'), g.get('trace_status'), error)
     
     # Log all requests
     # @app.before_request
@@ -75,8 +195,8 @@ def create_app(config=CurrentConfig):
         logger.exception(f"Unhandled Exception at {request.method} {request.url}")
         return {'error': 'Internal server error'}, 500
     
-    # Create all tables
-    with app.app_context():
-        db.create_all()
-
+    # Tables are managed by the migrations (flask db upgrade); no DDL here.
+    # `flask bootstrap-db` sets up an empty database, see flask_app/cli.py
+    from flask_app.cli import register_cli
+    register_cli(app)
     return app
\ No newline at end of file
@@ -1,6 +1,6 @@
 # flask_app/blueprints/chat.py
 
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, Response, g
 from flask_login import login_required, current_user
 from db.crud import (
     get_user_conversations, 
@@ -8,33 +8,88 @@ from db.crud import (
     get_conversation_by_id,
     create_conversation,
     create_message,
-    soft_delete_conversation
+    soft_delete_conversation,
+    search_user_conversations
     )
+from db import cache
 from db.db_session import get_session
+from flask_app.utils import read_session, recent_write
+from db.message_options import hydrate_options
+from db.stats import query_budget
 from db.models import RoleEnum, ResponseTypeEnum, ConvoStateEnum
 import requests
-import asyncio
-import aiohttp
+import json
+import time
+import base64
+from telemetry import profiling, timing, tracing
+from telemetry.log import truncated
 
 chat_bp = Blueprint('chat', __name__)
+
+def post_to_bot(path, payload):
+    """
+    POST to the bot service, propagating the trace context and recording
+    the round trip and the bot's Server-Timing entries for this request.
+    """
+    headers = tracing.inject_headers(timing.request_start_header())
+    if timing.debug_requested(request.headers):
+        headers[timing.DEBUG_HEADER] = '1'
+    if 'turn_id' in g:
+        headers['X-Turn-Id'] = g.turn_id
+    if g.get('profiler') is not None:
+        # Profile the bot's side of a profiled request too
+        headers[profiling.PROFILE_HEADER] = request.headers[profiling.PROFILE_HEADER]
+    start = time.perf_counter()
+    with tracing.span(f'bot POST {path}', kind=tracing.SpanKind.CLIENT):
+        response = requests.post(current_app.config['BOT_SERVICE_URL'] + path, json=payload, headers=headers)
+    g.bot_roundtrip_ms = (time.perf_counter() - start) * 1000
+    g.bot_timing = timing.parse_server_timing(response.headers.get('Server-Timing'))
+    return response
+
+@chat_bp.after_request
+def add_server_timing(response):
+    """
+    Report the turn's latency breakdown on responses that called the bot.
+    """
+    turn = g.get('turn_timing')
+    if turn is None or 'bot_roundtrip_ms' not in g:
+        return response
+    entries = timing.gateway_entries(turn, g.bot_roundtrip_ms, g.bot_timing)
+    response.headers['Server-Timing'] = timing.format_server_timing(entries)
+    if timing.debug_requested(request.headers) and response.is_json:
+        body = response.get_json()
+        if isinstance(body, dict):
+            body.setdefault('timing', {})
+            body['timing'] = {'bot': body['timing'], 'gateway': {
+                'total_ms': round(turn.total_ms(), 3),
+                'bot_roundtrip_ms': round(g.bot_roundtrip_ms, 3),
+                'db_ms': round(turn.db_ms, 3),
+                'db_statements': turn.db_statements,
+            }}
+            response.set_data(json.dumps(body))
+    return response
+
 def send_message_to_bot(data):
-    url = current_app.config['BOT_SERVICE_URL'] + '/send_message'
-    current_app.logger.debug(f"Sending message to bot at {url} with data: {data}")
+    """
+    Forward a user message to the bot service.
+    Returns the raw JSON body of the bot's response, or None on failure.
+    """
+    current_app.logger.debug("Sending message to bot with data: %s", truncated(data))
     try:
-        response = requests.post(url, json=data)
+        response = post_to_bot('/send_message', data)
         response.raise_for_status()
-        return response.json()
+        return response.content
     except requests.RequestException as e:
         current_app.logger.error(f'Error sending message to bot')
         current_app.logger.exception(e)
-        return {'error': 'Bot service error'}
+        return None
 
 @chat_bp.route('/send_message', methods=['POST'])
 @login_required
 def send_message_route():
     current_app.logger.debug(f'Entered /send_message endpoint with user: {current_user.email}')
     data = request.get_json()
-    current_app.logger.debug(f'/send_message received data: {data}')
+    current_app.logger.debug('/send_message received data: %s', truncated(data))
 
     # Extract data from request
     convo_id = data.get('conversation_id')
@@ -53,8 +108,11 @@ def send_message_route():
             'response_type': response_type,
             'options': options
         })
-        current_app.logger.debug(f"/send_message returning: {bot_response}")
-        return jsonify(bot_response), 201
+        if bot_response is None:
+            return jsonify({'error': 'Bot service error'}), 201
+        current_app.logger.debug("/send_message returning: %s", truncated(bot_response))
+        # Relay the bot's body as-is instead of parsing and re-serializing it
+        return Response(bot_response, status=201, mimetype='application/json')
     except Exception as e:
         current_app.logger.error(f'Error in /send_message')
         current_app.logger.exception(e)
@@ -67,13 +125,12 @@ def send_message_route():
 @login_required
 def new_chat_route():
     current_app.logger.debug(f'Entered /new_chat endpoint with user: {current_user.email}')
-    url = current_app.config['BOT_SERVICE_URL'] + '/new_chat'
     # TODO: DO I NEED TO PASS ANY AUTHENTICATION HERE?
     payload = {
         'user_id': current_user.id,
     }
     try:
-        resp = requests.post(url, json=payload)
+        resp = post_to_bot('/new_chat', payload)
         return jsonify(resp.json()), 200
     except Exception as e:
         current_app.logger.error(f'Error in /new_chat')
@@ -109,32 +166,42 @@ def delete_conversation_route(conversation_id):
             return jsonify({'error': 'Internal server error'}), 500
     
     
+def load_messages(convo_id):
+    with read_session() as session:
+        msgs = get_conversation_messages(session=session, conversation_id=convo_id)
+        # Question options are stored as registry references; expand them
+        options = hydrate_options(session, [msg.options for msg in msgs])
+        msgs_out = []
+        for msg, msg_options in zip(msgs, options):
+            msgs_out.append({
+                'msg_id': msg.id,
+                'convo_id': msg.conversation_id,
+                'content': msg.content,
+                'role': msg.role,
+                'response_type': msg.response_type,
+                'options': msg_options,
+                'bot_version': msg.bot_version,
+            })
+        return msgs_out
+
+
 @chat_bp.route('/get_messages', methods=['GET'])
+@query_budget(3)
 @login_required
 def get_messages_route():
     current_app.logger.debug(f'Entered /get_messages endpoint with user: {current_user.email}')
     convo_id = request.args.get('conversation_id', type=int)
+    if convo_id is None:
+        return jsonify([]), 200
 
-    with get_session() as session:
-        try:
-            msgs = get_conversation_messages(session=session, conversation_id=convo_id)
-            msgs_out = []
-            for msg in msgs:
-                msgs_out.append({
-                    'msg_id': msg.id,
-                    'convo_id': msg.conversation_id,
-                    'content': msg.content,
-                    'role': msg.role,
-                    'response_type': msg.response_type,
-                    'options': msg.options,
-                    'bot_version': msg.bot_version,
-                })
-            return jsonify(msgs_out), 200
-        except Exception as e:
-            current_app.logger.error(f'Error in /get_messages')
-            current_app.logger.exception(e)
-            session.rollback()
-            return jsonify({'error': 'Internal server error'}), 500
+    try:
+        msgs_out = cache.get_or_load(cache.messages_key(convo_id), lambda: load_messages(convo_id),
+                                     cached=not recent_write())
+        return jsonify(msgs_out), 200
+    except Exception as e:
+        current_app.logger.error(f'Error in /get_messages')
+        current_app.logger.exception(e)
+        return jsonify({'error': 'Internal server error'}), 500
         
         
 @chat_bp.route('/get_conversation', methods=['GET'])
@@ -142,7 +209,7 @@ def get_messages_route():
 def get_conversation_route():
     current_app.logger.debug(f'Entered /get_conversation endpoint with user: {current_user.email}')
     convo_id = request.args.get('conversation_id', type=int)
-    with get_session() as session:
+    with read_session() as session:
         try:
             convo = get_conversation_by_id(session=session, conversation_id=convo_id)
             current_app.logger.debug(f'/get_conversation returning: {convo}')
@@ -161,39 +228,91 @@ def get_conversation_route():
             return jsonify({'error': 'Internal server error'}), 500
 
 
+def load_conversations(user_id):
+    with read_session() as session:
+        convos = get_user_conversations(session=session, user_id=user_id)
+        convo_out = []
+        for convo in convos:
+            
+            # Skip ephemeral conversations
+            if convo.ephemeral is True:
+                continue
+            
+            # Make a label if it doesn't exist
+            if convo.oneline_summary is None:
+                msgs = get_conversation_messages(session=session, conversation_id=convo.id)
+                user_msgs = [msg for msg in msgs if msg.role == RoleEnum.USER]
+                label = user_msgs[0].content[:20] if user_msgs else 'No messages'
+            else:
+                label = convo.oneline_summary
+            
+            convo_out.append({
+                'id': convo.id,
+                'label': label,
+            })
+        return convo_out
+
+
 @chat_bp.route('/get_conversations', methods=['GET'])
+@query_budget(3)
 @login_required
 def get_conversations_route():
     current_app.logger.debug(f'Entered /get_conversations endpoint with user: {current_user.email}')
+    try:
+        convo_out = cache.get_or_load(cache.conversations_key(current_user.id),
+                                      lambda: load_conversations(current_user.id), cached=not recent_write())
+        return jsonify(convo_out), 200
+    except Exception as e:
+        current_app.logger.error(f'Error in /get_conversations')
+        current_app.logger.exception(e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+def encode_search_cursor(rank, convo_id):
+    return base64.urlsafe_b64encode(json.dumps([rank, convo_id]).encode()).decode()
+
+
+def decode_search_cursor(cursor):
+    try:
+        rank, convo_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(rank), int(convo_id)
+    except (ValueError, TypeError):
+        return None
+
+
+@chat_bp.route('/search', methods=['GET'])
+@query_budget(2)
+@login_required
+def search_route():
+    current_app.logger.debug(f'Entered /search endpoint with user: {current_user.email}')
+    query = (request.args.get('q') or '').strip()
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 50)
+    cursor = request.args.get('cursor')
+    after = decode_search_cursor(cursor) if cursor else None
+    if not query:
+        return jsonify({'error': 'Missing search query'}), 400
+    if cursor and after is None:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
     with get_session() as session:
         try:
-            convos = get_user_conversations(session=session, user_id=current_user.id)
-            convo_out = []
-            for convo in convos:
-                
-                # Skip ephemeral conversations
-                if convo.ephemeral is True:
-                    continue
-                
-                # Make a label if it doesn't exist
-                if convo.oneline_summary is None:
-                    msgs = get_conversation_messages(session=session, conversation_id=convo.id)
-                    user_msgs = [msg for msg in msgs if msg.role == RoleEnum.USER]
-                    label = user_msgs[0].content[:20] if user_msgs else 'No messages'
-                else:
-                    label = convo.oneline_summary
-                
-                convo_out.append({
-                    'id': convo.id,
-                    'label': label,
-                })
-            return jsonify(convo_out), 200
+            hits = search_user_conversations(session=session, user_id=current_user.id, query=query,
+                                             limit=limit, after=after)
+            results = [{
+                'convo_id': hit.conversation_id,
+                'label': hit.oneline_summary,
+                'last_active_at': hit.last_active_at,
+                'rank': hit.rank,
+                'snippet': hit.snippet,
+            } for hit in hits]
+            next_cursor = encode_search_cursor(hits[-1].rank, hits[-1].conversation_id) if len(hits) == limit else None
+            return jsonify({'results': results, 'next_cursor': next_cursor}), 200
         except Exception as e:
-            current_app.logger.error(f'Error in /get_conversations')
+            current_app.logger.error(f'Error in /search')
             current_app.logger.exception(e)
             session.rollback()
             return jsonify({'error': 'Internal server error'}), 500
 
+
 # @chat_bp.route('/label_issue', methods=['POST'])
 # @login_required
 # def label_issue_route():
@@ -205,7 +324,8 @@ def get_conversations_route():
 #         'convo_id': convo_id,
 #     }
 #     try:
-#         resp = requests.post(url, json=payload)
+#         with tracing.span('bot POST /label_issue', kind=tracing.SpanKind.CLIENT):
+#             resp = requests.post(url, json=payload, headers=tracing.inject_headers())
 #         resp_json = resp.json()
 #         current_app.logger.debug(f"Received response from bot service: {resp_json}")
 #     except Exception as e:
@@ -1,4 +1,3 @@
-import praw
 from flask import Blueprint, request, current_app, redirect, url_for
 import uuid
 import requests
@@ -15,6 +14,7 @@ def test():
 
 @reddit_bp.route('/login', methods=['GET'])
 def reddit_login():
+    import praw  # imported on use: slow to import and rarely needed
     reddit = praw.Reddit(
         client_id=current_app.config['REDDIT_CLIENT_ID'],
         client_secret=current_app.config['REDDIT_CLIENT_SECRET'],
@@ -3,7 +3,6 @@
 from flask import Blueprint, request, jsonify, current_app
 
 import requests
-import mailtrap as mt
 from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_required, current_user
 from db.crud import (
@@ -79,6 +78,7 @@ def submit_feedback():
         if is_urgent:
             subject = f"URGENT: {subject}"
 
+        import mailtrap as mt  # imported on use: slow to import and rarely needed
         mail = mt.Mail(
             sender=mt.Address(email="support@emapingbot.com", name="Support request"),
             to=[mt.Address(email=current_app.config['MAIL_SUPPORT_RECIPIENT'])],
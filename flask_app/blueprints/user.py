@@ -5,6 +5,8 @@ from db.crud import (
     update_user
 )
 from db.db_session import get_session
+from flask_app.utils import read_session
+from telemetry.log import truncated
 
 user_bp = Blueprint('user', __name__)
 
@@ -17,7 +19,7 @@ def update_user_route():
     """
     data = request.json
     current_app.logger.debug(f'Entered /update_user endpoint with user: {current_user.email}')
-    current_app.logger.debug(f'/update_user received data: {data}')
+    current_app.logger.debug('/update_user received data: %s', truncated(data))
     
     if not data:
         return jsonify({'error': 'No data provided'}), 400
@@ -59,7 +61,7 @@ def get_user_data():
       }
     """
     current_app.logger.debug(f'Entered /get_user_data endpoint with user: {current_user.email}')
-    with get_session() as session:
+    with read_session() as session:
         user = get_user_by_id(session, current_user.id)
         if not user:
             return jsonify({'error': 'User not found'}), 404
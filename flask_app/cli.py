@@ -0,0 +1,40 @@
+# flask_app/cli.py
+
+import click
+from flask import Flask
+from flask_migrate import stamp, upgrade
+from sqlalchemy import inspect
+
+from db.db_session import get_engine, init_db
+
+'''
+Database commands for the gateway's `flask` CLI:
+
+    flask --app flask_app.run:app bootstrap-db
+
+The gateway image runs bootstrap-db before starting gunicorn.
+'''
+
+
+@click.command('bootstrap-db')
+def bootstrap_db():
+    """
+    Bring the database to the latest schema. An empty database gets the
+    tables from the models and is stamped at the head revision (the
+    migrations only alter an existing schema); any other is upgraded.
+    """
+    tables = set(inspect(get_engine()).get_table_names())
+    if 'alembic_version' in tables:
+        upgrade()
+    elif tables:
+        raise click.ClickException(
+            "The database has tables but no alembic_version; "
+            "stamp the revision they match (flask db stamp <revision>) first.")
+    else:
+        click.echo("Empty database: creating the tables and stamping head")
+        init_db()
+        stamp()
+
+
+def register_cli(app: Flask):
+    app.cli.add_command(bootstrap_db)
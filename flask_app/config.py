@@ -7,29 +7,31 @@ load_dotenv()
 class BaseConfig:
     
 
-    SECRET_KEY = os.environ['SECRET_KEY']
+    # Read with getenv so importing the app does not require every variable;
+    # create_app() checks the ones it cannot run without.
+    SECRET_KEY = os.getenv('SECRET_KEY')
     WTF_CSRF_ENABLED = True
     
     NEW_USER_OTP_EXPIRY_MIN = 60
     
     MAIL_SERVER = 'live.smtp.mailtrap.io'
     MAIL_PORT = 587
-    MAIL_USERNAME = os.environ['MAIL_USERNAME']
-    MAIL_PASSWORD = os.environ['MAIL_PASSWORD']
-    MAILTRAP_API_TOKEN = os.environ['MAILTRAP_API_TOKEN']
+    MAIL_USERNAME = os.getenv('MAIL_USERNAME')
+    MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
+    MAILTRAP_API_TOKEN = os.getenv('MAILTRAP_API_TOKEN')
     MAIL_USE_TLS = True
     MAIL_USE_SSL = False
-    MAIL_SUPPORT_RECIPIENT = os.environ['MAIL_SUPPORT_RECIPIENT']
+    MAIL_SUPPORT_RECIPIENT = os.getenv('MAIL_SUPPORT_RECIPIENT')
     
-    SQLALCHEMY_DATABASE_URI = os.environ['SQLALCHEMY_DATABASE_URI']
+    SQLALCHEMY_DATABASE_URI = os.getenv('SQLALCHEMY_DATABASE_URI')
     SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'options': '-csearch_path=public'}}
 
     RECAPTCHA_SECRET_KEY = os.environ.get('RECAPTCHA_SECRET_KEY', None)
     
-    SQLALCHEMY_DATABASE_URI = os.environ['SQLALCHEMY_DATABASE_URI']
+    SQLALCHEMY_DATABASE_URI = os.getenv('SQLALCHEMY_DATABASE_URI')
     
-    REDDIT_CLIENT_ID = os.environ['REDDIT_CLIENT_ID']
-    REDDIT_CLIENT_SECRET = os.environ['REDDIT_CLIENT_SECRET']
+    REDDIT_CLIENT_ID = os.getenv('REDDIT_CLIENT_ID')
+    REDDIT_CLIENT_SECRET = os.getenv('REDDIT_CLIENT_SECRET')
     REDDIT_USER_AGENT = "reappraiseit app by u/reappraiseit"
     REDDIT_SCOPES = ["identity", "history", "mysubreddits", "read"]
     
@@ -1,5 +1,7 @@
 # flask_app/extensions.py
 
+from pathlib import Path
+
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_cors import CORS
@@ -51,7 +53,8 @@ class SoftDeleteQuery(Query):
 
 # Create the global Flask extensions
 db = SQLAlchemy(query_class=SoftDeleteQuery)
-migrate = Migrate()
+# Found from any working directory (the images run from /app)
+migrate = Migrate(directory=str(Path(__file__).parent / 'migrations'))
 cors = CORS()
 mail = Mail()
 login_manager = LoginManager()
@@ -0,0 +1,26 @@
+# flask_app/gunicorn.conf.py
+
+import os
+
+# prometheus_client opens its files in this directory as soon as a metric is
+# created, i.e. when telemetry.metrics is imported. With preload_app that
+# happens while loading the app, before on_starting.
+if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+bind = "0.0.0.0:8000"
+workers = 4
+# Import the app once in the master so workers share its memory copy-on-write.
+# Engines are created lazily and reset after fork (db/db_session.py).
+preload_app = os.getenv("GUNICORN_PRELOAD_APP", "true").lower() == "true"
+
+
+def on_starting(server):
+    # Samples from a previous container run would be summed into /metrics
+    from telemetry import metrics
+    metrics.clear_multiproc_dir()
+
+
+def child_exit(server, worker):
+    from telemetry import metrics
+    metrics.mark_process_dead(worker.pid)
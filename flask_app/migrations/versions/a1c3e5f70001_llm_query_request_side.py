@@ -0,0 +1,28 @@
+"""Record the request side of LLM queries for replay
+
+Revision ID: a1c3e5f70001
+Revises: 
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'a1c3e5f70001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('llm_queries', sa.Column('request_hash', sa.String(), nullable=True))
+    op.add_column('llm_queries', sa.Column('request_messages', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+    op.create_index('llm_queries_request_hash_index', 'llm_queries', ['request_hash'], unique=False)
+
+
+def downgrade():
+    op.drop_index('llm_queries_request_hash_index', table_name='llm_queries')
+    op.drop_column('llm_queries', 'request_messages')
+    op.drop_column('llm_queries', 'request_hash')
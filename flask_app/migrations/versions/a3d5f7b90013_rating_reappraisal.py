@@ -0,0 +1,50 @@
+"""Break rating aggregates down by reappraisal
+
+Revision ID: a3d5f7b90013
+Revises: f2c4e6a80012
+Create Date: 2026-10-21 12:00:00.000000
+
+conversation_ratings records which reappraisal a conversation was shown
+(the registry prompt that generated it) and rating_aggregates gains it as
+a key. Earlier conversations did not record it and count as "unknown";
+their llm_model, stamped from the configured model rather than the one
+that served them, is kept as it was.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'a3d5f7b90013'
+down_revision = 'f2c4e6a80012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('conversation_ratings', sa.Column('reappraisal', sa.String(), nullable=True))
+    # A few rows per (model, version, metric): rewriting it is cheap
+    op.add_column('rating_aggregates', sa.Column('reappraisal', sa.String(), nullable=False,
+                                                 server_default='unknown'))
+    op.alter_column('rating_aggregates', 'reappraisal', server_default=None)
+    op.drop_constraint('rating_aggregates_pkey', 'rating_aggregates', type_='primary')
+    op.create_primary_key('rating_aggregates_pkey', 'rating_aggregates',
+                          ['llm_model', 'bot_version', 'reappraisal', 'metric'])
+
+
+def downgrade():
+    # Merge the reappraisals of each (model, version, metric) back together
+    op.execute("""
+        CREATE TEMPORARY TABLE merged_rating_aggregates ON COMMIT DROP AS
+        SELECT llm_model, bot_version, metric, sum(n) AS n, sum(total) AS total,
+               sum(total_sq) AS total_sq, max(updated_at) AS updated_at
+        FROM rating_aggregates GROUP BY llm_model, bot_version, metric
+    """)
+    op.execute("DELETE FROM rating_aggregates")
+    op.drop_constraint('rating_aggregates_pkey', 'rating_aggregates', type_='primary')
+    op.drop_column('rating_aggregates', 'reappraisal')
+    op.create_primary_key('rating_aggregates_pkey', 'rating_aggregates', ['llm_model', 'bot_version', 'metric'])
+    op.execute("""
+        INSERT INTO rating_aggregates (llm_model, bot_version, metric, n, total, total_sq, updated_at)
+        SELECT llm_model, bot_version, metric, n, total, total_sq, updated_at FROM merged_rating_aggregates
+    """)
+    op.drop_column('conversation_ratings', 'reappraisal')
@@ -0,0 +1,43 @@
+"""Full-text search index on users' messages
+
+Revision ID: a7d9f1b30007
+Revises: f6c8e0a20006
+Create Date: 2026-10-19 22:00:00.000000
+
+CREATE INDEX CONCURRENTLY is not supported on a partitioned table, so the
+index is created invalid ON ONLY the parent, built concurrently on each
+partition and attached; the parent index becomes valid once every
+partition has one. Partitions created later get it on ATTACH.
+"""
+from alembic import op
+from sqlalchemy import text
+
+from db.models import MESSAGE_SEARCH_VECTOR
+from db.partitions import list_partitions
+
+# revision identifiers, used by Alembic.
+revision = 'a7d9f1b30007'
+down_revision = 'f6c8e0a20006'
+branch_labels = None
+depends_on = None
+
+INDEX = 'messages_content_search_index'
+DEFINITION = f"USING gin ({MESSAGE_SEARCH_VECTOR}) WHERE role = 'USER' AND deleted_at IS NULL"
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        op.execute(f'CREATE INDEX IF NOT EXISTS {INDEX} ON ONLY messages {DEFINITION}')
+        for partition, _ in list_partitions(conn, 'messages'):
+            child = f'{partition}_content_search_index'
+            op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {child} ON {partition} {DEFINITION}')
+            attached = conn.execute(text(
+                "SELECT 1 FROM pg_inherits WHERE inhrelid = CAST(:child AS regclass)"), {"child": child}).first()
+            if attached is None:
+                op.execute(f'ALTER INDEX {INDEX} ATTACH PARTITION {child}')
+
+
+def downgrade():
+    # Drops the partitions' indexes with it
+    op.execute(f'DROP INDEX IF EXISTS {INDEX}')
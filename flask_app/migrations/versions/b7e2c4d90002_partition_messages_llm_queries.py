@@ -0,0 +1,102 @@
+"""Partition messages and llm_queries by month on created_at
+
+Revision ID: b7e2c4d90002
+Revises: a1c3e5f70001
+Create Date: 2026-10-19 12:00:00.000000
+
+The existing tables are not rewritten. Each one is renamed to
+<table>_legacy and attached to a new partitioned parent as the partition
+for everything before next month. Monthly partitions follow (db/partitions.py
+keeps creating them ahead of time). The only scans happen before the swap,
+without blocking writes.
+
+Because the parents' primary keys now include created_at, llm_queries
+can no longer have a foreign key to messages.id.
+"""
+from datetime import datetime, timezone
+
+from alembic import op
+
+from db.partitions import MONTHS_AHEAD, add_months, create_partition, month_start
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2c4d90002'
+down_revision = 'a1c3e5f70001'
+branch_labels = None
+depends_on = None
+
+# (table, indexes, foreign keys as (column, referenced table))
+TABLES = [
+    ('messages',
+     {'messages_user_id_index': 'user_id', 'messages_conversation_id_index': 'conversation_id'},
+     [('user_id', 'users'), ('conversation_id', 'conversations')]),
+    ('llm_queries',
+     {'llm_queries_user_id_index': 'user_id', 'llm_queries_message_id_index': 'message_id',
+      'llm_queries_request_hash_index': 'request_hash'},
+     [('user_id', 'users')]),
+]
+
+
+def _prepare(table, cutoff):
+    # Slow steps, run on the live table outside a transaction: NOT VALID +
+    # VALIDATE and CREATE INDEX CONCURRENTLY do not block writes, and let
+    # ATTACH below trust the bound and reuse the index instead of scanning
+    # and building under its lock.
+    op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_legacy_bounds CHECK (created_at < '{cutoff}') NOT VALID")
+    op.execute(f'ALTER TABLE {table} VALIDATE CONSTRAINT {table}_legacy_bounds')
+    op.execute(f'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {table}_legacy_id_created_at_key '
+               f'ON {table} (id, created_at)')
+
+
+def _partition(table, indexes, foreign_keys, cutoff):
+    # Catalog-only changes, in one short transaction
+    legacy = f'{table}_legacy'
+    op.execute(f'ALTER TABLE {table} RENAME TO {legacy}')
+    op.execute(f'ALTER TABLE {legacy} RENAME CONSTRAINT {table}_pkey TO {legacy}_pkey')
+    for name in indexes:
+        op.execute(f'ALTER INDEX IF EXISTS {name} RENAME TO {legacy}{name[len(table):]}')
+
+    op.execute(f'CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)')
+    # The id sequence must outlive the legacy partition
+    op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id')
+    op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id, created_at)')
+    for column, referenced in foreign_keys:
+        op.create_foreign_key(f'{table}_{column}_fkey', table, referenced, [column], ['id'])
+    op.execute(f"ALTER TABLE {table} ATTACH PARTITION {legacy} FOR VALUES FROM (MINVALUE) TO ('{cutoff}')")
+
+    # Created on the parent, these adopt the legacy partition's existing
+    # indexes on the same columns instead of building new ones
+    for name, column in indexes.items():
+        op.create_index(name, table, [column], unique=False)
+
+
+def upgrade():
+    next_month = add_months(month_start(datetime.now(timezone.utc)), 1)
+    cutoff = next_month.isoformat()
+    with op.get_context().autocommit_block():
+        for table, _, _ in TABLES:
+            _prepare(table, cutoff)
+
+    op.drop_constraint('llm_queries_message_id_fkey', 'llm_queries', type_='foreignkey')
+    for table, indexes, foreign_keys in TABLES:
+        _partition(table, indexes, foreign_keys, cutoff)
+        # On the migration's connection: the parent is not committed yet
+        for offset in range(MONTHS_AHEAD):
+            create_partition(op.get_bind(), table, add_months(next_month, offset))
+
+
+def downgrade():
+    # Copies every row back into plain tables; only practical on small databases
+    for table, indexes, foreign_keys in reversed(TABLES):
+        plain = f'{table}_unpartitioned'
+        op.execute(f'CREATE TABLE {plain} (LIKE {table} INCLUDING DEFAULTS)')
+        op.execute(f'INSERT INTO {plain} SELECT * FROM {table}')
+        op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY {plain}.id')
+        op.execute(f'DROP TABLE {table} CASCADE')
+        op.execute(f'ALTER TABLE {plain} RENAME TO {table}')
+        op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id)')
+        for column, referenced in foreign_keys:
+            op.create_foreign_key(f'{table}_{column}_fkey', table, referenced, [column], ['id'])
+        for name, column in indexes.items():
+            op.create_index(name, table, [column], unique=False)
+    op.create_foreign_key('llm_queries_message_id_fkey', 'llm_queries', 'messages', ['message_id'], ['id'])
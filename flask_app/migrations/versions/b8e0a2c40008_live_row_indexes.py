@@ -0,0 +1,63 @@
+"""Partial indexes for the soft-delete reads in db/crud.py
+
+Revision ID: b8e0a2c40008
+Revises: a7d9f1b30007
+Create Date: 2026-10-19 23:00:00.000000
+
+Every default read filters on deleted_at IS NULL; these composite indexes
+carry the same predicate and the columns each query filters and sorts on.
+All are built CONCURRENTLY (per partition on messages and llm_queries).
+The single-column indexes stay for include_deleted reads and foreign key
+checks. db/test_index_plans.py asserts that the queries use them.
+"""
+from alembic import op
+from sqlalchemy import text
+
+from db.partitions import create_index_concurrently
+
+# revision identifiers, used by Alembic.
+revision = 'b8e0a2c40008'
+down_revision = 'a7d9f1b30007'
+branch_labels = None
+depends_on = None
+
+LIVE = 'WHERE deleted_at IS NULL'
+
+# (table, index, columns)
+INDEXES = [
+    ('users', 'users_email_live_index', 'email'),
+    ('conversations', 'conversations_user_id_updated_at_live_index', 'user_id, updated_at DESC'),
+    ('analysis_data', 'analysis_data_conversation_id_updated_at_live_index', 'conversation_id, updated_at DESC'),
+    ('analysis_data', 'analysis_data_user_id_updated_at_live_index', 'user_id, updated_at DESC'),
+    ('donations', 'donations_user_id_live_index', 'user_id'),
+    ('support', 'support_user_id_live_index', 'user_id'),
+]
+PARTITIONED_INDEXES = [
+    ('messages', 'messages_conversation_id_created_at_live_index', 'conversation_id, created_at'),
+    ('messages', 'messages_user_id_created_at_live_index', 'user_id, created_at'),
+    ('llm_queries', 'llm_queries_request_hash_created_at_live_index', 'request_hash, created_at DESC, id DESC'),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        for table, name, columns in INDEXES:
+            # A failed concurrent build leaves an invalid index behind; rebuild it
+            invalid = conn.execute(text(
+                "SELECT 1 FROM pg_index WHERE indexrelid = to_regclass(:name) AND NOT indisvalid"),
+                {"name": name}).first()
+            if invalid is not None:
+                op.execute(f'DROP INDEX CONCURRENTLY {name}')
+            op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns}) {LIVE}')
+        for table, name, columns in PARTITIONED_INDEXES:
+            create_index_concurrently(conn, table, name, f'({columns}) {LIVE}')
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for _, name, _ in INDEXES:
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+    # Indexes on partitioned tables cannot be dropped concurrently
+    for _, name, _ in PARTITIONED_INDEXES:
+        op.execute(f'DROP INDEX IF EXISTS {name}')
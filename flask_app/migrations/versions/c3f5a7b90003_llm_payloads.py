@@ -0,0 +1,61 @@
+"""Move LLM completion and request payloads to llm_payloads
+
+Revision ID: c3f5a7b90003
+Revises: b7e2c4d90002
+Create Date: 2026-10-19 15:00:00.000000
+
+Existing rows keep their inline JSONB until `python -m db.payloads backfill`
+moves it; the columns become nullable and new rows leave them empty.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'c3f5a7b90003'
+down_revision = 'b7e2c4d90002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'llm_payloads',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('content_hash', sa.String(), nullable=False),
+        sa.Column('data', sa.LargeBinary(), nullable=True),
+        sa.Column('size_raw', sa.Integer(), nullable=False),
+        sa.Column('size_compressed', sa.Integer(), nullable=False),
+        sa.Column('archive_path', sa.String(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('content_hash'),
+    )
+    op.create_index('llm_payloads_created_at_index', 'llm_payloads', ['created_at'], unique=False)
+    # The compressed bytes would not shrink further; skip pglz on TOAST
+    op.execute("ALTER TABLE llm_payloads ALTER COLUMN data SET STORAGE EXTERNAL")
+
+    op.add_column('llm_queries', sa.Column('latency_ms', sa.Float(), nullable=True))
+    op.add_column('llm_queries', sa.Column('completion_payload_id', sa.Integer(), nullable=True))
+    op.add_column('llm_queries', sa.Column('request_payload_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('llm_queries_completion_payload_id_fkey', 'llm_queries', 'llm_payloads',
+                          ['completion_payload_id'], ['id'])
+    op.create_foreign_key('llm_queries_request_payload_id_fkey', 'llm_queries', 'llm_payloads',
+                          ['request_payload_id'], ['id'])
+    op.alter_column('llm_queries', 'completion', existing_type=postgresql.JSONB(astext_type=sa.Text()),
+                    nullable=True)
+
+
+def downgrade():
+    # completion stays nullable: rows written since the upgrade have no inline
+    # payload (run the backfill in reverse by hand if they matter)
+    op.drop_constraint('llm_queries_request_payload_id_fkey', 'llm_queries', type_='foreignkey')
+    op.drop_constraint('llm_queries_completion_payload_id_fkey', 'llm_queries', type_='foreignkey')
+    op.drop_column('llm_queries', 'request_payload_id')
+    op.drop_column('llm_queries', 'completion_payload_id')
+    op.drop_column('llm_queries', 'latency_ms')
+    op.drop_index('llm_payloads_created_at_index', table_name='llm_payloads')
+    op.drop_table('llm_payloads')
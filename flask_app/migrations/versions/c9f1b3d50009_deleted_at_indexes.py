@@ -0,0 +1,34 @@
+"""Partial indexes over soft-deleted rows for the retention job
+
+Revision ID: c9f1b3d50009
+Revises: b8e0a2c40008
+Create Date: 2026-10-20 09:00:00.000000
+
+db/retention.py walks soft-deleted rows in (deleted_at, id) order; these
+indexes only hold those rows, so they stay small.
+"""
+from alembic import op
+
+from db.partitions import create_index_concurrently
+
+# revision identifiers, used by Alembic.
+revision = 'c9f1b3d50009'
+down_revision = 'b8e0a2c40008'
+branch_labels = None
+depends_on = None
+
+DEFINITION = '(deleted_at, id) WHERE deleted_at IS NOT NULL'
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS analysis_data_deleted_at_index ON analysis_data {DEFINITION}')
+        for table in ('messages', 'llm_queries'):
+            create_index_concurrently(op.get_bind(), table, f'{table}_deleted_at_index', DEFINITION)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS analysis_data_deleted_at_index')
+    for table in ('messages', 'llm_queries'):
+        op.execute(f'DROP INDEX IF EXISTS {table}_deleted_at_index')
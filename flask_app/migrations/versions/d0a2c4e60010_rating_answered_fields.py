@@ -0,0 +1,69 @@
+"""Track answered rating questions apart from their numeric value
+
+Revision ID: d0a2c4e60010
+Revises: c9f1b3d50009
+Create Date: 2026-10-20 11:00:00.000000
+
+A non-numeric answer leaves its conversation_ratings column NULL, which
+made the bot re-ask the question. conversation_ratings.answered_fields
+lists every answered question; it is backfilled from the live
+analysis_data rows (what the bot counted as answered before e5b7d9f10005)
+in batches that commit on their own.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from sqlalchemy import text
+
+# revision identifiers, used by Alembic.
+revision = 'd0a2c4e60010'
+down_revision = 'c9f1b3d50009'
+branch_labels = None
+depends_on = None
+
+# Frozen copy of db.models.RATING_FIELDS as of this revision
+RATING_FIELDS = (
+    'rate_issue_neg', 'rate_issue_pos',
+    'rate_reap_1_success', 'rate_reap_1_care', 'rate_reap_1_believe', 'rate_reap_1_neg', 'rate_reap_1_pos',
+    'rate_reap_2_success', 'rate_reap_2_care', 'rate_reap_2_believe', 'rate_reap_2_neg', 'rate_reap_2_pos',
+)
+BATCH_SIZE = 5000
+
+
+def _backfill_answered(conn):
+    last_id = 0
+    while True:
+        last = conn.execute(text("""
+            WITH batch AS (
+                SELECT conversation_id FROM conversation_ratings
+                WHERE conversation_id > :last_id ORDER BY conversation_id LIMIT :limit
+            ), updated AS (
+                UPDATE conversation_ratings r SET answered_fields = ARRAY(
+                    SELECT DISTINCT field FROM (
+                        SELECT unnest(r.answered_fields) AS field
+                        UNION
+                        SELECT a.field FROM analysis_data a
+                        WHERE a.conversation_id = r.conversation_id AND a.deleted_at IS NULL
+                              AND a.field = ANY(:fields)
+                    ) f ORDER BY field)
+                FROM batch
+                WHERE r.conversation_id = batch.conversation_id
+            )
+            SELECT max(conversation_id) FROM batch
+        """), {"last_id": last_id, "limit": BATCH_SIZE, "fields": list(RATING_FIELDS)}).scalar()
+        if last is None:
+            break
+        last_id = last
+
+
+def upgrade():
+    # A constant default: no table rewrite
+    op.add_column('conversation_ratings', sa.Column(
+        'answered_fields', postgresql.ARRAY(sa.String()), nullable=False, server_default=sa.text("'{}'")))
+
+    with op.get_context().autocommit_block():
+        _backfill_answered(op.get_bind())
+
+
+def downgrade():
+    op.drop_column('conversation_ratings', 'answered_fields')
@@ -0,0 +1,48 @@
+"""Store question options on messages as registry references
+
+Revision ID: d4a6c8e00004
+Revises: c3f5a7b90003
+Create Date: 2026-10-19 18:00:00.000000
+
+Existing messages are rewritten in batches of 1000, each committed on its
+own, so the table is never locked for the whole backfill.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from db.message_options import compact_existing
+
+# revision identifiers, used by Alembic.
+revision = 'd4a6c8e00004'
+down_revision = 'c3f5a7b90003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'registry_versions',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('version', sa.String(), nullable=False),
+        sa.Column('questions', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('version'),
+    )
+    with op.get_context().autocommit_block():
+        compact_existing(op.get_bind(), batch_size=1000)
+
+
+def downgrade():
+    # Expand the references again before their registry versions go away
+    op.execute("""
+        UPDATE messages m
+        SET options = (rv.questions -> (m.options->>'question_id')) || (m.options - 'registry_version')
+        FROM registry_versions rv
+        WHERE m.options ? 'registry_version' AND rv.version = m.options->>'registry_version'
+              AND rv.questions ? (m.options->>'question_id')
+    """)
+    op.drop_table('registry_versions')
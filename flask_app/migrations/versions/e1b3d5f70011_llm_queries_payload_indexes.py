@@ -0,0 +1,33 @@
+"""Index llm_queries' payload references
+
+Revision ID: e1b3d5f70011
+Revises: d0a2c4e60010
+Create Date: 2026-10-20 12:00:00.000000
+
+db/retention.py deletes llm_payloads rows that no llm_queries row points
+at; both NOT EXISTS checks, and the foreign key checks on those deletes,
+need an index on each reference. Built CONCURRENTLY per partition.
+"""
+from alembic import op
+
+from db.partitions import create_index_concurrently
+
+# revision identifiers, used by Alembic.
+revision = 'e1b3d5f70011'
+down_revision = 'd0a2c4e60010'
+branch_labels = None
+depends_on = None
+
+COLUMNS = ('completion_payload_id', 'request_payload_id')
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for column in COLUMNS:
+            create_index_concurrently(op.get_bind(), 'llm_queries', f'llm_queries_{column}_index', f'({column})')
+
+
+def downgrade():
+    # Indexes on partitioned tables cannot be dropped concurrently
+    for column in COLUMNS:
+        op.execute(f'DROP INDEX IF EXISTS llm_queries_{column}_index')
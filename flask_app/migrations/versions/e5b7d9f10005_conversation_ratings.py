@@ -0,0 +1,104 @@
+"""Numeric rating values and a per-conversation ratings table
+
+Revision ID: e5b7d9f10005
+Revises: d4a6c8e00004
+Create Date: 2026-10-19 19:00:00.000000
+
+analysis_data gains a numeric value next to the client's string content,
+and conversation_ratings holds one row per conversation with a column per
+rating. Both are backfilled in batches that commit on their own, so the
+tables stay writable while it runs.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import text
+
+# revision identifiers, used by Alembic.
+revision = 'e5b7d9f10005'
+down_revision = 'd4a6c8e00004'
+branch_labels = None
+depends_on = None
+
+# Frozen copy of db.models.RATING_FIELDS as of this revision
+RATING_FIELDS = (
+    'rate_issue_neg', 'rate_issue_pos',
+    'rate_reap_1_success', 'rate_reap_1_care', 'rate_reap_1_believe', 'rate_reap_1_neg', 'rate_reap_1_pos',
+    'rate_reap_2_success', 'rate_reap_2_care', 'rate_reap_2_believe', 'rate_reap_2_neg', 'rate_reap_2_pos',
+)
+NUMERIC = r'^\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*$'
+BATCH_SIZE = 5000
+
+
+def _backfill_values(conn):
+    last_id = 0
+    while True:
+        last = conn.execute(text("""
+            WITH batch AS (
+                SELECT id FROM analysis_data WHERE id > :last_id ORDER BY id LIMIT :limit
+            ), updated AS (
+                UPDATE analysis_data a SET value = CAST(a.content AS double precision)
+                FROM batch
+                WHERE a.id = batch.id AND a.value IS NULL AND a.content ~ :numeric
+            )
+            SELECT max(id) FROM batch
+        """), {"last_id": last_id, "limit": BATCH_SIZE, "numeric": NUMERIC}).scalar()
+        if last is None:
+            break
+        last_id = last
+
+
+def _backfill_ratings(conn):
+    # Latest live answer per field; columns the bot has set meanwhile win
+    columns = ", ".join(RATING_FIELDS)
+    merge = ", ".join(f"{field} = COALESCE(conversation_ratings.{field}, EXCLUDED.{field})"
+                      for field in RATING_FIELDS)
+    pivots = ",\n".join(
+        f"(array_agg(value ORDER BY updated_at DESC) FILTER (WHERE field = '{field}'))[1]"
+        for field in RATING_FIELDS)
+    last_id = 0
+    while True:
+        last = conn.execute(text(f"""
+            WITH batch AS (
+                SELECT DISTINCT conversation_id FROM analysis_data
+                WHERE conversation_id > :last_id ORDER BY conversation_id LIMIT :limit
+            ), inserted AS (
+                INSERT INTO conversation_ratings (conversation_id, user_id, {columns}, created_at, updated_at)
+                SELECT a.conversation_id, min(a.user_id), {pivots}, min(a.created_at), max(a.updated_at)
+                FROM analysis_data a
+                JOIN batch USING (conversation_id)
+                WHERE a.deleted_at IS NULL
+                GROUP BY a.conversation_id
+                ON CONFLICT (conversation_id) DO UPDATE SET {merge}
+            )
+            SELECT max(conversation_id) FROM batch
+        """), {"last_id": last_id, "limit": BATCH_SIZE}).scalar()
+        if last is None:
+            break
+        last_id = last
+
+
+def upgrade():
+    op.add_column('analysis_data', sa.Column('value', sa.Float(), nullable=True))
+    op.create_table(
+        'conversation_ratings',
+        sa.Column('conversation_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        *[sa.Column(field, sa.Float(), nullable=True) for field in RATING_FIELDS],
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['conversation_id'], ['conversations.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('conversation_id'),
+    )
+    op.create_index('conversation_ratings_user_id_index', 'conversation_ratings', ['user_id'], unique=False)
+
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        _backfill_values(conn)
+        _backfill_ratings(conn)
+
+
+def downgrade():
+    op.drop_index('conversation_ratings_user_id_index', table_name='conversation_ratings')
+    op.drop_table('conversation_ratings')
+    op.drop_column('analysis_data', 'value')
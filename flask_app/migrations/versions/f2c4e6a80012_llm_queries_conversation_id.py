@@ -0,0 +1,36 @@
+"""Record the conversation on llm_queries
+
+Revision ID: f2c4e6a80012
+Revises: e1b3d5f70011
+Create Date: 2026-10-21 09:00:00.000000
+
+The bot never set llm_queries.message_id, so db/retention.py could not
+find a conversation's queries (or the request payloads holding its text)
+and db/export.py reported no LLM usage. Queries now record their
+conversation_id; the index is built CONCURRENTLY per partition. Earlier
+rows cannot be attributed and keep a NULL conversation_id.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from db.partitions import create_index_concurrently
+
+# revision identifiers, used by Alembic.
+revision = 'f2c4e6a80012'
+down_revision = 'e1b3d5f70011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Nullable, no default: a catalog-only change on every partition
+    op.add_column('llm_queries', sa.Column('conversation_id', sa.Integer(), nullable=True))
+
+    with op.get_context().autocommit_block():
+        create_index_concurrently(op.get_bind(), 'llm_queries', 'llm_queries_conversation_id_index',
+                                  '(conversation_id)')
+
+
+def downgrade():
+    op.execute('DROP INDEX IF EXISTS llm_queries_conversation_id_index')
+    op.drop_column('llm_queries', 'conversation_id')
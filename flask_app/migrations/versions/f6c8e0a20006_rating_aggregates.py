@@ -0,0 +1,75 @@
+"""Rating aggregates for reappraisal-effectiveness analytics
+
+Revision ID: f6c8e0a20006
+Revises: e5b7d9f10005
+Create Date: 2026-10-19 21:00:00.000000
+
+Conversations that completed before this revision are stamped with their
+bot version (from their last bot message) and completion time; their model
+was not recorded and stays NULL ("unknown"). The backfill runs in batches
+that commit on their own. Run `python -m db.analytics recompute`
+afterwards to count them.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import text
+
+# revision identifiers, used by Alembic.
+revision = 'f6c8e0a20006'
+down_revision = 'e5b7d9f10005'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+
+def _backfill_completed(conn):
+    last_id = 0
+    while True:
+        last = conn.execute(text("""
+            WITH batch AS (
+                SELECT r.conversation_id FROM conversation_ratings r
+                JOIN conversations c ON c.id = r.conversation_id
+                WHERE r.conversation_id > :last_id AND c.state = 'COMPLETE' AND r.completed_at IS NULL
+                ORDER BY r.conversation_id LIMIT :limit
+            ), updated AS (
+                UPDATE conversation_ratings r
+                SET completed_at = c.updated_at,
+                    bot_version = (SELECT m.bot_version FROM messages m
+                                   WHERE m.conversation_id = c.id AND m.role = 'ASSISTANT'
+                                   ORDER BY m.created_at DESC LIMIT 1)
+                FROM batch JOIN conversations c ON c.id = batch.conversation_id
+                WHERE r.conversation_id = batch.conversation_id
+            )
+            SELECT max(conversation_id) FROM batch
+        """), {"last_id": last_id, "limit": BATCH_SIZE}).scalar()
+        if last is None:
+            break
+        last_id = last
+
+
+def upgrade():
+    op.add_column('conversation_ratings', sa.Column('llm_model', sa.String(), nullable=True))
+    op.add_column('conversation_ratings', sa.Column('bot_version', sa.String(), nullable=True))
+    op.add_column('conversation_ratings', sa.Column('completed_at', sa.DateTime(), nullable=True))
+    op.create_table(
+        'rating_aggregates',
+        sa.Column('llm_model', sa.String(), nullable=False),
+        sa.Column('bot_version', sa.String(), nullable=False),
+        sa.Column('metric', sa.String(), nullable=False),
+        sa.Column('n', sa.BigInteger(), nullable=False),
+        sa.Column('total', sa.Float(), nullable=False),
+        sa.Column('total_sq', sa.Float(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('llm_model', 'bot_version', 'metric'),
+    )
+
+    with op.get_context().autocommit_block():
+        _backfill_completed(op.get_bind())
+
+
+def downgrade():
+    op.drop_table('rating_aggregates')
+    op.drop_column('conversation_ratings', 'completed_at')
+    op.drop_column('conversation_ratings', 'bot_version')
+    op.drop_column('conversation_ratings', 'llm_model')
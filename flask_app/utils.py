@@ -0,0 +1,48 @@
+from flask import request
+
+from db import cache
+from db.db_session import get_replica_engine, get_session, primary_lsn
+
+# Cookie carrying the primary's WAL position after a client's last write,
+# so that its reads in the next few seconds wait for the replica to catch up
+# and bypass the cache (see db/cache.py)
+LSN_COOKIE = 'last_write_lsn'
+READ_YOUR_WRITES_SECONDS = 30
+# Cookie value when there is no replica to compare positions with
+WROTE = 'wrote'
+
+
+def read_session():
+    """
+    A session for a read-only endpoint: on the read replica when one is
+    configured and has caught up with this client's last write, else on
+    the primary.
+    """
+    return get_session(readonly=True, min_lsn=request.cookies.get(LSN_COOKIE))
+
+
+def recent_write() -> bool:
+    """
+    Whether this client wrote in the last READ_YOUR_WRITES_SECONDS (or
+    CACHE_TTL_SECONDS, if longer).
+    """
+    return LSN_COOKIE in request.cookies
+
+
+def remember_write(response):
+    """
+    After a successful write, pin the client's reads to the primary's
+    current position (see read_session()) and past the cache. No-op without
+    a replica or cache.
+    """
+    if request.method in ('GET', 'HEAD', 'OPTIONS') or response.status_code >= 400:
+        return response
+    if get_replica_engine() is None and not cache.enabled():
+        return response
+    # As long as a value cached by a load racing this write may live
+    max_age = int(max(READ_YOUR_WRITES_SECONDS, cache.TTL_SECONDS))
+    # Without a replica only the cookie's presence matters (recent_write())
+    lsn = primary_lsn() if get_replica_engine() is not None else WROTE
+    response.set_cookie(LSN_COOKIE, lsn, max_age=max_age,
+                        httponly=True, samesite='Lax')
+    return response
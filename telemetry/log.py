@@ -0,0 +1,231 @@
+# telemetry/log.py
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+from typing import Dict, Optional
+
+from telemetry.tracing import current_trace_id
+
+'''
+Shared logging pipeline for the gateway, the bot service and db/.
+
+Loggers only put records on an in-memory queue; a QueueListener thread per
+destination formats them and does the disk and stdout I/O, so request
+threads and the event loop never block on a slow volume. Records are
+written to logs/<file> as JSON lines carrying the service, pid and, when
+known, the trace id, turn id and conversation id of the request that
+logged them.
+
+    LOG_LEVEL    DEBUG / INFO / ... (default: DEBUG in development, INFO in production)
+    LOG_FORMAT   stdout format, "text" or "json" (default: text in development, json in production)
+    LOG_PAYLOAD_CHARS        truncate logged payloads to this many characters (default 2000)
+    LOG_PAYLOAD_SAMPLE_RATE  fraction of large payload logs to keep (default 1.0)
+
+Log large payloads lazily so nothing is formatted when the level is off:
+
+    logger.debug("LLM response: %s", truncated(completion.content))
+'''
+
+ENV = os.getenv("FLASK_ENV", "development")
+LOG_DIR = Path(os.getenv("LOG_DIR", "logs"))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG" if ENV == "development" else "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text" if ENV == "development" else "json")
+PAYLOAD_CHARS = int(os.getenv("LOG_PAYLOAD_CHARS", "2000"))
+PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "1.0"))
+# Records beyond this are dropped rather than blocking the caller
+QUEUE_SIZE = 10_000
+
+_context: ContextVar[Dict] = ContextVar("log_context", default={})
+_lock = threading.Lock()
+_pipelines: Dict[str, "_Pipeline"] = {}
+SERVICE = os.getenv("SERVICE_NAME") or Path(sys.argv[0]).stem
+
+
+def set_service(name: str):
+    global SERVICE
+    SERVICE = name
+
+
+def bind(**fields):
+    """
+    Attach fields (turn_id, conversation_id, ...) to every record logged in
+    the current request. Returns a token for unbind().
+    """
+    return _context.set({**_context.get(), **fields})
+
+
+def unbind(token):
+    _context.reset(token)
+
+
+class truncated:
+    """
+    Lazily formatted, length-capped log argument.
+    """
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value, limit: Optional[int] = None):
+        self.value = value
+        self.limit = limit or PAYLOAD_CHARS
+
+    def __str__(self):
+        text = self.value if isinstance(self.value, str) else repr(self.value)
+        if len(text) <= self.limit:
+            return text
+        return f"{text[:self.limit]}... [{len(text) - self.limit} more chars]"
+
+    __repr__ = __str__
+
+
+def sampled() -> bool:
+    """
+    Whether to log a large payload this time (LOG_PAYLOAD_SAMPLE_RATE).
+    """
+    return PAYLOAD_SAMPLE_RATE >= 1.0 or random.random() < PAYLOAD_SAMPLE_RATE
+
+
+class ContextFilter(logging.Filter):
+    """
+    Runs in the thread that logged: stamps the request context onto the
+    record before it crosses the queue.
+    """
+    def filter(self, record):
+        record.service = SERVICE
+        record.context = _context.get()
+        record.trace_id = current_trace_id()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        doc = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "service": getattr(record, "service", SERVICE),
+            "pid": record.process,
+            "src": f"{record.filename}:{record.lineno}",
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "trace_id", None):
+            doc["trace_id"] = record.trace_id
+        doc.update(getattr(record, "context", None) or {})
+        if record.exc_text:
+            doc["exc"] = record.exc_text
+        return json.dumps(doc, default=str)
+
+
+class _QueueHandler(QueueHandler):
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+    def prepare(self, record):
+        # Format the message now (args may not survive the thread hop),
+        # but leave the JSON/text rendering to the listener thread.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _QueueListener(QueueListener):
+    def enqueue_sentinel(self):
+        # Block instead of raising queue.Full so stop() always drains
+        self.queue.put(self._sentinel)
+
+
+class _Pipeline:
+    def __init__(self, filename: str, console: bool):
+        self.filename = filename
+        self.console = console
+        self.queue = queue.Queue(QUEUE_SIZE)
+        self.handler = _QueueHandler(self.queue)
+        self.handler.addFilter(ContextFilter())
+        self.listener = None
+        self.start()
+
+    def _handlers(self):
+        LOG_DIR.mkdir(parents=True, exist_ok=True)
+        file_handler = RotatingFileHandler(LOG_DIR / self.filename, maxBytes=10*1024*1024, backupCount=5)
+        file_handler.setFormatter(JsonFormatter())
+        handlers = [file_handler]
+        if self.console:
+            console_handler = logging.StreamHandler(sys.stdout)
+            if LOG_FORMAT == "json":
+                console_handler.setFormatter(JsonFormatter())
+            else:
+                console_handler.setFormatter(logging.Formatter("%(levelname)s - %(message)s"))
+            handlers.append(console_handler)
+        return handlers
+
+    def start(self):
+        self.listener = _QueueListener(self.queue, *self._handlers(), respect_handler_level=False)
+        self.listener.start()
+
+    def stop(self):
+        if self.listener is not None:
+            self.listener.stop()
+            for handler in self.listener.handlers:
+                handler.close()
+            self.listener = None
+
+    def restart_after_fork(self):
+        # The listener thread does not survive fork(); start a fresh one
+        self.queue = queue.Queue(QUEUE_SIZE)
+        self.handler.queue = self.queue
+        self.listener = None
+        self.start()
+
+
+def get_logger(name: str, filename: str = "all.log", console: bool = True, level: Optional[str] = None):
+    """
+    Return a logger that writes through the queue pipeline for `filename`.
+    """
+    logger = logging.getLogger(name)
+    with _lock:
+        if getattr(logger, "_pipeline", None) is None:
+            key = f"{filename}:{console}"
+            pipeline = _pipelines.get(key)
+            if pipeline is None:
+                pipeline = _pipelines[key] = _Pipeline(filename, console)
+            logger.handlers = [pipeline.handler]
+            logger.propagate = False
+            logger._pipeline = pipeline
+        logger.setLevel(level or LOG_LEVEL)
+    return logger
+
+
+def shutdown():
+    """
+    Flush and stop all listener threads.
+    """
+    with _lock:
+        for pipeline in _pipelines.values():
+            pipeline.stop()
+
+
+def _after_fork():
+    global _lock
+    _lock = threading.Lock()
+    for pipeline in _pipelines.values():
+        pipeline.restart_after_fork()
+
+
+atexit.register(shutdown)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
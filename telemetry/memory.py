@@ -0,0 +1,215 @@
+# telemetry/memory.py
+
+import gc
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, Optional
+
+from prometheus_client import Gauge
+
+from telemetry.log import get_logger
+
+'''
+Memory diagnostics for long-running workers.
+
+- Cache accounting: long-lived structures (the prompt registry, provider
+  state, future caches) register a getter with register_cache() and their
+  deep size is reported in the cache_bytes gauge and by /admin/memory.
+- A monitor thread per worker updates RSS, gc and cache gauges every
+  interval and, if max_rss_mb is set, recycles the worker once its RSS
+  passes the threshold.
+- tracemalloc snapshots on demand: the first snapshot() starts tracing and
+  takes a baseline, later calls return the top allocation growth since the
+  previous snapshot. stop_tracemalloc() turns tracing off again.
+
+Recycling sends SIGTERM to the worker itself. Gunicorn then shuts it down
+gracefully: it stops accepting requests, lets in-flight turns finish
+within graceful_timeout (see gunicorn.conf.py) and starts a replacement.
+Only enable it under a process manager that restarts workers.
+'''
+
+logger = get_logger("telemetry_memory")
+
+RSS_BYTES = Gauge("process_rss_bytes", "Resident set size of the worker", multiprocess_mode="liveall")
+CACHE_BYTES = Gauge("cache_bytes", "Approximate deep size of registered caches", ["cache"],
+                    multiprocess_mode="liveall")
+GC_OBJECTS = Gauge("python_gc_tracked_objects", "Objects tracked by the garbage collector",
+                   multiprocess_mode="liveall")
+GC_GENERATION_COUNT = Gauge("python_gc_generation_count", "Pending allocations per gc generation",
+                            ["generation"], multiprocess_mode="liveall")
+
+_caches: Dict[str, Callable[[], object]] = {}
+_snapshot_lock = threading.Lock()
+_last_snapshot: Optional[tracemalloc.Snapshot] = None
+_recycling = False
+
+
+def register_cache(name: str, getter: Callable[[], object]):
+    """
+    Report the deep size of getter() as cache_bytes{cache=name}.
+    """
+    _caches[name] = getter
+
+
+def deep_sizeof(obj, seen=None) -> int:
+    """
+    Approximate size of an object graph, counting shared objects once.
+    """
+    seen = set() if seen is None else seen
+    stack, total = [obj], 0
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, type):
+            continue
+        seen.add(id(o))
+        try:
+            total += sys.getsizeof(o)
+        except TypeError:
+            continue
+        if isinstance(o, dict) or hasattr(o, "items") and callable(getattr(o, "items", None)):
+            try:
+                for k, v in o.items():
+                    stack.append(k)
+                    stack.append(v)
+            except Exception:
+                pass
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        if hasattr(o, "__dict__"):
+            stack.append(vars(o))
+        for slot in getattr(type(o), "__slots__", ()):
+            if hasattr(o, slot):
+                stack.append(getattr(o, slot))
+    return total
+
+
+def rss_bytes() -> int:
+    import psutil
+    return psutil.Process().memory_info().rss
+
+
+def cache_sizes() -> Dict[str, int]:
+    sizes = {}
+    for name, getter in list(_caches.items()):
+        try:
+            sizes[name] = deep_sizeof(getter())
+        except Exception:
+            logger.exception(f"Could not size cache {name}")
+    return sizes
+
+
+def stats() -> Dict:
+    """
+    Point-in-time memory report for /admin/memory.
+    """
+    return {
+        "pid": os.getpid(),
+        "rss_bytes": rss_bytes(),
+        "gc_tracked_objects": len(gc.get_objects()),
+        "gc_counts": gc.get_count(),
+        "gc_collections": [s["collections"] for s in gc.get_stats()],
+        "cache_bytes": cache_sizes(),
+        "tracemalloc": tracemalloc.is_tracing(),
+        "recycling": _recycling,
+    }
+
+
+def update_gauges() -> int:
+    rss = rss_bytes()
+    RSS_BYTES.set(rss)
+    GC_OBJECTS.set(len(gc.get_objects()))
+    for generation, count in enumerate(gc.get_count()):
+        GC_GENERATION_COUNT.labels(str(generation)).set(count)
+    for name, size in cache_sizes().items():
+        CACHE_BYTES.labels(name).set(size)
+    return rss
+
+
+def snapshot(top: int = 25, frames: int = 10) -> Dict:
+    """
+    Take a tracemalloc snapshot and diff it against the previous one.
+    """
+    global _last_snapshot
+    with _snapshot_lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            _last_snapshot = tracemalloc.take_snapshot()
+            return {"status": "tracing started, baseline taken", "top": []}
+        current = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        diff = current.compare_to(_last_snapshot, "traceback") if _last_snapshot else []
+        _last_snapshot = current
+        traced, peak = tracemalloc.get_traced_memory()
+        return {
+            "status": "ok",
+            "traced_bytes": traced,
+            "peak_bytes": peak,
+            "top": [{
+                "size_diff": stat.size_diff,
+                "count_diff": stat.count_diff,
+                "size": stat.size,
+                "traceback": stat.traceback.format(limit=frames),
+            } for stat in diff[:top]],
+        }
+
+
+def stop_tracemalloc():
+    global _last_snapshot
+    with _snapshot_lock:
+        _last_snapshot = None
+        tracemalloc.stop()
+
+
+def _recycle(rss: int, max_rss: int):
+    global _recycling
+    if _recycling:
+        return
+    _recycling = True
+    logger.warning(f"Worker {os.getpid()} RSS {rss / 2**20:.0f} MiB exceeds {max_rss / 2**20:.0f} MiB; "
+                   f"recycling after in-flight requests finish")
+    os.kill(os.getpid(), signal.SIGTERM)
+
+
+def _monitor(interval: float, max_rss: int):
+    while True:
+        time.sleep(interval)
+        try:
+            rss = update_gauges()
+            if max_rss and rss > max_rss:
+                _recycle(rss, max_rss)
+        except Exception:
+            logger.exception("Memory monitor failed")
+
+
+_monitor_thread: Optional[threading.Thread] = None
+
+
+def start_monitor(interval: float, max_rss_mb: float = 0):
+    """
+    Start the per-worker monitor thread (no-op if interval is 0 or it is running).
+
+    Call it in the worker, after the fork: in a preloaded gunicorn master the
+    thread would take the prometheus and logging locks while workers fork.
+    """
+    global _monitor_thread
+    if interval <= 0 or _monitor_thread is not None:
+        return
+    _monitor_thread = threading.Thread(target=_monitor, args=(interval, int(max_rss_mb * 2**20)),
+                                       name="memory-monitor", daemon=True)
+    _monitor_thread.start()
+
+
+def _after_fork():
+    # Threads do not survive a fork; let the child start its own
+    global _monitor_thread, _recycling
+    _monitor_thread = None
+    _recycling = False
+
+
+os.register_at_fork(after_in_child=_after_fork)
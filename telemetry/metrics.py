@@ -0,0 +1,187 @@
+# telemetry/metrics.py
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+)
+
+'''
+Prometheus metrics shared by the Flask gateway and the bot service.
+
+Under gunicorn each worker is its own process, so a scrape of /metrics only
+reaches one of them. When PROMETHEUS_MULTIPROC_DIR is set (the Dockerfiles
+do), every worker writes its samples to mmap'd files in that directory and
+/metrics aggregates all of them. The directory must be emptied before the
+workers start and dead workers must be marked; see the gunicorn.conf.py
+of each service.
+
+PROMETHEUS_MULTIPROC_DIR has to be set before prometheus_client is imported.
+'''
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# Conversation turns are dominated by LLM calls, so the buckets reach 60s
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+CHECKOUT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by service and route template",
+    ["service", "method", "endpoint", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+TURN_LATENCY = Histogram(
+    "bot_turn_duration_seconds",
+    "Time to process one user message, by the conversation state it arrived in",
+    ["state"],
+    buckets=LATENCY_BUCKETS,
+)
+TURNS_IN_FLIGHT = Gauge(
+    "bot_turns_in_flight",
+    "Conversation turns currently being processed",
+    multiprocess_mode="livesum",
+)
+LLM_LATENCY = Histogram(
+    "llm_request_duration_seconds",
+    "Latency of a single LLM call attempt",
+    ["provider", "model", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+LLM_TOKENS = Counter(
+    "llm_tokens",
+    "Tokens used by LLM calls",
+    ["model", "kind"],
+)
+LLM_RETRIES = Counter(
+    "llm_retries",
+    "LLM call attempts that were retries of a failed attempt",
+    ["model"],
+)
+LLM_GIVE_UPS = Counter(
+    "llm_give_ups",
+    "LLM calls that failed on every attempt",
+    ["model"],
+)
+DB_POOL_CHECKOUT = Histogram(
+    "db_pool_checkout_duration_seconds",
+    "Time to check a connection out of the SQLAlchemy pool",
+    ["waited"],
+    buckets=CHECKOUT_BUCKETS,
+)
+DB_REPLICA_LAG = Gauge(
+    "db_replica_lag_seconds",
+    "Replay lag of the read replica, as last checked by this process",
+    multiprocess_mode="max",
+)
+
+
+def observe_request(service: str, method: str, endpoint: str, status: int, elapsed: float):
+    REQUEST_LATENCY.labels(service, method, endpoint, str(status)).observe(elapsed)
+
+
+def observe_llm_call(provider: str, model: str, elapsed: float, ok: bool, attempt: int = 0):
+    LLM_LATENCY.labels(provider, model, "ok" if ok else "error").observe(elapsed)
+    if attempt > 0:
+        LLM_RETRIES.labels(model).inc()
+
+
+def observe_llm_tokens(model: str, tokens_prompt: int, tokens_completion: int):
+    LLM_TOKENS.labels(model, "prompt").inc(tokens_prompt or 0)
+    LLM_TOKENS.labels(model, "completion").inc(tokens_completion or 0)
+
+
+def _observe_checkout(elapsed: float, waited: bool):
+    DB_POOL_CHECKOUT.labels("true" if waited else "false").observe(elapsed)
+
+
+def _observe_replica_lag(lag: float):
+    DB_REPLICA_LAG.set(lag)
+
+
+class TurnLabels:
+    """
+    Label holder for track_turn(); the state is only known once the
+    conversation has been loaded.
+    """
+    __slots__ = ("state",)
+
+    def __init__(self):
+        self.state = "unknown"
+
+
+@contextmanager
+def track_turn():
+    """
+    Count a conversation turn as in flight and record its latency by state.
+
+        with track_turn() as turn:
+            turn.state = convo.state.value
+            ...
+    """
+    labels = TurnLabels()
+    TURNS_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    try:
+        yield labels
+    finally:
+        TURNS_IN_FLIGHT.dec()
+        TURN_LATENCY.labels(labels.state).observe(time.perf_counter() - start)
+
+
+def install_db_hooks():
+    """
+    Feed connection-pool checkout times and read-replica lag from db.stats
+    into their metrics.
+    """
+    from db import stats as db_stats
+    if _observe_checkout not in db_stats.checkout_observers:
+        db_stats.checkout_observers.append(_observe_checkout)
+    if _observe_replica_lag not in db_stats.replica_lag_observers:
+        db_stats.replica_lag_observers.append(_observe_replica_lag)
+
+
+def render_latest() -> Tuple[bytes, str]:
+    """
+    Return the exposition body and its content type, aggregated over all
+    worker processes in multiprocess mode.
+    """
+    if MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def clear_multiproc_dir():
+    """
+    Remove samples left by a previous run. Call once in the gunicorn master
+    before any worker starts. The master's own files are kept: with
+    preload_app it has already opened them.
+    """
+    if not MULTIPROC_DIR:
+        return
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+    own = f"_{os.getpid()}.db"
+    for name in os.listdir(MULTIPROC_DIR):
+        if name.endswith(".db") and not name.endswith(own):
+            os.remove(os.path.join(MULTIPROC_DIR, name))
+
+
+def mark_process_dead(pid: int):
+    """
+    Drop live gauges of a worker that exited. Call from gunicorn's child_exit.
+    """
+    if MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,149 @@
+# telemetry/profiling.py
+
+import hmac
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+
+'''
+On-demand sampling profiler for a running worker.
+
+A background thread reads the Python stacks of the target thread(s) with
+sys._current_frames() at a fixed interval and writes them in the folded
+format that flamegraph.pl, speedscope and inferno read:
+
+    logs/profiles/<service>-<pid>-<timestamp>-<label>.folded
+
+Two ways to trigger it, both authenticated with ADMIN_TOKEN (profiling is
+disabled when it is unset):
+
+    # one request: profile the thread handling it
+    curl -H "X-Profile: $ADMIN_TOKEN" ...
+
+    # a window: all threads of whichever worker answers, for N seconds
+    curl -X POST -H "X-Profile: $ADMIN_TOKEN" "http://bot:8001/admin/profile?seconds=10"
+
+Under the uvicorn worker every request shares the event loop thread, so a
+request profile also contains whatever else the loop ran meanwhile.
+
+Overhead is bounded: one profile per process at a time, the interval is
+at least MIN_INTERVAL_MS and a profile stops after PROFILE_MAX_SECONDS
+regardless of the request.
+'''
+
+PROFILE_HEADER = "X-Profile"
+OUTPUT_HEADER = "X-Profile-Output"
+
+MIN_INTERVAL_MS = 5.0
+PROFILE_INTERVAL_MS = max(float(os.getenv("PROFILE_INTERVAL_MS", "10")), MIN_INTERVAL_MS)
+PROFILE_MAX_SECONDS = min(float(os.getenv("PROFILE_MAX_SECONDS", "30")), 120.0)
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", "logs/profiles"))
+# Deepest frames kept per sample
+MAX_DEPTH = 200
+
+_active_lock = threading.Lock()
+
+
+def authorized(token: Optional[str]) -> bool:
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token or not token:
+        return False
+    return hmac.compare_digest(token.encode(), admin_token.encode())
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    # Trim site-packages / repo prefixes to keep the flamegraph readable
+    for marker in ("site-packages/", "/app/"):
+        i = filename.rfind(marker)
+        if i != -1:
+            filename = filename[i + len(marker):]
+            break
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of one thread (or all but its own) until stopped.
+    """
+    def __init__(self, service: str, label: str, thread_id: Optional[int] = None,
+                 interval_ms: float = PROFILE_INTERVAL_MS, max_seconds: float = PROFILE_MAX_SECONDS):
+        self.service = service
+        self.label = "".join(c if c.isalnum() or c in "-_" else "_" for c in label)[:60]
+        self.thread_id = thread_id
+        self.interval = max(interval_ms, MIN_INTERVAL_MS) / 1000
+        self.max_seconds = min(max_seconds, PROFILE_MAX_SECONDS)
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self.path = PROFILE_DIR / f"{service}-{os.getpid()}-{time.strftime('%Y%m%dT%H%M%S')}-{self.label}.folded"
+
+    def _sample(self):
+        own = threading.get_ident()
+        frames = sys._current_frames()
+        items = [(self.thread_id, frames.get(self.thread_id))] if self.thread_id else frames.items()
+        for ident, frame in items:
+            if frame is None or ident == own:
+                continue
+            stack = []
+            while frame is not None and len(stack) < MAX_DEPTH:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self):
+        deadline = time.monotonic() + self.max_seconds
+        try:
+            while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+                self._sample()
+        finally:
+            self._write()
+            _active_lock.release()
+
+    def _write(self):
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def start(self) -> "SamplingProfiler":
+        self._thread.start()
+        return self
+
+    def stop(self, wait: bool = True) -> Path:
+        self._stop.set()
+        if wait:
+            self._thread.join()
+        return self.path
+
+
+def start_profiler(service: str, label: str, thread_id: Optional[int] = None,
+                   seconds: Optional[float] = None) -> Optional[SamplingProfiler]:
+    """
+    Start a profiler unless one is already running in this process.
+    """
+    if not _active_lock.acquire(blocking=False):
+        return None
+    try:
+        profiler = SamplingProfiler(service, label, thread_id,
+                                    max_seconds=seconds if seconds else PROFILE_MAX_SECONDS)
+        return profiler.start()
+    except Exception:
+        _active_lock.release()
+        raise
+
+
+def profile_request(service: str, label: str, token: Optional[str]) -> Optional[SamplingProfiler]:
+    """
+    Profile the calling thread if the request carries a valid token.
+    """
+    if not token or not authorized(token):
+        return None
+    return start_profiler(service, label, thread_id=threading.get_ident())
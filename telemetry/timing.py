@@ -0,0 +1,222 @@
+# telemetry/timing.py
+
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+'''
+Per-turn latency breakdown, reported in Server-Timing headers.
+
+The bot service times each /send_message and /new_chat request: queueing
+before the handler ran (from the gateway's X-Request-Start header), SQL
+time, every LLM call with its token counts, and serialization of the
+response. The gateway adds its own overhead, its SQL time and the transport
+time to the bot, and relays the combined header to the client:
+
+    Server-Timing: gateway-total;dur=912.4, gateway-overhead;dur=6.1, gateway-db;dur=2.3,
+                   bot-transport;dur=1.9, bot-queue;dur=0.4, bot-db;dur=11.8;desc="9 statements",
+                   bot-llm-1;dur=874.0;desc="gpt-4o-mini 850+61 tokens", bot-llm;dur=874.0,
+                   bot-serialize;dur=0.1, bot-total;dur=901.7
+
+Sending "X-Debug-Timing: 1" also adds the same breakdown to the JSON body
+under "timing".
+'''
+
+DEBUG_HEADER = "X-Debug-Timing"
+REQUEST_START_HEADER = "X-Request-Start"
+
+_current: ContextVar[Optional["TurnTiming"]] = ContextVar("turn_timing", default=None)
+
+
+class TurnTiming:
+    """
+    Durations collected while handling one request, in milliseconds.
+    """
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self.start = time.perf_counter()
+        self.db_ms = 0.0
+        self.db_statements = 0
+        self.llm_calls: List[Dict] = []
+        self.phases: Dict[str, float] = {}
+
+    def add_db(self, elapsed: float):
+        self.db_ms += elapsed * 1000
+        self.db_statements += 1
+
+    def add_llm(self, model: str, elapsed: float, tokens_prompt=None, tokens_completion=None, ok=True):
+        self.llm_calls.append({
+            "model": model,
+            "ms": elapsed * 1000,
+            "tokens_prompt": tokens_prompt or 0,
+            "tokens_completion": tokens_completion or 0,
+            "ok": ok,
+        })
+
+    def add(self, name: str, ms: float):
+        self.phases[name] = self.phases.get(name, 0.0) + ms
+
+    @contextmanager
+    def measure(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000)
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.start) * 1000
+
+    def entries(self) -> List[Tuple[str, float, Optional[str]]]:
+        """
+        (name, milliseconds, description) in Server-Timing order.
+        """
+        p = self.prefix
+        out = [(f"{p}-{name}", ms, None) for name, ms in self.phases.items() if name != "serialize"]
+        out.append((f"{p}-db", self.db_ms, f"{self.db_statements} statements"))
+        for i, call in enumerate(self.llm_calls, start=1):
+            desc = f"{call['model']} {call['tokens_prompt']}+{call['tokens_completion']} tokens"
+            out.append((f"{p}-llm-{i}", call["ms"], desc if call["ok"] else f"{call['model']} failed"))
+        if self.llm_calls:
+            out.append((f"{p}-llm", sum(c["ms"] for c in self.llm_calls), None))
+        if "serialize" in self.phases:
+            out.append((f"{p}-serialize", self.phases["serialize"], None))
+        out.append((f"{p}-total", self.total_ms(), None))
+        return out
+
+    def as_dict(self) -> Dict:
+        return {
+            **{f"{name}_ms": round(ms, 3) for name, ms in self.phases.items()},
+            "db_ms": round(self.db_ms, 3),
+            "db_statements": self.db_statements,
+            "llm_calls": [{**c, "ms": round(c["ms"], 3)} for c in self.llm_calls],
+            "total_ms": round(self.total_ms(), 3),
+        }
+
+
+def start(prefix: str):
+    """
+    Make a new TurnTiming current; returns (timing, token) for stop().
+    """
+    timing = TurnTiming(prefix)
+    return timing, _current.set(timing)
+
+
+def stop(token):
+    _current.reset(token)
+
+
+@contextmanager
+def turn_timing(prefix: str):
+    """
+    Make a TurnTiming current for the block so DB and LLM code can report
+    into it without having it passed around.
+    """
+    timing, token = start(prefix)
+    try:
+        yield timing
+    finally:
+        stop(token)
+
+
+def current() -> Optional[TurnTiming]:
+    return _current.get()
+
+
+def record_statement(elapsed: float):
+    timing = _current.get()
+    if timing is not None:
+        timing.add_db(elapsed)
+
+
+def record_llm(model: str, elapsed: float, tokens_prompt=None, tokens_completion=None, ok=True):
+    timing = _current.get()
+    if timing is not None:
+        timing.add_llm(model, elapsed, tokens_prompt, tokens_completion, ok)
+
+
+def install_db_hooks():
+    """
+    Add SQL statement times from db.stats to the current turn.
+    """
+    from db import stats as db_stats
+    if record_statement not in db_stats.statement_observers:
+        db_stats.statement_observers.append(record_statement)
+
+
+def format_server_timing(entries) -> str:
+    parts = []
+    for name, ms, desc in entries:
+        part = f"{name};dur={ms:.1f}"
+        if desc:
+            part += f';desc="{desc}"'
+        parts.append(part)
+    return ", ".join(parts)
+
+
+_ENTRY = re.compile(r'\s*([^;,\s]+)((?:\s*;\s*[^;,]+)*)')
+
+
+def parse_server_timing(header: Optional[str]) -> List[Tuple[str, float, Optional[str]]]:
+    """
+    Parse a Server-Timing header produced by format_server_timing().
+    """
+    out = []
+    for match in _ENTRY.finditer(header or ""):
+        name, params = match.group(1), match.group(2)
+        dur, desc = 0.0, None
+        for param in params.split(";")[1:]:
+            key, _, value = param.strip().partition("=")
+            if key == "dur":
+                try:
+                    dur = float(value)
+                except ValueError:
+                    pass
+            elif key == "desc":
+                desc = value.strip('"')
+        out.append((name, dur, desc))
+    return out
+
+
+def gateway_entries(turn: TurnTiming, roundtrip_ms: float, upstream) -> List[Tuple[str, float, Optional[str]]]:
+    """
+    Combine the gateway's own timing with the bot's Server-Timing entries.
+    Transport is the part of the round trip the bot did not account for.
+    """
+    upstream = list(upstream)
+    reported = {name: ms for name, ms, _ in upstream}
+    total = turn.total_ms()
+    transport = roundtrip_ms - reported.get("bot-total", 0.0) - reported.get("bot-queue", 0.0)
+    return [
+        ("gateway-total", total, None),
+        ("gateway-overhead", max(total - roundtrip_ms, 0.0), None),
+        ("gateway-db", turn.db_ms, f"{turn.db_statements} statements"),
+        ("bot-transport", max(transport, 0.0), None),
+    ] + upstream
+
+
+def request_start_header() -> Dict:
+    """
+    Header telling the bot service when the gateway sent the request.
+    """
+    return {REQUEST_START_HEADER: f"t={time.time():.6f}"}
+
+
+def queue_ms(headers) -> Optional[float]:
+    """
+    Milliseconds between the gateway sending the request and now.
+    """
+    value = headers.get(REQUEST_START_HEADER)
+    if not value:
+        return None
+    try:
+        sent = float(value.split("=", 1)[-1])
+    except ValueError:
+        return None
+    return max((time.time() - sent) * 1000, 0.0)
+
+
+def debug_requested(headers) -> bool:
+    return headers.get(DEBUG_HEADER, "").lower() in ("1", "true", "yes")
@@ -0,0 +1,215 @@
+# telemetry/tracing.py
+
+import base64
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from opentelemetry import context, propagate, trace
+from opentelemetry.trace import SpanKind, Status, StatusCode
+
+'''
+Distributed tracing for the gateway, the bot service, LLM calls and SQL.
+
+A browser request gets a server span in the gateway (continuing a W3C
+traceparent header if the client sent one). The context travels to the bot
+service in the traceparent header of the requests.post call, and the bot
+continues the same trace. run_state_logic, each BotStep phase, each
+query_gpt attempt and each SQL statement become child spans, so one slow
+turn can be decomposed without grepping two log files.
+
+Export is configured through the environment and is off by default:
+
+    OTEL_EXPORTER_OTLP_ENDPOINT=http://collector:4318   # OTLP/HTTP to a collector
+    TRACE_FILE=logs/traces.jsonl                        # OTLP JSON lines, one batch per line
+
+The file format is what the collector's otlpjsonfile receiver reads. Sampling
+follows the standard OTEL_TRACES_SAMPLER / OTEL_TRACES_SAMPLER_ARG variables.
+When neither exporter is configured the no-op tracer is used.
+'''
+
+TRACER_NAME = "reappraise"
+# Longer statements are cut in the db.statement attribute
+MAX_STATEMENT_CHARS = 2000
+
+_enabled = False
+_tracer = trace.get_tracer(TRACER_NAME)
+
+
+def _hex_ids(obj):
+    """
+    OTLP JSON encodes trace and span ids as hex, protobuf's JSON mapping as base64.
+    """
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            if key in ("traceId", "spanId", "parentSpanId") and isinstance(value, str):
+                obj[key] = base64.b64decode(value).hex()
+            else:
+                _hex_ids(value)
+    elif isinstance(obj, list):
+        for item in obj:
+            _hex_ids(item)
+
+
+class OTLPJsonFileExporter:
+    """
+    SpanExporter writing each batch as one OTLP ExportTraceServiceRequest
+    JSON document per line.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def export(self, spans):
+        from google.protobuf.json_format import MessageToDict
+        from opentelemetry.exporter.otlp.proto.common.trace_encoder import encode_spans
+        from opentelemetry.sdk.trace.export import SpanExportResult
+
+        body = MessageToDict(encode_spans(spans), use_integers_for_enums=True)
+        _hex_ids(body)
+        line = json.dumps(body, separators=(",", ":"))
+        try:
+            with self._lock, open(self.path, "a") as f:
+                f.write(line + "\n")
+        except OSError:
+            return SpanExportResult.FAILURE
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
+
+
+def init_tracing(service_name: str) -> bool:
+    """
+    Install the SDK tracer provider for this process if an exporter is
+    configured. Safe to call more than once; returns whether tracing is on.
+    """
+    global _enabled, _tracer
+    if _enabled:
+        return True
+    endpoint = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+    trace_file = os.getenv("TRACE_FILE")
+    if not endpoint and not trace_file:
+        return False
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+    provider = TracerProvider(resource=Resource.create({
+        "service.name": os.getenv("OTEL_SERVICE_NAME", service_name),
+    }))
+    if endpoint:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    if trace_file:
+        provider.add_span_processor(BatchSpanProcessor(OTLPJsonFileExporter(trace_file)))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer(TRACER_NAME)
+    _enabled = True
+    return True
+
+
+def tracer():
+    return _tracer
+
+
+@contextmanager
+def span(name: str, kind: SpanKind = SpanKind.INTERNAL, attributes: Optional[Dict] = None):
+    """
+    Run the block in a child span of the current one. Exceptions are
+    recorded on the span and re-raised.
+    """
+    with _tracer.start_as_current_span(name, kind=kind, attributes=attributes) as s:
+        yield s
+
+
+def inject_headers(headers: Optional[Dict] = None) -> Dict:
+    """
+    Add the traceparent header of the current span to an outgoing request.
+    """
+    headers = {} if headers is None else headers
+    propagate.inject(headers)
+    return headers
+
+
+def start_server_span(name: str, headers, attributes: Optional[Dict] = None):
+    """
+    Start a server span continuing the trace in the incoming headers and
+    make it current. Returns (span, token) for end_server_span().
+    """
+    parent = propagate.extract(headers)
+    s = _tracer.start_span(name, context=parent, kind=SpanKind.SERVER, attributes=attributes)
+    token = context.attach(trace.set_span_in_context(s, parent))
+    return s, token
+
+
+def end_server_span(s, token, status_code: Optional[int] = None, error: Optional[BaseException] = None):
+    if status_code is not None:
+        s.set_attribute("http.response.status_code", status_code)
+        if status_code >= 500:
+            s.set_status(Status(StatusCode.ERROR))
+    if error is not None:
+        s.record_exception(error)
+        s.set_status(Status(StatusCode.ERROR, type(error).__name__))
+    s.end()
+    context.detach(token)
+
+
+def current_trace_id() -> Optional[str]:
+    """
+    Hex trace id of the current span, or None when not tracing.
+    """
+    ctx = trace.get_current_span().get_span_context()
+    return format(ctx.trace_id, "032x") if ctx.is_valid else None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context_, executemany):
+    if not _enabled:
+        return
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "SQL"
+    context_._trace_span = _tracer.start_span(
+        f"db {operation}",
+        kind=SpanKind.CLIENT,
+        attributes={
+            "db.system": "postgresql",
+            "db.statement": statement[:MAX_STATEMENT_CHARS],
+            "db.executemany": executemany,
+        },
+    )
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context_, executemany):
+    s = getattr(context_, "_trace_span", None)
+    if s is not None:
+        if cursor.rowcount is not None and cursor.rowcount >= 0:
+            s.set_attribute("db.rowcount", cursor.rowcount)
+        s.end()
+        context_._trace_span = None
+
+
+def _handle_error(exception_context):
+    s = getattr(exception_context.execution_context, "_trace_span", None)
+    if s is not None:
+        s.record_exception(exception_context.original_exception)
+        s.set_status(Status(StatusCode.ERROR))
+        s.end()
+        exception_context.execution_context._trace_span = None
+
+
+def instrument_engine(engine):
+    """
+    Emit a span per SQL statement (bind parameters are never recorded).
+    """
+    from sqlalchemy import event
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)